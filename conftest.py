@@ -0,0 +1,191 @@
+"""
+Shared test doubles for the pipeline tests
+
+- StubPipeline: RAGPipeline with retrieval stubbed out (no verse lookup,
+  scripted search results, rerank keeps the order)
+- FakeLLM: scripted LLM service that records its calls into the LLM trace
+- FakeRefiner: query refiner with a fixed answer and delay
+
+The `stub_pipeline`, `fake_llm` and `install_refiner` fixtures install them
+with pytest's monkeypatch, so patched settings and services are restored
+after every test.
+"""
+import asyncio
+import sys
+import os
+from typing import Callable, Dict, List, Optional, Union
+
+import pytest
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+import rag.pipeline as pipeline_module
+from config import settings
+from llm.service import split_citations
+from llm.trace import llm_call
+from rag.pipeline import RAGPipeline
+
+VERSE = {"reference": "Bhagavad Gita 2.47", "text": "...", "scripture": "Bhagavad Gita",
+         "chapter": 2, "verse": 47, "score": 0.8}
+
+ANSWER = "You have a right to your actions, never to their fruits. What would you do without the worry?"
+
+
+class StubPipeline(RAGPipeline):
+    """
+    Pipeline whose search returns scripted verses
+
+    Retrieval still goes through _retrieve, so query refinement applies when
+    an available refiner is installed.
+    """
+
+    def __init__(self, docs: Union[List[Dict], Callable[[str], List[Dict]], None] = None, search_seconds: float = 0.0):
+        """
+        Args:
+            docs: Verses every search returns, or a function of the query
+            search_seconds: Time every search takes
+        """
+        super().__init__()
+        self.initialized = True
+        self.docs = [VERSE] if docs is None else docs
+        self.search_seconds = search_seconds
+        self.searched: List[str] = []
+
+    def _match_verse_lookup(self, query, language):
+        return []
+
+    async def search(self, query, language="en", top_k=5, **kwargs):
+        self.searched.append(query)
+        if self.search_seconds:
+            await asyncio.sleep(self.search_seconds)
+        docs = self.docs(query) if callable(self.docs) else self.docs
+        return [dict(doc, language=language) for doc in docs]
+
+    async def _rerank(self, query, docs):
+        return docs[:settings.RERANK_TOP_K]
+
+
+class FakeLLM:
+    """
+    LLM service with scripted answers
+
+    Every call is recorded in `calls` and timed into the request's LLM trace.
+    """
+    available = True
+
+    def __init__(
+        self,
+        answer: Union[str, Callable[[str, List[Dict]], str]] = ANSWER,
+        citations: Optional[List[str]] = None,
+        seconds: float = 0.0,
+        token_seconds: float = 0.0,
+        format_call: bool = False
+    ):
+        """
+        Args:
+            answer: Answer text, or a function of (query, docs)
+            citations: Verses listed in the CITATIONS trailer of cited answers
+            seconds: Time of a generate (and format) call
+            token_seconds: Time between streamed words
+            format_call: generate_response also makes a "format" call, like the chain plan's reformatter
+        """
+        self.answer = answer
+        self.citations = citations or []
+        self.seconds = seconds
+        self.token_seconds = token_seconds
+        self.format_call = format_call
+        self.calls: List[Dict] = []
+
+    def _text(self, kind, query, context_docs, conversation_history, structured=False, cite=False) -> str:
+        self.calls.append({
+            "kind": kind,
+            "query": query,
+            "docs": [doc["reference"] for doc in context_docs],
+            "history": conversation_history,
+            "structured": structured,
+            "cite": cite
+        })
+        text = self.answer(query, context_docs) if callable(self.answer) else self.answer
+        if cite:
+            text += f"\n\n**CITATIONS:** {', '.join(self.citations) or 'none'}"
+        return text
+
+    async def generate_response(self, query, context_docs, language="en", conversation_history=None):
+        text = self._text("generate", query, context_docs, conversation_history)
+        with llm_call("generate"):
+            await asyncio.sleep(self.seconds)
+        if self.format_call:
+            with llm_call("format"):
+                await asyncio.sleep(self.seconds)
+        return text
+
+    async def generate_planned_response(self, query, context_docs, language="en", conversation_history=None):
+        text = self._text("planned", query, context_docs, conversation_history, structured=True, cite=True)
+        with llm_call("generate"):
+            await asyncio.sleep(self.seconds)
+        answer, references = split_citations(text)
+        return answer.strip(), references
+
+    async def generate_response_stream(self, query, context_docs, language="en",
+                                       conversation_history=None, structured=False, cite=False):
+        text = self._text("stream", query, context_docs, conversation_history, structured, cite)
+        words = text.split(" ")
+        with llm_call("generate_stream") as call:
+            for i, word in enumerate(words):
+                await asyncio.sleep(self.token_seconds)
+                call.first_token()
+                yield word + (" " if i < len(words) - 1 else "")
+
+    def is_fallback_response(self, *args):
+        return False
+
+
+class FakeRefiner:
+    """Query refiner with a fixed refined query"""
+
+    def __init__(self, refined: str = "detachment from results", seconds: float = 0.0, available: bool = True):
+        self.refined = refined
+        self.seconds = seconds
+        self.available = available
+
+    async def refine_query(self, query, language="en"):
+        with llm_call("refine"):
+            await asyncio.sleep(self.seconds)
+        return self.refined
+
+
+@pytest.fixture
+def stub_pipeline(monkeypatch):
+    """
+    StubPipeline factory, with the answer cache off, the "chain" plan and
+    no query refiner (install one with `install_refiner`)
+    """
+    monkeypatch.setattr(settings, "ANSWER_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_PLAN", "chain")
+    monkeypatch.setattr(pipeline_module, "get_refiner", lambda *args: FakeRefiner(available=False))
+    return StubPipeline
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """FakeLLM factory; the last one built is the pipeline's LLM service"""
+    def build(*args, **kwargs) -> FakeLLM:
+        llm = FakeLLM(*args, **kwargs)
+        monkeypatch.setattr(pipeline_module, "get_llm_service", lambda: llm)
+        return llm
+
+    build()
+    return build
+
+
+@pytest.fixture
+def install_refiner(monkeypatch):
+    """Install a FakeRefiner as the pipeline's query refiner"""
+    def install(*args, **kwargs) -> FakeRefiner:
+        refiner = FakeRefiner(*args, **kwargs)
+        monkeypatch.setattr(pipeline_module, "get_refiner", lambda *a: refiner)
+        return refiner
+
+    return install
@@ -3,7 +3,7 @@ Configuration management for Spiritual Voice Bot
 """
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import Literal
+from typing import Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -27,13 +27,26 @@ class Settings(BaseSettings):
     # Embedding Settings
     EMBEDDING_MODEL: str = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
     EMBEDDING_DIM: int = 768
+    EMBEDDING_BACKEND: Literal["torch", "onnx", "onnx-int8"] = "torch"  # ONNX Runtime backends for CPU-only nodes
+    EMBEDDING_ONNX_DIR: str = "./data/models"  # ONNX exports are written here once
+    EMBEDDING_ONNX_QUANTIZATION: Literal["arm64", "avx2", "avx512", "avx512_vnni"] = "avx2"  # int8 kernel target
     CHUNK_SIZE: int = 512
     CHUNK_OVERLAP: int = 50
+    CHUNK_SEARCH: bool = True  # Search chunk embeddings and aggregate scores per verse
+    CHUNK_AGGREGATION: Literal["max", "sum"] = "max"  # sum favours verses with several matching passages
+    CHUNK_EMBED_BATCH_SIZE: int = 64  # Chunks per encode call at ingest time
+    CHUNK_CANDIDATE_FACTOR: int = 4  # Chunks shortlisted per verse result when chunk search is quantized or IVF
+    EMBEDDING_BATCH_SIZE: int = 32  # Max queries per batched encode
+    EMBEDDING_BATCH_WAIT_MS: float = 5.0  # How long to collect concurrent queries
 
     # Vector DB Settings
     QDRANT_HOST: str = "localhost"
     QDRANT_PORT: int = 6333
     QDRANT_COLLECTION: str = "sanatan_scriptures"
+    QDRANT_POOL_SIZE: int = 16  # Pooled HTTP connections shared by all requests
+    QDRANT_TIMEOUT: float = 5.0
+    QDRANT_UPSERT_BATCH_SIZE: int = 256
+    VECTOR_STORE_BACKEND: Literal["memory", "mmap", "qdrant"] = "mmap"  # qdrant falls back to the local index on errors
     VECTOR_DB_PATH: str = "./data/vector_db"
 
     # Voice Settings
@@ -44,8 +57,93 @@ class Settings(BaseSettings):
 
     # RAG Settings
     RETRIEVAL_TOP_K: int = 7
-    RERANK_TOP_K: int = 3
+    RERANK_TOP_K: int = 3  # Verses that reach the LLM prompt after reranking
+    RERANK_ENABLED: bool = True
+    RERANK_MODEL: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"  # Multilingual cross-encoder
+    RERANK_CACHE_MB: float = 4.0
     MIN_SIMILARITY_SCORE: float = 0.15  # Lower threshold to find more relevant verses
+    STREAM_MODE: Literal["incremental", "reformulate"] = "incremental"  # reformulate buffers the answer for a second Gemini pass
+
+    # ANN Index Settings (IVF-flat, used only for large corpora)
+    ANN_MIN_CORPUS_SIZE: int = 20000  # Below this, exact search is used
+    ANN_NLIST: int = 0  # Inverted lists built at ingest (0 = about sqrt(corpus size))
+    ANN_NPROBE: int = 16  # Lists probed per query, higher = better recall, slower
+
+    # Verse Lookup Settings ("what is 2.47" is answered by direct lookup)
+    VERSE_LOOKUP_ENABLED: bool = True
+    VERSE_LOOKUP_EXPLAIN: bool = False  # Also generate an LLM explanation (one call, no refine/reformat)
+
+    # Hybrid Search Settings (BM25 + dense, fused with reciprocal-rank fusion)
+    HYBRID_SEARCH: bool = True
+    HYBRID_CANDIDATES: int = 50  # Candidates taken from each retriever before fusion
+    HYBRID_RRF_K: int = 60
+    LEXICAL_SKIP_REFINER_THRESHOLD: float = 0.5  # BM25 match strength above which the query refiner is skipped
+
+    # Speculative Retrieval (raw-query search runs while Gemini refines the query)
+    SPECULATIVE_RETRIEVAL: bool = True
+    REFINE_DEADLINE_MS: float = 1500.0  # After this, raw-query results are used alone
+    SPECULATIVE_MERGE: Literal["merge", "replace"] = "merge"  # Fuse refined and raw results, or keep refined only
+
+    # LLM Plan: "chain" refines, generates, then formats or reformulates (up to 3 serial calls);
+    # "single" asks one structured generation call for the final answer and its citations
+    LLM_PLAN: Literal["chain", "single"] = "chain"
+    LLM_PLAN_REFINE: bool = False  # Keep the Gemini query refiner in the single-call plan
+
+    # Prompt Token Budget (tokens estimated locally, see llm/prompt.py)
+    LLM_PROMPT_TOKEN_BUDGET: int = 3200  # Whole generation prompt; system prompt and instructions are always kept
+    LLM_PROMPT_CONTEXT_TOKENS: int = 1200  # Retrieved verses; the lowest-scored are cut or dropped first
+    LLM_PROMPT_HISTORY_TOKENS: int = 800  # Conversation history, from what the verses leave; oldest dropped first
+    LLM_PROMPT_MIN_DOC_TOKENS: int = 60  # Room needed to cut a verse down instead of dropping it
+
+    # LLM Backend ("mock" simulates Gemini offline, for load tests and benchmarks)
+    LLM_BACKEND: Literal["gemini", "mock"] = "gemini"
+    GEMINI_MODEL: str = "gemini-2.0-flash-exp"
+    MOCK_LLM_LATENCY_MS: float = 600.0  # Median time to first token
+    MOCK_LLM_LATENCY_SIGMA: float = 0.5  # Log-normal spread (p95 is about 2.3x the median)
+    MOCK_LLM_TOKENS_PER_SECOND: float = 80.0
+    MOCK_LLM_ERROR_RATE: float = 0.0
+    MOCK_LLM_SEED: Optional[int] = None
+
+    # LLM Call Scheduler (shared by all LLM clients, see llm/scheduler.py)
+    LLM_MAX_CONCURRENCY: int = 16  # Calls in flight at once; the rest wait for a slot
+    LLM_CALL_DEADLINE_MS: float = 15000.0  # Per attempt, slot wait included (streams: per chunk)
+    LLM_RETRIES: int = 2  # Extra attempts after a failed or late one
+    LLM_RETRY_BACKOFF_MS: float = 200.0  # Full-jitter exponential backoff base
+    LLM_HEDGE: bool = False  # Send a duplicate request when the first is slower than the quantile
+    LLM_HEDGE_QUANTILE: float = 0.95
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # Latency samples needed before hedging starts
+    LLM_BREAKER_FAILURES: int = 5  # Consecutive failures that open the circuit
+    LLM_BREAKER_RESET_MS: float = 30000.0  # Open time before a trial call is let through
+
+    # Quantized Search Settings (codes are written at ingest time)
+    VECTOR_QUANTIZATION: Literal["none", "int8", "binary"] = "none"
+    QUANTIZATION_RERANK_FACTOR: int = 10  # Shortlist size per result for the exact float rerank
+
+    # Query Cache Settings
+    QUERY_CACHE_EMBEDDING_MB: float = 16.0  # Query embeddings keyed by normalized text
+    QUERY_CACHE_RESULTS_MB: float = 16.0  # Search results keyed by text, filters and top_k
+    QUERY_CACHE_TTL_SECONDS: float = 3600.0
+
+    # Semantic Answer Cache (first-turn answers keyed by query embedding)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_THRESHOLD: float = 0.95  # Min cosine similarity between queries to reuse an answer
+    ANSWER_CACHE_TTL_SECONDS: float = 86400.0
+    ANSWER_CACHE_MAX_ENTRIES: int = 2048  # Least recently used answers are evicted beyond this
+    ANSWER_CACHE_PATH: str = ""  # e.g. ./data/cache/answers.npz to keep answers across restarts
+    COALESCE_QUERIES: bool = True  # Identical concurrent first-turn queries share one computation
+
+    # Conversation Sessions (server-side history for queries with a session_id)
+    SESSION_MAX_SESSIONS: int = 1000  # Kept in memory; least recently used ones spill to SESSION_DB_PATH
+    SESSION_TTL_SECONDS: float = 86400.0  # Idle sessions expire
+    SESSION_DB_PATH: str = ""  # e.g. ./data/cache/sessions.db; empty = memory only (evicted sessions are lost)
+    SESSION_RECENT_MESSAGES: int = 6  # Kept verbatim; older turns are compacted into a rolling summary
+    SESSION_SUMMARY_MAX_CHARS: int = 1200
+    SESSION_MAX_VERSES: int = 20  # Retrieved verses (with embeddings) remembered per session
+    SESSION_REUSE_THRESHOLD: float = 0.3  # Min similarity of a remembered verse to a new query to reuse it
+    SESSION_SKIP_DISCUSSED: bool = False  # Prefer verses the conversation has not cited yet
+
+    # Startup Settings
+    WARMUP_ENABLED: bool = True  # Synthetic embed, Whisper pass and Gemini prefetch before /ready
 
     # Scripture Data Paths
     DATA_DIR: str = "./data"
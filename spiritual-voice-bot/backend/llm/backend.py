@@ -0,0 +1,283 @@
+"""
+LLM backends behind LLMService, ResponseFormatter, ResponseReformatter and QueryRefiner
+
+"gemini" calls Google Gemini. "mock" is an in-process stand-in that
+simulates Gemini's latency distribution, streaming token rate and error
+rate with canned answers, so load tests and benchmarks of the pipeline run
+offline on a plain Linux box (LLM_BACKEND=mock).
+"""
+import re
+import asyncio
+import logging
+import random
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Optional
+
+from config import settings
+from loader import LazyModule
+
+logger = logging.getLogger(__name__)
+
+# Google Generative AI SDK, imported on first use
+genai = LazyModule("google.generativeai", "google-generativeai")
+
+LLM_BACKENDS = ("gemini", "mock")
+
+# Rough characters per token, used by the mock to pace and cap its output
+CHARS_PER_TOKEN = 4
+
+
+class LLMBackend(ABC):
+    """
+    Text generation interface shared by the LLM clients
+
+    Implementations set `available` and raise on failed calls; the clients
+    catch errors and fall back (templates, original text, raw query).
+    """
+
+    name = "base"
+    available = False
+    # True while the scheduler rejects calls without reaching the upstream
+    circuit_open = False
+
+    @abstractmethod
+    async def generate(
+        self,
+        prompt: str,
+        temperature: float,
+        max_output_tokens: int,
+        top_p: Optional[float] = None
+    ) -> str:
+        """Complete text for a prompt"""
+
+    @abstractmethod
+    def generate_stream(
+        self,
+        prompt: str,
+        temperature: float,
+        max_output_tokens: int,
+        top_p: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """Text chunks for a prompt as they are generated"""
+
+    async def warm_up(self):
+        """Open connections ahead of the first request"""
+
+
+class GeminiBackend(LLMBackend):
+    """
+    Google Gemini through the google-generativeai SDK
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str = "gemini-2.0-flash-exp"):
+        """
+        Args:
+            api_key: Gemini API key
+            model_name: Gemini model to call
+        """
+        self.model_name = model_name
+        self.model = None
+        self.available = False
+
+        if not genai.available:
+            logger.error("Google Generative AI SDK not available - install with: pip install google-generativeai")
+            return
+
+        if not api_key:
+            logger.warning("GEMINI_API_KEY not set - Gemini backend not available")
+            return
+
+        try:
+            genai.configure(api_key=api_key)
+            self.model = genai.GenerativeModel(model_name)
+            self.available = True
+        except Exception as e:
+            logger.error(f"Failed to initialize Gemini client: {str(e)}")
+
+    def _config(self, temperature: float, max_output_tokens: int, top_p: Optional[float]):
+        options = {"temperature": temperature, "max_output_tokens": max_output_tokens}
+        if top_p is not None:
+            options["top_p"] = top_p
+        return genai.types.GenerationConfig(**options)
+
+    async def generate(self, prompt, temperature, max_output_tokens, top_p=None) -> str:
+        response = await self.model.generate_content_async(
+            prompt,
+            generation_config=self._config(temperature, max_output_tokens, top_p)
+        )
+        return response.text
+
+    async def generate_stream(self, prompt, temperature, max_output_tokens, top_p=None):
+        response = await self.model.generate_content_async(
+            prompt,
+            generation_config=self._config(temperature, max_output_tokens, top_p),
+            stream=True
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    async def warm_up(self):
+        """
+        A token count is a cheap authenticated round trip that sets up the
+        client's channel, so the first real generation skips TLS and auth.
+        """
+        await asyncio.to_thread(self.model.count_tokens, "Om")
+
+
+class MockLLMError(RuntimeError):
+    """Simulated upstream failure"""
+
+
+class MockBackend(LLMBackend):
+    """
+    Offline Gemini stand-in with configurable latency, token rate and errors
+
+    Time to first token is log-normal around latency_ms; the answer then
+    arrives at tokens_per_second. A call fails with probability error_rate,
+    before its first token. Answers are canned per prompt kind (refine,
+    format, reformulate, generate) and quote the first verse in the prompt.
+    """
+
+    name = "mock"
+    available = True
+
+    _SOURCE = re.compile(r'Source: [^\n]*?(\d+\.\d+)')
+    _SECTIONS = (
+        # (prompt marker, section start, section end) of the text to echo back
+        ("ROUGH RESPONSE TO IMPROVE:", "ROUGH RESPONSE TO IMPROVE:\n", "\n\nYOUR TASK:"),
+        ("Here is the text to format:", "Here is the text to format:\n\n", "\n\nReturn ONLY"),
+    )
+
+    def __init__(
+        self,
+        latency_ms: float = 600.0,
+        latency_sigma: float = 0.5,
+        tokens_per_second: float = 80.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            latency_ms: Median time to first token
+            latency_sigma: Log-normal spread of the time to first token (0 = fixed)
+            tokens_per_second: Streaming rate after the first token (0 = instant)
+            error_rate: Probability that a call fails
+            seed: Random seed, for reproducible runs
+        """
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+
+    def first_token_seconds(self) -> float:
+        """Sample a time to first token"""
+        return self._random.lognormvariate(0.0, self.latency_sigma) * self.latency_ms / 1000 if self.latency_ms > 0 else 0.0
+
+    def respond(self, prompt: str, max_output_tokens: int) -> str:
+        """Canned answer for a prompt, capped at max_output_tokens"""
+        if "Return ONLY the refined search query" in prompt:
+            text = "detachment from the fruits of action"
+        else:
+            text = next(
+                (self._section(prompt, start, end) for marker, start, end in self._SECTIONS if marker in prompt),
+                None
+            )
+            if text is None:
+                text = self._answer(prompt)
+        return text[:max_output_tokens * CHARS_PER_TOKEN]
+
+    def _section(self, prompt: str, start: str, end: str) -> str:
+        begin = prompt.index(start) + len(start)
+        stop = prompt.find(end, begin)
+        return prompt[begin:stop if stop >= 0 else None].strip()
+
+    def _answer(self, prompt: str) -> str:
+        source = self._SOURCE.search(prompt)
+        reference = source.group(1) if source else "2.47"
+        answer = (
+            "I hear what you are carrying, and it is a real weight.\n\n"
+            f"In Bhagavad Gita {reference}, Krishna says: \"You have a right to your actions, "
+            "but never to the fruits of your actions.\"\n\n"
+            "Krishna is teaching Arjuna to give his full effort and release the outcome. "
+            "Worry about results only divides the mind.\n\n"
+            "Today, choose one task and do it as an offering, without counting what it will bring.\n\n"
+            "What would change if you let go of the outcome?"
+        )
+        if "CITATIONS:" in prompt:
+            answer += f"\n\nCITATIONS: {reference}"
+        return answer
+
+    async def _start(self):
+        """Wait for the first token; maybe fail"""
+        self.calls += 1
+        await asyncio.sleep(self.first_token_seconds())
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            raise MockLLMError("Simulated LLM upstream error")
+
+    def _token_seconds(self, text: str) -> float:
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return len(text) / CHARS_PER_TOKEN / self.tokens_per_second
+
+    async def generate(self, prompt, temperature, max_output_tokens, top_p=None) -> str:
+        await self._start()
+        text = self.respond(prompt, max_output_tokens)
+        await asyncio.sleep(self._token_seconds(text))
+        return text
+
+    async def generate_stream(self, prompt, temperature, max_output_tokens, top_p=None):
+        await self._start()
+        text = self.respond(prompt, max_output_tokens)
+        # Gemini streams a few tokens per chunk
+        chunk_chars = 4 * CHARS_PER_TOKEN
+        for i in range(0, len(text), chunk_chars):
+            chunk = text[i:i + chunk_chars]
+            if i:
+                await asyncio.sleep(self._token_seconds(chunk))
+            yield chunk
+
+    def get_stats(self) -> Dict:
+        return {"calls": self.calls, "errors": self.errors}
+
+
+def create_llm_backend(backend: str, api_key: Optional[str] = None) -> LLMBackend:
+    """
+    Build an LLM backend from settings
+
+    Raises:
+        ValueError: If backend is not one of LLM_BACKENDS
+    """
+    if backend == "gemini":
+        return GeminiBackend(api_key if api_key is not None else settings.GEMINI_API_KEY, settings.GEMINI_MODEL)
+    if backend == "mock":
+        return MockBackend(
+            latency_ms=settings.MOCK_LLM_LATENCY_MS,
+            latency_sigma=settings.MOCK_LLM_LATENCY_SIGMA,
+            tokens_per_second=settings.MOCK_LLM_TOKENS_PER_SECOND,
+            error_rate=settings.MOCK_LLM_ERROR_RATE,
+            seed=settings.MOCK_LLM_SEED
+        )
+    raise ValueError(f"Unknown LLM backend '{backend}', expected one of {LLM_BACKENDS}")
+
+
+# Singleton instances, one per (backend, API key)
+_backends: Dict[tuple, LLMBackend] = {}
+
+
+def get_llm_backend(api_key: Optional[str] = None) -> LLMBackend:
+    """Get or create the LLM_BACKEND shared by the LLM clients, behind the call scheduler"""
+    # Imported here: the scheduler module builds on LLMBackend
+    from llm.scheduler import create_llm_scheduler
+
+    key = (settings.LLM_BACKEND, api_key if settings.LLM_BACKEND == "gemini" else None)
+    if key not in _backends:
+        _backends[key] = create_llm_scheduler(create_llm_backend(settings.LLM_BACKEND, api_key))
+        logger.info(f"LLM backend: {settings.LLM_BACKEND}")
+    return _backends[key]
@@ -2,18 +2,43 @@
 Response Formatter Service - Ensures responses are well-formatted and readable
 """
 import logging
-from typing import Optional
+import re
+from typing import List, Optional
+
+from llm.backend import get_llm_backend
+from llm.trace import llm_call
 
 logger = logging.getLogger(__name__)
 
-# Try to import Google Generative AI SDK
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except Exception as e:
-    genai = None
-    GEMINI_AVAILABLE = False
-    logger.error(f"Failed to import Google Generative AI SDK: {str(e)}")
+
+# Answer structure used by the reformatter, and folded into the generation
+# prompt when streaming without a reformulation pass
+ANSWER_STRUCTURE = """1. BRIEF ACKNOWLEDGMENT (1-2 sentences)
+   - Acknowledge their feeling/question warmly
+
+2. BHAGAVAD GITA VERSE (Must include if verses are available)
+   - Quote the specific verse with chapter and verse number
+   - Use the exact verse text provided in context
+   - Format: "In Bhagavad Gita [Chapter].[Verse], Krishna teaches: '[verse text]'"
+
+3. EXPLANATION (2-3 sentences)
+   - Explain what this verse means in simple language
+   - Connect it to their specific situation
+
+4. PRACTICAL APPLICATION (2-3 sentences)
+   - How they can apply this wisdom
+   - Make it relevant to modern life
+
+5. ENGAGING QUESTION (1 sentence)
+   - Ask them something to reflect on
+
+CRITICAL FORMATTING RULES:
+- Add a BLANK LINE between EACH section (press Enter twice)
+- Keep paragraphs SHORT (2-3 sentences max)
+- NO markdown (*bold*, **italic**)
+- Write in simple, conversational English
+- Make it feel warm and personal, not robotic
+- Use actual line breaks, not the text "\\n\\n\""""
 
 
 class ResponseReformatter:
@@ -30,25 +55,13 @@ class ResponseReformatter:
             api_key: Gemini API key
         """
         self.api_key = api_key
-        self.model = None
-        self.available = False
-
-        if not GEMINI_AVAILABLE:
-            logger.error("Google Generative AI SDK not available")
-            return
-
-        if not api_key:
-            logger.warning("API key not provided - reformatter will not be available")
-            return
+        self.backend = get_llm_backend(api_key)
+        self.available = self.backend.available
 
-        try:
-            genai.configure(api_key=self.api_key)
-            # Use Gemini Flash for intelligent reformulation
-            self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
-            self.available = True
+        if self.available:
             logger.info("Response Reformatter initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize reformatter: {str(e)}")
+        else:
+            logger.warning("LLM backend not available - reformatter will not be available")
 
     async def reformulate_response(self, original_response: str, user_query: str, context_verses: str) -> str:
         """
@@ -62,7 +75,7 @@ class ResponseReformatter:
         Returns:
             Reformulated response that's easy to understand
         """
-        if not self.available or not self.model:
+        if not self.available:
             logger.warning("Reformatter not available, returning original")
             return original_response
 
@@ -81,44 +94,18 @@ ROUGH RESPONSE TO IMPROVE:
 YOUR TASK:
 Reformulate this into a clear, structured response that a normal person can understand. Follow this EXACT structure:
 
-1. BRIEF ACKNOWLEDGMENT (1-2 sentences)
-   - Acknowledge their feeling/question warmly
-
-2. BHAGAVAD GITA VERSE (Must include if verses are available)
-   - Quote the specific verse with chapter and verse number
-   - Use the exact verse text provided in context
-   - Format: "In Bhagavad Gita [Chapter].[Verse], Krishna teaches: '[verse text]'"
-
-3. EXPLANATION (2-3 sentences)
-   - Explain what this verse means in simple language
-   - Connect it to their specific situation
-
-4. PRACTICAL APPLICATION (2-3 sentences)
-   - How they can apply this wisdom
-   - Make it relevant to modern life
-
-5. ENGAGING QUESTION (1 sentence)
-   - Ask them something to reflect on
-
-CRITICAL FORMATTING RULES:
-- Add a BLANK LINE between EACH section (press Enter twice)
-- Keep paragraphs SHORT (2-3 sentences max)
-- NO markdown (*bold*, **italic**)
-- Write in simple, conversational English
-- Make it feel warm and personal, not robotic
-- Use actual line breaks, not the text "\\n\\n"
+{ANSWER_STRUCTURE}
 
 OUTPUT ONLY THE REFORMULATED RESPONSE. Nothing else."""
 
-            response = await self.model.generate_content_async(
-                reformulation_prompt,
-                generation_config=genai.types.GenerationConfig(
+            with llm_call("reformulate"):
+                response_text = await self.backend.generate(
+                    reformulation_prompt,
                     temperature=0.7,  # Balanced for natural but consistent output
-                    max_output_tokens=1024,
+                    max_output_tokens=1024
                 )
-            )
 
-            reformulated = response.text.strip()
+            reformulated = response_text.strip()
 
             logger.info(f"Successfully reformulated response ({len(original_response)} -> {len(reformulated)} chars)")
 
@@ -142,25 +129,13 @@ class ResponseFormatter:
             api_key: Gemini API key
         """
         self.api_key = api_key
-        self.model = None
-        self.available = False
-
-        if not GEMINI_AVAILABLE:
-            logger.error("Google Generative AI SDK not available")
-            return
+        self.backend = get_llm_backend(api_key)
+        self.available = self.backend.available
 
-        if not api_key:
-            logger.warning("API key not provided - formatter will not be available")
-            return
-
-        try:
-            genai.configure(api_key=self.api_key)
-            # Use a fast, lightweight model for formatting
-            self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
-            self.available = True
+        if self.available:
             logger.info("Response Formatter initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize formatter: {str(e)}")
+        else:
+            logger.warning("LLM backend not available - formatter will not be available")
 
     async def format_response(self, text: str) -> str:
         """
@@ -172,7 +147,7 @@ class ResponseFormatter:
         Returns:
             Formatted response with proper paragraph breaks
         """
-        if not self.available or not self.model:
+        if not self.available:
             logger.warning("Formatter not available, returning original text")
             return text
 
@@ -199,15 +174,14 @@ Here is the text to format:
 
 Return ONLY the formatted text with proper paragraph breaks. Nothing else."""
 
-            response = await self.model.generate_content_async(
-                formatting_prompt,
-                generation_config=genai.types.GenerationConfig(
+            with llm_call("format"):
+                response_text = await self.backend.generate(
+                    formatting_prompt,
                     temperature=0.1,  # Very low temperature for consistency
-                    max_output_tokens=2048,
+                    max_output_tokens=2048
                 )
-            )
 
-            formatted_text = response.text.strip()
+            formatted_text = response_text.strip()
 
             logger.info(f"Successfully formatted response ({len(text)} -> {len(formatted_text)} chars)")
 
@@ -231,24 +205,13 @@ class QueryRefiner:
             api_key: Gemini API key
         """
         self.api_key = api_key
-        self.model = None
-        self.available = False
+        self.backend = get_llm_backend(api_key)
+        self.available = self.backend.available
 
-        if not GEMINI_AVAILABLE:
-            logger.error("Google Generative AI SDK not available")
-            return
-
-        if not api_key:
-            logger.warning("API key not provided - refiner will not be available")
-            return
-
-        try:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
-            self.available = True
+        if self.available:
             logger.info("Query Refiner initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize refiner: {str(e)}")
+        else:
+            logger.warning("LLM backend not available - refiner will not be available")
 
     async def refine_query(self, query: str, language: str = "en") -> str:
         """
@@ -261,7 +224,7 @@ class QueryRefiner:
         Returns:
             Refined query optimized for scripture search
         """
-        if not self.available or not self.model:
+        if not self.available:
             logger.warning("Refiner not available, returning original query")
             return query
 
@@ -289,15 +252,14 @@ User question: "{query}"
 
 Return ONLY the refined search query. Nothing else. No explanations."""
 
-            response = await self.model.generate_content_async(
-                refining_prompt,
-                generation_config=genai.types.GenerationConfig(
+            with llm_call("refine"):
+                response_text = await self.backend.generate(
+                    refining_prompt,
                     temperature=0.3,
-                    max_output_tokens=50,
+                    max_output_tokens=50
                 )
-            )
 
-            refined_query = response.text.strip().strip('"').strip("'")
+            refined_query = response_text.strip().strip('"').strip("'")
 
             logger.info(f"Refined query: '{query}' -> '{refined_query}'")
 
@@ -344,6 +306,113 @@ def get_reformatter(api_key: Optional[str] = None) -> Optional[ResponseReformatt
     return _reformatter
 
 
+class StreamFormatter:
+    """
+    Incremental cleanup of a streamed LLM answer
+
+    Every chunk is cleaned and passed on as soon as it arrives: markdown
+    asterisks are dropped, literal "\\n" sequences become line breaks, a
+    missing space after a sentence end is restored ("upset.Krishna") and
+    runs of blank lines are collapsed. The few trailing characters that
+    could combine with the next chunk are held back until it arrives.
+    """
+
+    ASTERISKS = re.compile(r'\*+')
+    LITERAL_NEWLINE = re.compile(r'\\n')
+    MISSING_SPACE = re.compile(r'([.!?])([A-Z])')
+    BLANK_LINES = re.compile(r'\n{3,}')
+    # Sentence ends, asterisks, backslashes and line breaks at the end of a chunk
+    UNSAFE_TAIL = re.compile(r'(?:[.!?*\n\\]|\\n)+$')
+
+    def __init__(self):
+        self._pending = ""
+        self._started = False
+
+    def _clean(self, text: str) -> str:
+        text = self.LITERAL_NEWLINE.sub("\n", text)
+        text = self.ASTERISKS.sub("", text)
+        text = self.MISSING_SPACE.sub(r"\1 \2", text)
+        text = self.BLANK_LINES.sub("\n\n", text)
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+    def feed(self, chunk: str) -> str:
+        """
+        Add a chunk of generated text
+
+        Returns:
+            Cleaned text that is safe to send now (may be empty)
+        """
+        text = self._pending + chunk
+        tail = self.UNSAFE_TAIL.search(text)
+        cut = tail.start() if tail else len(text)
+        self._pending = text[cut:]
+        return self._clean(text[:cut])
+
+    def flush(self) -> str:
+        """Clean and return whatever is still held back at the end of the stream"""
+        text, self._pending = self._pending, ""
+        return self._clean(text).rstrip()
+
+
+# Paragraph formatting patterns, shared by ensure_paragraph_breaks and
+# StreamingParagraphFormatter
+VERSE_MARKER = "__VERSE__"
+GITA_ANCHOR = "In Bhagavad Gita "
+KRISHNA_ANCHOR = "Krishna says:"
+
+_MISSING_SPACE = re.compile(r'([.!?])([A-Z])')  # "upset.Krishna" -> "upset. Krishna"
+_RUN_ON_SAYS = re.compile(r'([a-z])([A-Z][a-z]+\s+says:)')  # "upsetKrishna says:" -> "upset Krishna says:"
+_RUN_ON_GITA = re.compile(r'([.!?])In\s+Bhagavad')  # "text.In Bhagavad" -> "text. In Bhagavad"
+_GITA_VERSE = re.compile(r'(In Bhagavad Gita \d+\.\d+[^.!?]*[:.][^"]*"[^"]*")')
+_KRISHNA_VERSE = re.compile(r'(Krishna says:[^"]*"[^"]*")')
+_VERSE_BLOCK = r'\n\n' + VERSE_MARKER + r'\1' + VERSE_MARKER + r'\n\n'
+_SENTENCE_END = re.compile(r'([.!?])\s+')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+_CHAPTER_VERSE = re.compile(r'\d+\.\d+')
+_SENTENCE_BOUNDARY = re.compile(r'[.!?]\s+(?=\S)')
+
+
+def _fix_run_ons(text: str) -> str:
+    """Restore missing spaces between run-on sentences"""
+    text = _MISSING_SPACE.sub(r'\1 \2', text)
+    text = _RUN_ON_SAYS.sub(r'\1 \2', text)
+    return _RUN_ON_GITA.sub(r'\1 In Bhagavad', text)
+
+
+def _protect_verses(text: str) -> str:
+    """Fix run-on sentences and fence verse quotes so they are never split"""
+    text = _GITA_VERSE.sub(_VERSE_BLOCK, _fix_run_ons(text))
+    return _KRISHNA_VERSE.sub(_VERSE_BLOCK, text)
+
+
+class _ParagraphBuilder:
+    """Groups sentences two at a time into paragraphs"""
+
+    def __init__(self):
+        self.sentences: List[str] = []
+
+    def add(self, sentence: str, punct: str) -> Optional[str]:
+        """Add a sentence; returns the paragraph it completes, if any"""
+        if not sentence.strip() or sentence.strip() == VERSE_MARKER:
+            return None
+        self.sentences.append(sentence + punct)
+        if len(self.sentences) < 2:
+            return None
+        return self.finish()
+
+    def finish(self) -> Optional[str]:
+        """The unfinished paragraph, if any"""
+        paragraph = ' '.join(self.sentences).strip()
+        self.sentences = []
+        if paragraph and paragraph != VERSE_MARKER:
+            return paragraph
+        return None
+
+
 def ensure_paragraph_breaks(text: str) -> str:
     """
     Ensure text has proper paragraph breaks for readability
@@ -359,61 +428,227 @@ def ensure_paragraph_breaks(text: str) -> str:
     if text.count('\n\n') >= 3:
         return text
 
-    import re
+    sentences = _SENTENCE_END.split(_protect_verses(text))
 
-    # Fix common spacing issues first
-    # Fix missing spaces before capital letters (like "upset.Krishna" -> "upset. Krishna")
-    text = re.sub(r'([.!?])([A-Z])', r'\1 \2', text)
+    # Two sentences per paragraph; text after the last sentence end is dropped
+    builder = _ParagraphBuilder()
+    paragraphs = [builder.add(sentence, punct) for sentence, punct in zip(sentences[0::2], sentences[1::2])]
+    paragraphs.append(builder.finish())
 
-    # Fix run-on words before common phrases
-    text = re.sub(r'([a-z])([A-Z][a-z]+\s+says:)', r'\1 \2', text)  # "upset.Krishna says:" -> "upset. Krishna says:"
-    text = re.sub(r'([.!?])In\s+Bhagavad', r'\1 In Bhagavad', text)  # Fix "text.In Bhagavad"
+    formatted = '\n\n'.join(filter(None, paragraphs))
+    formatted = formatted.replace(VERSE_MARKER, '').strip()
+    return _BLANK_LINES.sub('\n\n', formatted)
 
-    # Protect quotes and Gita references
-    text = re.sub(r'(In Bhagavad Gita \d+\.\d+[^.!?]*[:.][^"]*"[^"]*")', r'\n\n__VERSE__\1__VERSE__\n\n', text)
-    text = re.sub(r'(Krishna says:[^"]*"[^"]*")', r'\n\n__VERSE__\1__VERSE__\n\n', text)
 
-    # Split into sentences
-    sentences = re.split(r'([.!?])\s+', text)
+def _partial_anchor_at_end(text: str, anchor: str) -> bool:
+    """Whether text ends with a proper prefix of anchor"""
+    return any(text.endswith(anchor[:size]) for size in range(1, len(anchor)))
 
-    # Reconstruct with breaks every 2 sentences
-    result = []
-    current_para = []
-    sent_count = 0
 
-    for i in range(0, len(sentences) - 1, 2):
-        sent = sentences[i]
-        punct = sentences[i + 1] if i + 1 < len(sentences) else ''
+def _gita_verses_resolved(text: str) -> bool:
+    """
+    Whether every _GITA_VERSE match attempt in text is decided by text alone
 
-        # Skip empty
-        if not sent.strip() or sent.strip() in ['__VERSE__']:
+    Mirrors the regex: after the chapter.verse number, the greedy [^.!?]*
+    runs to the first sentence end; the [:.] is tried there first (if it is
+    a '.'), then at every ':' before it from the right, and the first one
+    with two quotes after it wins. Until two quotes follow the first
+    candidate, more text could still change the match.
+    """
+    if _partial_anchor_at_end(text, GITA_ANCHOR):
+        return False
+
+    pos = 0
+    while True:
+        start = text.find(GITA_ANCHOR, pos)
+        if start < 0:
+            return True
+
+        number_start = start + len(GITA_ANCHOR)
+        number = _CHAPTER_VERSE.match(text, number_start)
+        if number is None:
+            rest = text[number_start:]
+            if not rest or re.fullmatch(r'\d+\.?', rest):
+                return False  # Number may continue in the next chunk
+            pos = start + 1
             continue
 
-        current_para.append(sent + punct)
-        sent_count += 1
+        end = next((i for i in range(number.end(), len(text)) if text[i] in '.!?'), -1)
+        if end < 0:
+            return False  # Run before the [:.] may continue
 
-        # Break after 2 sentences
-        if sent_count >= 2:
-            para_text = ' '.join(current_para).strip()
-            if para_text and para_text != '__VERSE__':
-                result.append(para_text)
-            current_para = []
-            sent_count = 0
+        candidates = ([end] if text[end] == '.' else []) + [
+            i for i in range(end - 1, number.end() - 1, -1) if text[i] == ':'
+        ]
+        if not candidates:
+            pos = start + 1
+            continue
 
-    # Add remaining
-    if current_para:
-        para_text = ' '.join(current_para).strip()
-        if para_text and para_text != '__VERSE__':
-            result.append(para_text)
+        first_quote = text.find('"', candidates[0] + 1)
+        second_quote = text.find('"', first_quote + 1) if first_quote >= 0 else -1
+        if second_quote < 0:
+            return False
+        pos = second_quote + 1
 
-    # Join with blank lines
-    formatted = '\n\n'.join(filter(None, result))
 
-    # Remove verse markers
-    formatted = formatted.replace('__VERSE__', '').strip()
+def _krishna_verses_resolved(text: str) -> bool:
+    """Whether every _KRISHNA_VERSE match in text is decided (two quotes follow each anchor)"""
+    if _partial_anchor_at_end(text, KRISHNA_ANCHOR):
+        return False
 
-    # Clean up multiple consecutive blank lines
-    while '\n\n\n' in formatted:
-        formatted = formatted.replace('\n\n\n', '\n\n')
+    pos = 0
+    while True:
+        start = text.find(KRISHNA_ANCHOR, pos)
+        if start < 0:
+            return True
+        first_quote = text.find('"', start + len(KRISHNA_ANCHOR))
+        second_quote = text.find('"', first_quote + 1) if first_quote >= 0 else -1
+        if second_quote < 0:
+            return False
+        pos = second_quote + 1
 
-    return formatted
+
+def _safe_to_cut(segment: str) -> bool:
+    """Whether segment formats the same no matter what text follows it"""
+    text = _fix_run_ons(segment)
+    if not _gita_verses_resolved(text):
+        return False
+    return _krishna_verses_resolved(_GITA_VERSE.sub(_VERSE_BLOCK, text))
+
+
+class StreamingParagraphFormatter:
+    """
+    Incremental ensure_paragraph_breaks for a streamed answer
+
+    Token chunks go in; formatted paragraphs come out as soon as their
+    sentence boundaries are known. The raw stream is cut only at sentence
+    ends ("[.!?]" + whitespace) where no verse quote can still span the
+    cut, so every segment is transformed exactly as the batch function
+    would. A verse opened by "In Bhagavad Gita X.Y" or "Krishna says:"
+    holds output back until its closing quote arrives.
+
+    The concatenated output equals ensure_paragraph_breaks(full text),
+    with one exception: the batch function returns text with three or more
+    blank lines unchanged. The stream switches to pass-through when the
+    third blank line arrives before any paragraph was emitted. Once output
+    has started, it keeps formatting.
+    """
+
+    def __init__(self):
+        self._pending = ""  # Raw text not yet cut into a segment
+        self._transformed = ""  # Segments transformed but not yet split into sentences
+        self._builder = _ParagraphBuilder()
+        self._paragraphs = 0
+
+        # Raw "\n\n" count, as text.count('\n\n') over the whole stream
+        self._breaks = 0
+        self._newline_run = 0
+        self._raw: Optional[List[str]] = []  # Kept until output starts
+        self._passthrough = False
+
+        # Output assembly: trailing whitespace is held until more text follows
+        self._started = False
+        self._held = ""
+
+    def _count_breaks(self, chunk: str):
+        for char in chunk:
+            if char == '\n':
+                self._newline_run += 1
+                if self._newline_run % 2 == 0:
+                    self._breaks += 1
+            else:
+                self._newline_run = 0
+
+    def _emit(self, paragraph: str) -> str:
+        """Join a paragraph onto the output (marker removal, strip, blank-line collapse)"""
+        text = paragraph if self._paragraphs == 0 else '\n\n' + paragraph
+        self._paragraphs += 1
+
+        text = text.replace(VERSE_MARKER, '')
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+
+        combined = self._held + text
+        body = combined.rstrip()
+        self._held = combined[len(body):]
+        if not body:
+            return ""
+        self._started = True
+        self._raw = None
+        return _BLANK_LINES.sub('\n\n', body)
+
+    def _next_segment_known(self) -> bool:
+        """Whether the next transformed segment can't start with whitespace or a verse fence"""
+        # Pending text always starts after a complete whitespace run; a fence
+        # is only inserted where it starts with a verse anchor
+        head = self._pending[:len(GITA_ANCHOR)]
+        return bool(head) and not any(
+            head.startswith(anchor[:len(head)]) for anchor in (GITA_ANCHOR, KRISHNA_ANCHOR)
+        )
+
+    def _split(self, final: bool) -> str:
+        """Turn complete sentences of the transformed text into paragraphs"""
+        output = []
+        pos = 0
+        text = self._transformed
+        complete = final or self._next_segment_known()
+        while True:
+            match = _SENTENCE_END.search(text, pos)
+            # The whitespace run (and a verse fence after it) may continue in the next segment
+            if match is None or (match.end() == len(text) and not complete):
+                break
+            paragraph = self._builder.add(text[pos:match.start()], match.group(1))
+            if paragraph:
+                output.append(self._emit(paragraph))
+            pos = match.end()
+
+        self._transformed = text[pos:]
+        return "".join(output)
+
+    def feed(self, chunk: str) -> str:
+        """
+        Add a chunk of generated text
+
+        Returns:
+            Formatted text that is final (may be empty)
+        """
+        if self._passthrough:
+            return chunk
+
+        self._count_breaks(chunk)
+        if self._raw is not None:
+            self._raw.append(chunk)
+            if self._breaks >= 3:
+                # Already well broken: the batch function returns it as-is
+                self._passthrough = True
+                return "".join(self._raw)
+
+        # Whether a cut is safe depends only on the text before it, so only
+        # boundaries completed by this chunk need checking
+        scan_from = len(self._pending.rstrip()) - 1
+        self._pending += chunk
+        cuts = [m.end() for m in _SENTENCE_BOUNDARY.finditer(self._pending, max(scan_from, 0))]
+        for cut in reversed(cuts):
+            if _safe_to_cut(self._pending[:cut]):
+                self._transformed += _protect_verses(self._pending[:cut])
+                self._pending = self._pending[cut:]
+                break
+
+        return self._split(final=False)
+
+    def flush(self) -> str:
+        """Format the rest of the stream; text after the last sentence end is dropped"""
+        if self._passthrough:
+            return ""
+
+        self._transformed += _protect_verses(self._pending)
+        self._pending = ""
+        output = self._split(final=True)
+
+        paragraph = self._builder.finish()
+        if paragraph:
+            output += self._emit(paragraph)
+        self._held = ""
+        return output
@@ -0,0 +1,165 @@
+"""
+Token-budgeted prompt assembly
+
+The generation prompt carries the system prompt, conversation history,
+retrieved verses and a long block of instructions. Without a bound its size
+(and Gemini's time to first token) grows with the history and with long
+verse passages. Here tokens are estimated locally and the prompt budget
+(LLM_PROMPT_TOKEN_BUDGET) is split across its parts:
+- system prompt, instructions and the user's message are always kept
+- retrieved verses get up to LLM_PROMPT_CONTEXT_TOKENS; the lowest-scored
+  verses are dropped first, and a verse that does not fit whole is cut
+  down (passage first, then verse text) if enough room is left
+- conversation history gets what the verses left, up to
+  LLM_PROMPT_HISTORY_TOKENS; the newest messages are kept first, then the
+  rolling summary
+
+The estimate approximates a SentencePiece tokenizer: short English words
+are one token, longer words one more per 6 letters, every digit and symbol
+one token, and Devanagari (and other non-Latin scripts) about one token per
+3 characters. It errs on the high side.
+"""
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Latin words, single digits, Devanagari runs (vowel signs are not \w), other letters, any other symbol
+_PIECE = re.compile(r'[A-Za-z]+|\d|[\u0900-\u097F]+|[^\W\d_]+|\S')
+
+LATIN_CHARS_PER_TOKEN = 6
+OTHER_CHARS_PER_TOKEN = 3
+ELLIPSIS = "..."
+
+
+def _piece_tokens(piece: str) -> int:
+    first = piece[0]
+    if first.isascii():
+        return 1 + (len(piece) - 1) // LATIN_CHARS_PER_TOKEN if first.isalpha() else 1
+    return 1 + (len(piece) - 1) // OTHER_CHARS_PER_TOKEN
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text"""
+    return sum(_piece_tokens(piece) for piece in _PIECE.findall(text or ""))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of text (ending at a token boundary, plus "...") within max_tokens"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    room = max_tokens - len(ELLIPSIS)
+    used, end = 0, 0
+    for match in _PIECE.finditer(text):
+        used += _piece_tokens(match.group())
+        if used > room:
+            break
+        end = match.end()
+    return text[:end].rstrip() + ELLIPSIS if end else ""
+
+
+class PromptBudget:
+    """
+    Token allotments of a prompt
+    """
+
+    def __init__(self, total: int = 3200, history: int = 800, context: int = 1200, min_doc_tokens: int = 60):
+        """
+        Args:
+            total: Whole prompt
+            history: Most the conversation history may take
+            context: Most the retrieved verses may take
+            min_doc_tokens: Smallest room a verse is cut down to fit into
+        """
+        self.total = total
+        self.history = history
+        self.context = context
+        self.min_doc_tokens = min_doc_tokens
+
+    def context_room(self, fixed_tokens: int) -> int:
+        """Tokens for the verses, served first: they ground the answer"""
+        return min(self.context, max(0, self.total - fixed_tokens))
+
+    def history_room(self, fixed_tokens: int, context_tokens: int) -> int:
+        """Tokens for the history: what the verses left, up to its allotment"""
+        return min(self.history, max(0, self.total - fixed_tokens - context_tokens))
+
+
+def fit_docs(
+    docs: List[Dict],
+    render: Callable[[Dict], str],
+    max_tokens: int,
+    min_doc_tokens: int = 60
+) -> Tuple[List[Dict], int, int]:
+    """
+    Docs that fit in max_tokens, taken best score first, in their original order
+
+    Args:
+        docs: Retrieved docs with a "score"
+        render: How a doc appears in the prompt
+        max_tokens: Token allotment of all docs
+        min_doc_tokens: A doc that doesn't fit whole is cut down only if this much room is left
+
+    Returns:
+        Tuple of (kept docs, dropped count, truncated count)
+    """
+    kept: Dict[int, Dict] = {}
+    used, truncated = 0, 0
+    for i in sorted(range(len(docs)), key=lambda i: docs[i].get("score", 0.0), reverse=True):
+        tokens = estimate_tokens(render(docs[i]))
+        if used + tokens <= max_tokens:
+            kept[i] = docs[i]
+            used += tokens
+            continue
+        room = max_tokens - used
+        if room >= min_doc_tokens:
+            shrunk = _shrink(docs[i], render, room)
+            if shrunk is not None:
+                kept[i] = shrunk
+                used += estimate_tokens(render(shrunk))
+                truncated += 1
+    return [kept[i] for i in sorted(kept)], len(docs) - len(kept), truncated
+
+
+def _shrink(doc: Dict, render: Callable[[Dict], str], max_tokens: int) -> Optional[Dict]:
+    """Copy of doc within max_tokens: without its passage, then with its text cut; None if impossible"""
+    doc = {key: value for key, value in doc.items() if key != "passage"}
+    overhead = estimate_tokens(render({**doc, "text": ""}))
+    if overhead + len(ELLIPSIS) >= max_tokens:
+        return None
+    doc["text"] = truncate_to_tokens(doc.get("text", ""), max_tokens - overhead)
+    return doc
+
+
+def fit_history(messages: Optional[List[Dict]], max_tokens: int, max_messages: int = 6) -> Tuple[List[Dict], int]:
+    """
+    Conversation history within max_tokens
+
+    The newest of the last max_messages messages are kept first; a
+    "summary" entry (server-side sessions) fills the room left, cut down if
+    needed. A message that doesn't fit ends the history there.
+
+    Returns:
+        Tuple of (kept messages in order, dropped count)
+    """
+    if not messages:
+        return [], 0
+    summaries = [msg for msg in messages if msg.get("role") == "summary"]
+    recent = [msg for msg in messages if msg.get("role") != "summary"][-max_messages:]
+
+    kept: List[Dict] = []
+    used = 0
+    for msg in reversed(recent):
+        # "User: " / "You: " prefix and the newline
+        tokens = estimate_tokens(msg.get("content", "")) + 3
+        if used + tokens > max_tokens:
+            break
+        kept.insert(0, msg)
+        used += tokens
+
+    for summary in summaries:
+        room = max_tokens - used - 3
+        content = truncate_to_tokens(summary.get("content", ""), room) if room > len(ELLIPSIS) else ""
+        if content:
+            kept.insert(0, {**summary, "content": content})
+            used += estimate_tokens(content) + 3
+
+    return kept, len(messages) - len(kept)
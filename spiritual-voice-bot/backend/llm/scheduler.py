@@ -0,0 +1,384 @@
+"""
+Shared scheduler for LLM calls
+
+Every LLM client goes through one LLMScheduler wrapped around the backend:
+- a bounded semaphore caps calls in flight; the rest wait for a slot
+- each attempt (slot wait included) has a deadline; streams have one per chunk
+- failed or late attempts are retried with full-jitter exponential backoff
+- optionally, a duplicate (hedged) request is sent once the first is slower
+  than the recent p95, and whichever answers first wins
+- a circuit breaker opens after consecutive failures: calls fail instantly
+  (clients fall back to templates) until a trial call succeeds
+"""
+import time
+import random
+import asyncio
+import logging
+import weakref
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+import numpy as np
+
+from config import settings
+from llm.backend import LLMBackend
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept for the hedge delay
+LATENCY_WINDOW = 200
+
+
+class CircuitOpenError(RuntimeError):
+    """The LLM upstream is marked unhealthy; the call was not attempted"""
+
+
+class LLMTimeoutError(RuntimeError):
+    """An LLM call missed its deadline"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    closed: calls go through. After `failures` consecutive failures the
+    circuit opens and calls are rejected for reset_seconds; then one trial
+    call is let through (half-open). Its success closes the circuit, its
+    failure opens it again.
+    """
+
+    def __init__(self, failures: int = 5, reset_seconds: float = 30.0):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (claims the half-open trial)"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def failure(self):
+        self.consecutive_failures += 1
+        trial, self.trial_in_flight = self.trial_in_flight, False
+        if trial or (self.opened_at is None and self.consecutive_failures >= self.failures):
+            logger.warning(f"LLM circuit opened after {self.consecutive_failures} consecutive failures")
+            self.opened += 1
+            self.opened_at = time.monotonic()
+
+
+class LLMScheduler(LLMBackend):
+    """
+    LLMBackend wrapper adding concurrency limits, deadlines, retries,
+    hedged requests and a circuit breaker
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        max_concurrency: int = 16,
+        deadline_seconds: float = 15.0,
+        retries: int = 2,
+        backoff_seconds: float = 0.2,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        """
+        Args:
+            backend: Backend that makes the actual calls
+            max_concurrency: Calls in flight at once
+            deadline_seconds: Per attempt, including the wait for a slot (streams: per chunk)
+            retries: Extra attempts after a failed or late one
+            backoff_seconds: Base of the full-jitter exponential backoff
+            hedge: Send a duplicate request when the first is slower than the quantile
+            hedge_quantile: Latency quantile after which the duplicate is sent
+            hedge_min_samples: Latency samples needed before hedging starts
+            breaker: Circuit breaker (default: 5 failures, 30s)
+        """
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.deadline_seconds = deadline_seconds
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+
+        # asyncio primitives bind to one event loop; keep a semaphore per loop
+        self._semaphores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        # Seconds to a full answer (generate) and to the first chunk (streams)
+        self._latencies: Dict[str, Deque[float]] = {
+            "generate": deque(maxlen=LATENCY_WINDOW),
+            "stream": deque(maxlen=LATENCY_WINDOW)
+        }
+
+        self.in_flight = 0
+        self.calls = 0
+        self.retried = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.short_circuited = 0
+
+    @property
+    def name(self) -> str:
+        return self.backend.name
+
+    @property
+    def available(self) -> bool:
+        return self.backend.available
+
+    @property
+    def circuit_open(self) -> bool:
+        """True while calls are rejected without reaching the upstream"""
+        return self.breaker.state == "open"
+
+    async def warm_up(self):
+        await self.backend.warm_up()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def _check_circuit(self):
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            raise CircuitOpenError("LLM circuit open, upstream marked unhealthy")
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: uniform between 0 and base * 2^attempt"""
+        return random.uniform(0, self.backoff_seconds * (2 ** attempt))
+
+    def hedge_delay(self, kind: str) -> Optional[float]:
+        """Seconds after which a duplicate request is sent, or None"""
+        samples = self._latencies[kind]
+        if not self.hedge or len(samples) < self.hedge_min_samples:
+            return None
+        return float(np.quantile(np.asarray(samples), self.hedge_quantile))
+
+    async def _retrying(self, attempt_call: Callable):
+        """
+        Run attempt_call with retries, feeding the circuit breaker
+
+        The breaker counts calls, not attempts: one failure once the last
+        retry has failed (or the circuit was opened by other calls meanwhile).
+        """
+        self._check_circuit()
+        self.calls += 1
+        for attempt in range(self.retries + 1):
+            try:
+                result = await attempt_call()
+            except asyncio.CancelledError:
+                self.breaker.trial_in_flight = False
+                raise
+            except Exception as e:
+                self.failures += 1
+                if attempt == self.retries:
+                    self.breaker.failure()
+                    raise
+                logger.warning(f"LLM call failed ({str(e) or type(e).__name__}), retry {attempt + 1}/{self.retries}")
+                self.retried += 1
+                await asyncio.sleep(self._backoff(attempt))
+                if self.circuit_open:
+                    self.breaker.failure()
+                    self.short_circuited += 1
+                    raise CircuitOpenError("LLM circuit open, upstream marked unhealthy") from e
+            else:
+                self.breaker.success()
+                return result
+
+    async def _race(self, start: Callable, kind: str, discard: Callable):
+        """
+        Run start(), hedged with a second start() after the hedge delay
+
+        The first successful result wins; discard() cleans up every other
+        success, whether it finished in the same round or later.
+        """
+        delay = self.hedge_delay(kind)
+        if delay is None:
+            return await start()
+
+        first = asyncio.ensure_future(start())
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedges += 1
+                tasks.add(asyncio.ensure_future(start()))
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None]
+                if not winners:
+                    error = next(iter(done)).exception()
+                    continue
+                # Both attempts can finish in the same round: keep the original, discard the other
+                winner = first if first in winners else winners[0]
+                for task in winners:
+                    if task is not winner:
+                        discard(task.result())
+                if winner is not first:
+                    self.hedge_wins += 1
+                return winner.result()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+                task.add_done_callback(lambda t: None if t.cancelled() or t.exception() else discard(t.result()))
+
+    def _timeout(self, what: str) -> LLMTimeoutError:
+        self.timeouts += 1
+        return LLMTimeoutError(f"LLM {what} missed its {self.deadline_seconds:.1f}s deadline")
+
+    async def generate(self, prompt, temperature, max_output_tokens, top_p=None) -> str:
+        async def call():
+            async with self._semaphore():
+                self.in_flight += 1
+                try:
+                    return await self.backend.generate(prompt, temperature, max_output_tokens, top_p)
+                finally:
+                    self.in_flight -= 1
+
+        async def attempt():
+            start = time.perf_counter()
+            try:
+                text = await asyncio.wait_for(call(), self.deadline_seconds)
+            except asyncio.TimeoutError:
+                raise self._timeout("call") from None
+            self._latencies["generate"].append(time.perf_counter() - start)
+            return text
+
+        return await self._retrying(lambda: self._race(attempt, "generate", lambda text: None))
+
+    async def _open_stream(self, prompt, temperature, max_output_tokens, top_p):
+        """
+        Take a slot, start a stream and wait for its first chunk, within the deadline
+
+        Returns:
+            Tuple of (stream, first chunk or None if empty, semaphore to release)
+        """
+        start = time.perf_counter()
+        semaphore = self._semaphore()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.deadline_seconds)
+        except asyncio.TimeoutError:
+            raise self._timeout("call") from None
+
+        self.in_flight += 1
+        stream = self.backend.generate_stream(prompt, temperature, max_output_tokens, top_p)
+        try:
+            remaining = self.deadline_seconds - (time.perf_counter() - start)
+            first = await asyncio.wait_for(stream.__anext__(), max(remaining, 0.0))
+        except StopAsyncIteration:
+            first = None
+        except BaseException as e:
+            await self._close_stream((stream, None, semaphore))
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._timeout("stream") from None
+            raise
+        self._latencies["stream"].append(time.perf_counter() - start)
+        return stream, first, semaphore
+
+    async def _close_stream(self, opened):
+        stream, _, semaphore = opened
+        try:
+            await stream.aclose()
+        except Exception:
+            pass
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    async def generate_stream(self, prompt, temperature, max_output_tokens, top_p=None):
+        """
+        Retries and hedging apply until the first chunk; after that a late
+        or failed chunk ends the stream with an error
+        """
+        def discard(opened):
+            asyncio.ensure_future(self._close_stream(opened))
+
+        opened = await self._retrying(lambda: self._race(
+            lambda: self._open_stream(prompt, temperature, max_output_tokens, top_p), "stream", discard
+        ))
+        stream, first, _ = opened
+        try:
+            if first is None:
+                return
+            yield first
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), self.deadline_seconds)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    # The stream opened as a success; this late chunk is the call's one breaker failure
+                    self.breaker.failure()
+                    raise self._timeout("stream chunk") from None
+                yield chunk
+        finally:
+            await self._close_stream(opened)
+
+    def get_stats(self) -> Dict:
+        """Call, retry, timeout and hedge counters, circuit state and latency quantiles"""
+        stats = {
+            "backend": self.name,
+            "circuit": self.breaker.state,
+            "circuit_opened": self.breaker.opened,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "calls": self.calls,
+            "retries": self.retried,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "short_circuited": self.short_circuited,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins
+        }
+        for kind, samples in self._latencies.items():
+            if samples:
+                p50, p95 = np.quantile(np.asarray(samples), [0.5, 0.95])
+                stats[f"{kind}_ms"] = {"p50": float(p50) * 1000, "p95": float(p95) * 1000}
+        return stats
+
+
+def create_llm_scheduler(backend: LLMBackend) -> LLMScheduler:
+    """Wrap a backend in a scheduler configured from settings"""
+    return LLMScheduler(
+        backend,
+        max_concurrency=settings.LLM_MAX_CONCURRENCY,
+        deadline_seconds=settings.LLM_CALL_DEADLINE_MS / 1000,
+        retries=settings.LLM_RETRIES,
+        backoff_seconds=settings.LLM_RETRY_BACKOFF_MS / 1000,
+        hedge=settings.LLM_HEDGE,
+        hedge_quantile=settings.LLM_HEDGE_QUANTILE,
+        hedge_min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+        breaker=CircuitBreaker(settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET_MS / 1000)
+    )
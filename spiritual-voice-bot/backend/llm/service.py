@@ -1,22 +1,81 @@
 """
 LLM Service for conversational response generation using Google Gemini
+(or the LLM_BACKEND stand-in, see llm/backend.py)
 """
+import re
 import logging
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from config import settings
-from llm.formatter import get_formatter, ResponseFormatter
+from llm.backend import get_llm_backend
+from llm.formatter import ANSWER_STRUCTURE, StreamFormatter, get_formatter, ResponseFormatter
+from llm.prompt import PromptBudget, estimate_tokens, fit_docs, fit_history
+from llm.trace import llm_call, record_prompt
 
 logger = logging.getLogger(__name__)
 
-# Try to import Google Generative AI SDK
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-    logger.info("Google Generative AI SDK loaded successfully")
-except Exception as e:
-    genai = None
-    GEMINI_AVAILABLE = False
-    logger.error(f"Failed to import Google Generative AI SDK: {str(e)}. Install with: pip install google-generativeai")
+# Last line of a single-call plan answer, listing the verses it quoted
+CITATIONS_MARKER = "CITATIONS:"
+_CITATIONS_LINE = re.compile(r'[\s*]*' + CITATIONS_MARKER + r'\**')
+_CITED_VERSE = re.compile(r'(\d+)\.(\d+)')
+# Whitespace, asterisks and capitals at the end of a chunk: maybe the start of the marker
+_MARKER_TAIL = re.compile(r'[\s*]*[A-Z:]*$')
+
+
+def split_citations(text: str) -> Tuple[str, List[str]]:
+    """
+    Split the trailing CITATIONS line off a single-call plan answer
+
+    Returns:
+        Tuple of (answer, cited "chapter.verse" references in order)
+    """
+    matches = list(_CITATIONS_LINE.finditer(text))
+    if not matches:
+        return text, []
+    marker = matches[-1]
+    references = [f"{int(c)}.{int(v)}" for c, v in _CITED_VERSE.findall(text[marker.end():])]
+    return text[:marker.start()], list(dict.fromkeys(references))
+
+
+class CitationTrailer:
+    """
+    Strips the CITATIONS line from a streamed single-call plan answer
+
+    Text before the marker is passed on as it arrives; a tail that could be
+    the start of the marker is held until the next chunk decides it.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._trailer: Optional[str] = None
+        self.references: List[str] = []
+
+    def feed(self, chunk: str) -> str:
+        if self._trailer is not None:
+            self._trailer += chunk
+            return ""
+
+        text = self._pending + chunk
+        marker = _CITATIONS_LINE.search(text)
+        if marker:
+            self._pending, self._trailer = "", text[marker.start():]
+            return text[:marker.start()]
+
+        tail = _MARKER_TAIL.search(text)
+        suffix = text[tail.start():]
+        if not CITATIONS_MARKER.startswith(suffix.lstrip(" \t\n*")):
+            # Only trailing whitespace may still precede the marker
+            suffix = suffix[len(suffix.rstrip()):]
+        cut = len(text) - len(suffix)
+        self._pending = text[cut:]
+        return text[:cut]
+
+    def flush(self) -> str:
+        """Held text that turned out not to be the marker; parses the cited references"""
+        if self._trailer is None:
+            text, self._pending = self._pending, ""
+            return text
+        _, self.references = split_citations(self._trailer)
+        return ""
 
 
 class LLMService:
@@ -32,29 +91,24 @@ class LLMService:
             api_key: Gemini API key (if not provided, uses env variable)
         """
         self.api_key = api_key or settings.GEMINI_API_KEY
-        self.model = None
-        self.available = False
+        self.backend = get_llm_backend(self.api_key)
+        self.available = self.backend.available
         self.formatter = None
 
-        if not GEMINI_AVAILABLE:
-            logger.error("Google Generative AI SDK not available - install with: pip install google-generativeai")
+        if not self.available:
+            logger.warning("LLM backend not available - LLM responses will use fallback templates")
             return
 
-        if not self.api_key:
-            logger.warning("GEMINI_API_KEY not set - LLM responses will use fallback templates")
-            return
+        # Initialize formatter
+        self.formatter = get_formatter(self.api_key)
 
-        try:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
-            self.available = True
-
-            # Initialize formatter
-            self.formatter = get_formatter(self.api_key)
+        logger.info(f"LLM service initialized with the {self.backend.name} backend")
 
-            logger.info("LLM service initialized with Gemini")
-        except Exception as e:
-            logger.error(f"Failed to initialize Gemini client: {str(e)}")
+    async def warm_up(self):
+        """Open the LLM backend connection ahead of the first request"""
+        if not self.available:
+            return
+        await self.backend.warm_up()
 
     async def generate_response(
         self,
@@ -75,33 +129,30 @@ class LLMService:
         Returns:
             Generated response text
         """
-        if not self.available or not self.model:
+        if not self.available:
             logger.error("LLM service not available - using fallback")
             return self._generate_fallback_response(query, context_docs, language)
 
+        if self.backend.circuit_open:
+            logger.warning("LLM circuit open - using fallback")
+            return self._generate_fallback_response(query, context_docs, language)
+
         try:
             logger.info(f"Generating LLM response for query: {query[:100]}...")
 
-            # Build context from retrieved documents
-            context = self._build_context(context_docs)
+            # Build the complete prompt with system instructions, within the token budget
+            prompt = self._assemble_prompt(query, context_docs, language, conversation_history)
 
-            # Build the complete prompt with system instructions
-            prompt = self._build_prompt(query, context, language, conversation_history)
+            logger.info(f"Calling {self.backend.name} backend...")
 
-            logger.info(f"Calling Gemini API...")
-
-            # Call Gemini API with updated temperature for more conversational responses
-            response = await self.model.generate_content_async(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
+            # Call the LLM with updated temperature for more conversational responses
+            with llm_call("generate"):
+                response_text = await self.backend.generate(
+                    prompt,
                     temperature=0.8,  # Increased for more natural conversation
                     max_output_tokens=1024,
-                    top_p=0.9,
+                    top_p=0.9
                 )
-            )
-
-            # Extract response text
-            response_text = response.text
 
             logger.info(f"Generated response length: {len(response_text)} chars")
 
@@ -121,7 +172,9 @@ class LLMService:
         query: str,
         context_docs: List[Dict],
         language: str = "en",
-        conversation_history: Optional[List[Dict]] = None
+        conversation_history: Optional[List[Dict]] = None,
+        structured: bool = False,
+        cite: bool = False
     ):
         """
         Generate streaming conversational response using Gemini with RAG context
@@ -131,46 +184,105 @@ class LLMService:
             context_docs: Retrieved scripture documents with metadata
             language: Language code (en or hi)
             conversation_history: Optional chat history for context
+            structured: Ask for the final answer structure directly, so the
+                stream can go to the user without a reformulation pass
+            cite: End the answer with a CITATIONS line (strip it with CitationTrailer)
 
         Yields:
             Chunks of generated response text
         """
-        if not self.available or not self.model:
+        if not self.available:
             logger.error("LLM service not available - using fallback")
             yield self._generate_fallback_response(query, context_docs, language)
             return
 
+        if self.backend.circuit_open:
+            logger.warning("LLM circuit open - using fallback")
+            yield self._generate_fallback_response(query, context_docs, language)
+            return
+
         try:
             logger.info(f"Generating streaming LLM response for query: {query[:100]}...")
 
-            # Build context from retrieved documents
-            context = self._build_context(context_docs)
-
-            # Build the complete prompt with system instructions
-            prompt = self._build_prompt(query, context, language, conversation_history)
+            # Build the complete prompt with system instructions, within the token budget
+            prompt = self._assemble_prompt(
+                query, context_docs, language, conversation_history, structured=structured, cite=cite
+            )
 
-            logger.info(f"Calling Gemini API for streaming...")
+            logger.info(f"Calling {self.backend.name} backend for streaming...")
 
-            # Call Gemini API with streaming
-            response = await self.model.generate_content_async(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
+            with llm_call("generate_stream") as call:
+                # Stream the response chunks
+                async for chunk in self.backend.generate_stream(
+                    prompt,
                     temperature=0.8,
                     max_output_tokens=1024,
-                    top_p=0.9,
-                ),
-                stream=True
-            )
-
-            # Stream the response chunks
-            async for chunk in response:
-                if chunk.text:
-                    yield chunk.text
+                    top_p=0.9
+                ):
+                    call.first_token()
+                    yield chunk
 
         except Exception as e:
             logger.error(f"Error generating streaming LLM response: {str(e)}", exc_info=True)
             yield self._generate_fallback_response(query, context_docs, language)
 
+    async def generate_planned_response(
+        self,
+        query: str,
+        context_docs: List[Dict],
+        language: str = "en",
+        conversation_history: Optional[List[Dict]] = None
+    ) -> Tuple[str, List[str]]:
+        """
+        Single-call LLM plan: one Gemini request for the final answer
+
+        The prompt carries the answer structure and asks for a trailing
+        CITATIONS line, so no format or reformulate pass follows; the answer
+        is only cleaned up locally.
+
+        Args:
+            query: User's question
+            context_docs: Retrieved scripture documents with metadata
+            language: Language code (en or hi)
+            conversation_history: Optional chat history for context
+
+        Returns:
+            Tuple of (answer, cited "chapter.verse" references)
+        """
+        if not self.available:
+            logger.error("LLM service not available - using fallback")
+            return self._generate_fallback_response(query, context_docs, language), []
+
+        if self.backend.circuit_open:
+            logger.warning("LLM circuit open - using fallback")
+            return self._generate_fallback_response(query, context_docs, language), []
+
+        try:
+            logger.info(f"Generating single-call LLM response for query: {query[:100]}...")
+
+            prompt = self._assemble_prompt(
+                query, context_docs, language, conversation_history, structured=True, cite=True
+            )
+
+            with llm_call("generate"):
+                response_text = await self.backend.generate(
+                    prompt,
+                    temperature=0.8,
+                    max_output_tokens=1024,
+                    top_p=0.9
+                )
+
+            answer, references = split_citations(response_text)
+            formatter = StreamFormatter()
+            answer = formatter.feed(answer) + formatter.flush()
+
+            logger.info(f"Generated response length: {len(answer)} chars, cited: {references}")
+            return answer, references
+
+        except Exception as e:
+            logger.error(f"Error generating LLM response: {str(e)}", exc_info=True)
+            return self._generate_fallback_response(query, context_docs, language), []
+
     def _build_context(self, docs: List[Dict]) -> str:
         """
         Build context string from retrieved documents
@@ -184,28 +296,109 @@ class LLMService:
         if not docs:
             return "No specific scripture found for this query."
 
-        context_parts = []
-        for i, doc in enumerate(docs, 1):
-            scripture = doc.get('scripture', 'Unknown')
-            reference = doc.get('reference', '')
-            text = doc.get('text', '')
-            topic = doc.get('topic', '')
+        return "\n".join(self._format_doc(i, doc) for i, doc in enumerate(docs, 1))
 
-            context_parts.append(f"""
+    def _format_doc(self, i: int, doc: Dict) -> str:
+        """One retrieved document as it appears in the prompt context"""
+        scripture = doc.get('scripture', 'Unknown')
+        reference = doc.get('reference', '')
+        text = doc.get('text', '')
+        topic = doc.get('topic', '')
+
+        # Only the best matching span of long commentaries reaches the prompt
+        passage = doc.get('passage')
+        passage_line = ""
+        if passage and passage['field'] != 'text':
+            passage_line = f"- Relevant passage ({passage['field']}): \"{passage['text']}\"\n"
+
+        return f"""
 Scripture {i}:
 - Source: {scripture} {reference}
 - Topic: {topic}
 - Verse: "{text}"
-""")
+{passage_line}"""
 
-        return "\n".join(context_parts)
+    def _assemble_prompt(
+        self,
+        query: str,
+        context_docs: List[Dict],
+        language: str,
+        conversation_history: Optional[List[Dict]] = None,
+        structured: bool = False,
+        cite: bool = False
+    ) -> str:
+        """
+        Build the prompt within LLM_PROMPT_TOKEN_BUDGET (see llm/prompt.py)
+
+        System prompt, instructions and the user's message are kept whole.
+        The lowest-scored documents are cut or dropped to fit the context
+        allotment, then the oldest history to fit what is left. Token counts
+        are logged and recorded in the request's LLM trace.
+
+        Args:
+            Same as _build_prompt, with the documents instead of their context string
+
+        Returns:
+            Formatted prompt string
+        """
+        budget = PromptBudget(
+            total=settings.LLM_PROMPT_TOKEN_BUDGET,
+            history=settings.LLM_PROMPT_HISTORY_TOKENS,
+            context=settings.LLM_PROMPT_CONTEXT_TOKENS,
+            min_doc_tokens=settings.LLM_PROMPT_MIN_DOC_TOKENS
+        )
+
+        # Everything but documents and history: system prompt, instructions, user message
+        placeholder = " " if context_docs else self._build_context([])
+        fixed = estimate_tokens(self._build_prompt(query, placeholder, language, None, structured, cite))
+
+        docs, dropped, truncated = fit_docs(
+            context_docs, lambda doc: self._format_doc(1, doc), budget.context_room(fixed), budget.min_doc_tokens
+        )
+        context = self._build_context(docs)
+        context_tokens = estimate_tokens(context) if docs else 0
+
+        history, _ = fit_history(conversation_history, budget.history_room(fixed, context_tokens))
+        prompt = self._build_prompt(query, context, language, history, structured, cite)
+        total = estimate_tokens(prompt)
+        # The history's heading isn't in its allotment: drop the oldest message if it overflows
+        while history and total > budget.total:
+            history = history[1:]
+            prompt = self._build_prompt(query, context, language, history, structured, cite)
+            total = estimate_tokens(prompt)
+
+        system = estimate_tokens(settings.SYSTEM_PROMPT)
+        query_tokens = estimate_tokens(query)
+        tokens = {
+            "budget": budget.total,
+            "total": total,
+            "system": system,
+            "instructions": fixed - system - query_tokens,
+            "query": query_tokens,
+            "context": context_tokens,
+            "history": total - fixed - context_tokens,
+            "docs": len(docs),
+            "docs_dropped": dropped,
+            "docs_truncated": truncated,
+            "history_messages": len(history),
+            "history_dropped": len(conversation_history or []) - len(history)
+        }
+        record_prompt(tokens)
+        logger.info(
+            f"Prompt: ~{total} tokens of {budget.total} (context {context_tokens}, history {tokens['history']}); "
+            f"docs {len(docs)} kept, {dropped} dropped, {truncated} cut; "
+            f"history {len(history)} kept, {tokens['history_dropped']} dropped"
+        )
+        return prompt
 
     def _build_prompt(
         self,
         query: str,
         context: str,
         language: str,
-        conversation_history: Optional[List[Dict]] = None
+        conversation_history: Optional[List[Dict]] = None,
+        structured: bool = False,
+        cite: bool = False
     ) -> str:
         """
         Build the complete prompt with system instructions and context
@@ -215,6 +408,8 @@ Scripture {i}:
             context: Retrieved scripture context
             language: Language code
             conversation_history: Optional chat history
+            structured: Append the reformatter's answer structure
+            cite: Ask for a trailing CITATIONS line with the quoted verses
 
         Returns:
             Formatted prompt string
@@ -227,8 +422,13 @@ Scripture {i}:
         history_text = ""
         if conversation_history and len(conversation_history) > 0:
             history_text = "\n\nPrevious Conversation:\n"
+            # Server-side sessions compact older turns into a rolling summary
+            summaries = [msg for msg in conversation_history if msg.get('role') == 'summary']
+            messages = [msg for msg in conversation_history if msg.get('role') != 'summary']
+            for msg in summaries:
+                history_text += f"Earlier: {msg.get('content', '')}\n"
             # Include last 6 messages for context (last 3 exchanges)
-            recent_history = conversation_history[-6:] if len(conversation_history) > 6 else conversation_history
+            recent_history = messages[-6:] if len(messages) > 6 else messages
             for msg in recent_history:
                 role = msg.get('role', 'user')
                 content = msg.get('content', '')
@@ -286,8 +486,33 @@ RIGHT - DO THIS (with line breaks):
 
 REMEMBER: Every 2-3 sentences, add \\n\\n (blank line). No exceptions!"""
 
+        if structured:
+            # The answer streams straight to the user: no reformulation pass follows
+            prompt += f"""
+
+Your answer is shown to the user as you write it. Follow this EXACT structure:
+
+{ANSWER_STRUCTURE}"""
+
+        if cite:
+            prompt += f"""
+
+After the answer, add one last line listing the chapter.verse numbers you quoted, like:
+{CITATIONS_MARKER} 2.47, 3.19
+Write "{CITATIONS_MARKER} none" if you quoted no verse. Write nothing after this line."""
+
         return prompt
 
+    def is_fallback_response(
+        self,
+        response: str,
+        query: str,
+        context_docs: List[Dict],
+        language: str
+    ) -> bool:
+        """Whether a response is (or ends with) the template used when Gemini is unavailable or fails"""
+        return response.endswith(self._generate_fallback_response(query, context_docs, language))
+
     def _generate_fallback_response(
         self,
         query: str,
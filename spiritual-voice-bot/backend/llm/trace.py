@@ -0,0 +1,185 @@
+"""
+Per-request accounting of LLM round trips
+
+Every Gemini call (refine, generate, format, reformulate) is timed into the
+trace of the request that made it, so the "chain" and "single" LLM plans can
+be compared by call count and time spent waiting on the LLM. The current
+trace lives in a context variable: tasks spawned by a request (the
+speculative refine) copy the context and record into the same trace.
+"""
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Requests kept per plan for latency percentiles
+RECENT_REQUESTS = 200
+
+_current: ContextVar[Optional["LLMTrace"]] = ContextVar("llm_trace", default=None)
+
+
+class LLMTrace:
+    """
+    LLM calls made while answering one request
+    """
+
+    def __init__(self, plan: str):
+        self.plan = plan
+        self.calls: List[Dict] = []
+        # Token counts of the budgeted generation prompts (llm/prompt.py)
+        self.prompts: List[Dict] = []
+        self.start = time.perf_counter()
+        self.seconds: Optional[float] = None
+
+    def record(self, kind: str, seconds: float, ok: bool = True, first_token_seconds: Optional[float] = None):
+        call = {"kind": kind, "seconds": seconds, "ok": ok}
+        if first_token_seconds is not None:
+            call["first_token_seconds"] = first_token_seconds
+        self.calls.append(call)
+
+    def finish(self):
+        """Stop the request clock (once)"""
+        if self.seconds is None:
+            self.seconds = time.perf_counter() - self.start
+
+    def summary(self) -> Dict:
+        """Call count, LLM seconds, request seconds and prompt token counts"""
+        return {
+            "plan": self.plan,
+            "calls": len(self.calls),
+            "llm_seconds": sum(call["seconds"] for call in self.calls),
+            "request_seconds": self.seconds if self.seconds is not None else time.perf_counter() - self.start,
+            "by_call": [dict(call) for call in self.calls],
+            "prompt_tokens": [dict(tokens) for tokens in self.prompts]
+        }
+
+
+class _CallTimer:
+    """Handle yielded by llm_call; streams mark their first token on it"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token_seconds: Optional[float] = None
+        self.ok = True
+
+    def first_token(self):
+        if self.first_token_seconds is None:
+            self.first_token_seconds = time.perf_counter() - self.start
+
+
+@contextmanager
+def llm_call(kind: str):
+    """Time one LLM round trip into the current request's trace (if any)"""
+    timer = _CallTimer()
+    try:
+        yield timer
+    except Exception:
+        timer.ok = False
+        raise
+    finally:
+        trace = _current.get()
+        if trace is not None:
+            trace.record(kind, time.perf_counter() - timer.start, timer.ok, timer.first_token_seconds)
+
+
+def record_prompt(tokens: Dict):
+    """Record a generation prompt's token counts into the current request's trace (if any)"""
+    trace = _current.get()
+    if trace is not None:
+        trace.prompts.append(tokens)
+
+
+@contextmanager
+def llm_trace(plan: str):
+    """Collect the LLM calls of a request; the finished trace goes to plan_stats"""
+    trace = LLMTrace(plan)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.finish()
+        try:
+            _current.reset(token)
+        except ValueError:
+            # A stream closed from another context (client disconnect)
+            _current.set(None)
+        plan_stats.record(trace)
+        logger.info(
+            f"LLM plan '{plan}': {len(trace.calls)} call(s) "
+            f"({', '.join(call['kind'] for call in trace.calls) or 'none'}), "
+            f"{sum(call['seconds'] for call in trace.calls):.2f}s LLM of {trace.seconds:.2f}s"
+        )
+
+
+class PlanStats:
+    """
+    Call counts and latencies aggregated per LLM plan
+    """
+
+    def __init__(self, recent: int = RECENT_REQUESTS):
+        self._plans: Dict[str, Dict] = {}
+        self._recent = recent
+
+    def record(self, trace: LLMTrace):
+        stats = self._plans.setdefault(trace.plan, {
+            "requests": 0,
+            "calls": 0,
+            "errors": 0,
+            "calls_by_kind": {},
+            "llm_seconds": deque(maxlen=self._recent),
+            "request_seconds": deque(maxlen=self._recent),
+            "prompt_tokens": deque(maxlen=self._recent)
+        })
+        stats["requests"] += 1
+        stats["calls"] += len(trace.calls)
+        stats["errors"] += sum(not call["ok"] for call in trace.calls)
+        for call in trace.calls:
+            stats["calls_by_kind"][call["kind"]] = stats["calls_by_kind"].get(call["kind"], 0) + 1
+        stats["llm_seconds"].append(sum(call["seconds"] for call in trace.calls))
+        stats["request_seconds"].append(trace.seconds)
+        if trace.prompts:
+            stats["prompt_tokens"].append(sum(tokens["total"] for tokens in trace.prompts))
+
+    def clear(self):
+        self._plans.clear()
+
+    def get_stats(self) -> Dict:
+        """
+        Per plan: request and call counts, mean calls, LLM and request
+        latency and prompt tokens per request (mean, p50, p95)
+        """
+        result = {}
+        for plan, stats in self._plans.items():
+            llm_seconds = np.asarray(stats["llm_seconds"], dtype=np.float64)
+            request_seconds = np.asarray(stats["request_seconds"], dtype=np.float64)
+            result[plan] = {
+                "requests": stats["requests"],
+                "calls": stats["calls"],
+                "errors": stats["errors"],
+                "calls_per_request": stats["calls"] / stats["requests"],
+                "calls_by_kind": dict(stats["calls_by_kind"]),
+                "llm_seconds": _distribution(llm_seconds),
+                "request_seconds": _distribution(request_seconds),
+                "prompt_tokens": _distribution(np.asarray(stats["prompt_tokens"], dtype=np.float64))
+            }
+        return result
+
+
+def _distribution(values: np.ndarray) -> Dict:
+    if not len(values):
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0}
+    return {
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95))
+    }
+
+
+# Shared by all requests of the process
+plan_stats = PlanStats()
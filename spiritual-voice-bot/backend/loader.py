@@ -0,0 +1,115 @@
+"""
+Lazy loader facades for heavy optional dependencies
+
+torch, whisper, sentence-transformers, langchain, qdrant-client and the Gemini
+SDK take seconds to import. Modules declare them as LazyModule facades and
+the real import happens on first attribute access (or `available` check), so
+booting a worker only pays for what a request path actually uses.
+"""
+import importlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds spent importing each lazily loaded module, in load order
+_import_timings: Dict[str, float] = {}
+_failed_imports: List[str] = []
+
+
+class LazyModule:
+    """
+    Module proxy that imports the real module on first use
+    """
+
+    def __init__(self, name: str, install_hint: Optional[str] = None):
+        """
+        Args:
+            name: Dotted module name, e.g. "google.generativeai"
+            install_hint: Package to suggest when the import fails
+        """
+        self._name = name
+        self._install_hint = install_hint
+        self._module = None
+        self._error: Optional[Exception] = None
+        # Components initialize on worker threads concurrently
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Import the module (once)
+
+        Raises:
+            ImportError: If the module can't be imported
+        """
+        if self._module is not None:
+            return self._module
+        with self._lock:
+            return self._import()
+
+    def _import(self):
+        if self._module is not None:
+            return self._module
+        if self._error is not None:
+            raise ImportError(f"{self._name} is not available: {self._error}") from self._error
+
+        start = time.perf_counter()
+        try:
+            self._module = importlib.import_module(self._name)
+        except Exception as e:
+            self._error = e
+            if self._name not in _failed_imports:
+                _failed_imports.append(self._name)
+            hint = f" Install with: pip install {self._install_hint}" if self._install_hint else ""
+            logger.error(f"Failed to import {self._name}: {str(e)}.{hint}")
+            raise ImportError(f"{self._name} is not available: {e}") from e
+        finally:
+            _import_timings[self._name] = time.perf_counter() - start
+
+        logger.info(f"Imported {self._name} in {_import_timings[self._name]:.2f}s")
+        return self._module
+
+    @property
+    def available(self) -> bool:
+        """Whether the module imports (triggers the import on first check)"""
+        try:
+            self.load()
+            return True
+        except ImportError:
+            return False
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def import_timings() -> Dict[str, float]:
+    """Seconds spent importing each lazily loaded module so far"""
+    return dict(_import_timings)
+
+
+def failed_imports() -> List[str]:
+    """Lazily loaded modules that failed to import"""
+    return list(_failed_imports)
+
+
+@contextmanager
+def timed(name: str, timings: Dict[str, float]):
+    """Record the wall time of a block into timings[name]"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - start
@@ -1,13 +1,17 @@
 """
 Main FastAPI application for Spiritual Voice Bot
 """
+import time
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form
 from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Dict, Optional, List
 import io
 import json
+import asyncio
 import logging
 
 from config import settings
@@ -16,6 +20,11 @@ from voice.asr import ASRProcessor
 from voice.tts import TTSProcessor
 from llm.service import get_llm_service
 from llm.formatter import get_refiner, get_reformatter
+from llm.trace import plan_stats
+from loader import failed_imports, import_timings, timed
+
+# Heavy libraries are imported lazily, so this covers only the app's own modules
+IMPORT_SECONDS = time.perf_counter() - _import_started
 
 # Setup logging
 logging.basicConfig(
@@ -46,6 +55,14 @@ rag_pipeline: Optional[RAGPipeline] = None
 asr_processor: Optional[ASRProcessor] = None
 tts_processor: Optional[TTSProcessor] = None
 
+# Seconds spent initializing and warming each component at startup
+startup_timings: Dict[str, float] = {}
+warmup_timings: Dict[str, float] = {}
+
+# Set once warm-up has run; /ready gates traffic on it
+ready = False
+warmup_task: Optional[asyncio.Task] = None
+
 
 # Pydantic models
 class TextQuery(BaseModel):
@@ -53,6 +70,8 @@ class TextQuery(BaseModel):
     language: str = "en"
     include_citations: bool = True
     conversation_history: Optional[List[dict]] = None
+    # Keep the conversation server-side; conversation_history is then only needed on the first turn
+    session_id: Optional[str] = Field(default=None, max_length=128)
 
 
 class TextResponse(BaseModel):
@@ -60,75 +79,125 @@ class TextResponse(BaseModel):
     citations: List[dict]
     language: str
     confidence: float
+    llm: Optional[dict] = None  # LLM calls made for this request (plan, count, latencies)
+    session_id: Optional[str] = None
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize models on startup"""
-    global rag_pipeline, asr_processor, tts_processor
+async def _init_rag() -> RAGPipeline:
+    with timed("rag", startup_timings):
+        pipeline = RAGPipeline()
+        await pipeline.initialize()
+    return pipeline
 
-    logger.info("Starting Spiritual Voice Bot API...")
 
-    try:
-        # Initialize RAG Pipeline
-        logger.info("Initializing RAG Pipeline...")
-        rag_pipeline = RAGPipeline()
-        await rag_pipeline.initialize()
-
-        # Initialize ASR
-        logger.info("Initializing ASR...")
-        asr_processor = ASRProcessor()
+async def _init_asr() -> ASRProcessor:
+    with timed("asr", startup_timings):
+        processor = ASRProcessor()
         try:
-            await asr_processor.initialize()
+            await processor.initialize()
             logger.info("ASR initialized successfully")
         except Exception as e:
             logger.warning(f"ASR initialization failed (will use fallback): {str(e)}")
+    return processor
 
-        # Initialize TTS
-        logger.info("Initializing TTS...")
-        tts_processor = TTSProcessor()
+
+async def _init_tts() -> TTSProcessor:
+    with timed("tts", startup_timings):
+        processor = TTSProcessor()
         try:
-            await tts_processor.initialize()
+            await processor.initialize()
             logger.info("TTS initialized successfully")
         except Exception as e:
             logger.warning(f"TTS initialization failed (will use fallback): {str(e)}")
+    return processor
+
+
+async def _init_llm():
+    """LLM service, query refiner and response reformatter (clients of the LLM_BACKEND)"""
+    with timed("llm", startup_timings):
+        llm_service = await asyncio.to_thread(get_llm_service)
+    if llm_service.available:
+        logger.info(f"LLM Service initialized successfully with the {llm_service.backend.name} backend")
+    else:
+        logger.warning("LLM Service not available - will use fallback templates. Set GEMINI_API_KEY to enable.")
+
+    with timed("refiner", startup_timings):
+        refiner = await asyncio.to_thread(get_refiner, settings.GEMINI_API_KEY)
+    if refiner and refiner.available:
+        logger.info("Query Refiner initialized successfully")
+    else:
+        logger.warning("Query Refiner not available")
+
+    with timed("reformatter", startup_timings):
+        reformatter = await asyncio.to_thread(get_reformatter, settings.GEMINI_API_KEY)
+    if reformatter and reformatter.available:
+        logger.info("Response Reformatter initialized successfully")
+    else:
+        logger.warning("Response Reformatter not available")
+
+
+async def _warm_component(name: str, warm_up):
+    """Run one warm-up step; a failed warm-up is logged, not fatal"""
+    try:
+        with timed(name, warmup_timings):
+            await warm_up()
+    except Exception as e:
+        logger.warning(f"{name} warm-up failed: {str(e)}")
+
+
+async def warm_up():
+    """Warm every component concurrently, then mark the app ready"""
+    global ready
 
-        # Initialize LLM Service
-        logger.info("Initializing LLM Service...")
-        llm_service = get_llm_service()
-        if llm_service.available:
-            logger.info("LLM Service initialized successfully with Gemini")
-        else:
-            logger.warning("LLM Service not available - will use fallback templates. Set GEMINI_API_KEY to enable.")
-
-        # Initialize Query Refiner
-        logger.info("Initializing Query Refiner...")
-        refiner = get_refiner(settings.GEMINI_API_KEY)
-        if refiner and refiner.available:
-            logger.info("Query Refiner initialized successfully")
-        else:
-            logger.warning("Query Refiner not available")
-
-        # Initialize Response Reformatter
-        logger.info("Initializing Response Reformatter...")
-        reformatter = get_reformatter(settings.GEMINI_API_KEY)
-        if reformatter and reformatter.available:
-            logger.info("Response Reformatter initialized successfully")
-        else:
-            logger.warning("Response Reformatter not available")
-
-        logger.info("All components initialized successfully!")
+    with timed("total", warmup_timings):
+        steps = [_warm_component("rag", rag_pipeline.warm_up), _warm_component("llm", get_llm_service().warm_up)]
+        if asr_processor:
+            steps.append(_warm_component("asr", asr_processor.warm_up))
+        await asyncio.gather(*steps)
+
+    ready = True
+    logger.info(f"Warm-up complete in {warmup_timings['total']:.2f}s, ready for traffic")
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Initialize models on startup"""
+    global rag_pipeline, asr_processor, tts_processor, warmup_task, ready
+
+    logger.info("Starting Spiritual Voice Bot API...")
+
+    try:
+        # Components are independent: load them concurrently, heavy work on threads
+        logger.info("Initializing RAG Pipeline, ASR, TTS and LLM services...")
+        with timed("total", startup_timings):
+            rag_pipeline, asr_processor, tts_processor, _ = await asyncio.gather(
+                _init_rag(), _init_asr(), _init_tts(), _init_llm()
+            )
+
+        logger.info(f"All components initialized in {startup_timings['total']:.2f}s")
 
     except Exception as e:
         logger.error(f"Failed to initialize components: {str(e)}")
         raise
 
+    # /health is live now; /ready flips once warm-up finishes
+    if settings.WARMUP_ENABLED:
+        warmup_task = asyncio.create_task(warm_up())
+    else:
+        ready = True
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down Spiritual Voice Bot API...")
 
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+
+    if rag_pipeline:
+        await rag_pipeline.close()
+
 
 @app.get("/")
 async def root():
@@ -153,6 +222,44 @@ async def health_check():
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until components are initialized and warmed up"""
+    body = {
+        "ready": ready,
+        "init_seconds": startup_timings,
+        "rag_init_seconds": rag_pipeline.init_timings if rag_pipeline else {},
+        "warmup_seconds": warmup_timings
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Query, answer and rerank cache hit/miss counters"""
+    if not rag_pipeline:
+        raise HTTPException(status_code=500, detail="RAG pipeline not initialized")
+
+    return {
+        **rag_pipeline.query_cache.get_stats(),
+        "answers": rag_pipeline.answer_cache.get_stats(),
+        "coalesced": rag_pipeline.inflight.get_stats(),
+        "sessions": rag_pipeline.sessions.get_stats(),
+        "rerank": rag_pipeline.reranker.get_stats(),
+        "vector_store": rag_pipeline.vector_store["store"].get_stats() if rag_pipeline.vector_store else None
+    }
+
+
+@app.get("/api/llm/stats")
+async def llm_stats():
+    """LLM calls per request and LLM/request latency per LLM plan, and the call scheduler"""
+    return {
+        "plan": settings.LLM_PLAN,
+        "plans": plan_stats.get_stats(),
+        "scheduler": get_llm_service().backend.get_stats()
+    }
+
+
 @app.post("/api/text/query", response_model=TextResponse)
 async def text_query(query: TextQuery):
     """
@@ -169,14 +276,17 @@ async def text_query(query: TextQuery):
             query=query.query,
             language=query.language,
             include_citations=query.include_citations,
-            conversation_history=query.conversation_history
+            conversation_history=query.conversation_history,
+            session_id=query.session_id
         )
 
         return TextResponse(
             answer=result["answer"],
             citations=result["citations"],
             language=query.language,
-            confidence=result["confidence"]
+            confidence=result["confidence"],
+            llm=result.get("llm"),
+            session_id=query.session_id
         )
 
     except Exception as e:
@@ -202,7 +312,8 @@ async def text_query_stream(query: TextQuery):
                     query=query.query,
                     language=query.language,
                     include_citations=query.include_citations,
-                    conversation_history=query.conversation_history
+                    conversation_history=query.conversation_history,
+                    session_id=query.session_id
                 ):
                     # For SSE format, we need to escape newlines in the chunk
                     # because \n\n terminates an SSE event
@@ -231,6 +342,18 @@ async def text_query_stream(query: TextQuery):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """
+    Forget a server-side conversation session
+    """
+    if not rag_pipeline:
+        raise HTTPException(status_code=500, detail="RAG pipeline not initialized")
+    if not await rag_pipeline.sessions.delete_async(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"deleted": session_id}
+
+
 @app.post("/api/voice/query")
 async def voice_query(
     audio: UploadFile = File(...),
@@ -288,10 +411,14 @@ async def search_scripture(
     query: str,
     scripture: Optional[str] = None,
     language: str = "en",
-    limit: int = 5
+    limit: int = 5,
+    chapter: Optional[str] = None,
+    topic: Optional[str] = None
 ):
     """
     Search scriptures directly
+
+    Filters combine, e.g. ?scripture=Bhagavad Gita&chapter=2..6&topic=Karma Yoga
     """
     try:
         if not rag_pipeline:
@@ -301,7 +428,9 @@ async def search_scripture(
             query=query,
             scripture_filter=scripture,
             language=language,
-            top_k=limit
+            top_k=limit,
+            chapter=chapter,
+            topic=topic
         )
 
         return {
@@ -310,6 +439,8 @@ async def search_scripture(
             "count": len(results)
         }
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error searching scripture: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -337,7 +468,46 @@ async def generate_embeddings(text: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def format_startup_report() -> str:
+    """Startup time broken down into imports, model loads and index load"""
+    lines = ["Startup profile", f"  {'import main':<32}{IMPORT_SECONDS:8.2f}s"]
+
+    missing = set(failed_imports())
+    for name, seconds in import_timings().items():
+        note = "  (not installed)" if name in missing else ""
+        lines.append(f"  {'import ' + name:<32}{seconds:8.2f}s{note}")
+
+    # Components initialize concurrently, so their times overlap
+    for component, seconds in startup_timings.items():
+        lines.append(f"  {'init ' + component:<32}{seconds:8.2f}s")
+        if component == "rag" and rag_pipeline:
+            for stage, stage_seconds in rag_pipeline.init_timings.items():
+                lines.append(f"    {stage:<30}{stage_seconds:8.2f}s")
+
+    for component, seconds in warmup_timings.items():
+        lines.append(f"  {'warm-up ' + component:<32}{seconds:8.2f}s")
+
+    total = IMPORT_SECONDS + startup_timings.get("total", 0.0) + warmup_timings.get("total", 0.0)
+    lines.append(f"  {'time to ready':<32}{total:8.2f}s")
+    return "\n".join(lines)
+
+
+async def profile_startup():
+    """Run the startup sequence once and print where the time went"""
+    await startup_event()
+    if warmup_task:
+        await warmup_task
+    await shutdown_event()
+    print(format_startup_report())
+
+
 if __name__ == "__main__":
+    import sys
+
+    if "--profile-startup" in sys.argv:
+        asyncio.run(profile_startup())
+        sys.exit(0)
+
     import uvicorn
     uvicorn.run(
         "main:app",
@@ -0,0 +1,227 @@
+"""
+Approximate nearest neighbour index (IVF-flat) for large corpora
+
+Corpus rows are clustered with spherical k-means into nlist inverted lists at
+ingest time. A query scores the centroids, probes the nprobe closest lists and
+computes exact cosine scores only for the rows in those lists. nprobe trades
+recall for latency; nprobe == nlist is exact search.
+
+Small corpora don't need this: RAGPipeline keeps using the exact
+SimilarityIndex below ANN_MIN_CORPUS_SIZE rows.
+"""
+import logging
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from rag.similarity import SimilarityIndex, normalize_rows, normalize_vector, top_k_indices
+from rag.store import replace_atomic
+
+logger = logging.getLogger(__name__)
+
+IVF_FILE = "ivf.npz"
+
+# Rows scored per k-means assignment step, bounds the (chunk, nlist) score matrix
+_ASSIGN_CHUNK = 65536
+
+
+def ann_exists(index_dir: Path, prefix: str = "") -> bool:
+    """Check whether an IVF index has been written to index_dir (prefix: file name prefix, e.g. chunks)"""
+    return (Path(index_dir) / f"{prefix}{IVF_FILE}").exists()
+
+
+def default_nlist(n: int) -> int:
+    """Number of inverted lists for a corpus of n rows (about sqrt(n))"""
+    return max(1, int(np.sqrt(n)))
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Closest centroid (by cosine) for every row, computed in chunks"""
+    assignments = np.empty(matrix.shape[0], dtype=np.int64)
+    for start in range(0, matrix.shape[0], _ASSIGN_CHUNK):
+        chunk = matrix[start:start + _ASSIGN_CHUNK]
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def _spherical_kmeans(
+    matrix: np.ndarray,
+    nlist: int,
+    iterations: int,
+    rng: np.random.Generator
+) -> np.ndarray:
+    """Cluster unit-length rows into nlist unit-length centroids"""
+    centroids = np.array(matrix[rng.choice(matrix.shape[0], nlist, replace=False)], dtype=np.float32)
+
+    for _ in range(iterations):
+        assignments = _assign(matrix, centroids)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, matrix)
+        counts = np.bincount(assignments, minlength=nlist)
+
+        # Re-seed empty lists with random rows
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = matrix[rng.choice(matrix.shape[0], len(empty), replace=False)]
+
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index over a normalized float32 corpus matrix
+    """
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        list_ids: np.ndarray,
+        nprobe: int = 16
+    ):
+        """
+        Args:
+            matrix: (N, d) normalized corpus matrix (may be memory-mapped)
+            centroids: (nlist, d) normalized list centroids
+            list_offsets: (nlist + 1,) start offset of every list in list_ids
+            list_ids: (N,) corpus row ids grouped by list
+            nprobe: Lists probed per query
+        """
+        self.exact = SimilarityIndex(matrix, normalized=True)
+        self.matrix = self.exact.matrix
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.list_ids = np.asarray(list_ids, dtype=np.int64)
+        self.nprobe = nprobe
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.exact.dim
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(
+        cls,
+        matrix: np.ndarray,
+        nlist: Optional[int] = None,
+        iterations: int = 10,
+        sample_size: Optional[int] = None,
+        nprobe: int = 16,
+        seed: int = 0
+    ) -> "IVFIndex":
+        """
+        Cluster a normalized corpus matrix into inverted lists
+
+        Args:
+            matrix: (N, d) normalized float32 corpus matrix
+            nlist: Number of lists (default about sqrt(N))
+            iterations: k-means iterations
+            sample_size: Rows used to train centroids (default 256 per list)
+            nprobe: Lists probed per query
+            seed: Random seed for reproducible builds
+        """
+        matrix = np.asarray(matrix, dtype=np.float32)
+        n = matrix.shape[0]
+        nlist = min(nlist or default_nlist(n), n)
+        rng = np.random.default_rng(seed)
+
+        sample_size = min(n, sample_size or 256 * nlist)
+        sample = matrix if sample_size == n else matrix[np.sort(rng.choice(n, sample_size, replace=False))]
+
+        logger.info(f"Training IVF index: {n} rows, {nlist} lists, {sample_size} training rows")
+        centroids = _spherical_kmeans(sample, nlist, iterations, rng)
+
+        assignments = _assign(matrix, centroids)
+        list_ids = np.argsort(assignments, kind="stable")
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=nlist), out=list_offsets[1:])
+
+        return cls(matrix, centroids, list_offsets, list_ids, nprobe=nprobe)
+
+    def save(self, index_dir: Path, prefix: str = "") -> Path:
+        """Write centroids and inverted lists next to the embeddings"""
+        path = Path(index_dir) / f"{prefix}{IVF_FILE}"
+        replace_atomic(path, lambda f: np.savez(
+            f,
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_ids=self.list_ids
+        ))
+        logger.info(f"Saved IVF index ({self.nlist} lists) to {path}")
+        return path
+
+    @classmethod
+    def load(cls, index_dir: Path, matrix: np.ndarray, nprobe: int = 16, prefix: str = "") -> "IVFIndex":
+        """
+        Load inverted lists for an already loaded corpus matrix
+
+        Raises:
+            ValueError: The lists were built for a different corpus (row count or dimension)
+        """
+        with np.load(Path(index_dir) / f"{prefix}{IVF_FILE}") as data:
+            centroids, list_offsets, list_ids = data["centroids"], data["list_offsets"], data["list_ids"]
+
+        n, dim = matrix.shape
+        if len(list_ids) != n or len(list_offsets) != len(centroids) + 1 or list_offsets[-1] != n:
+            raise ValueError(f"IVF index covers {len(list_ids)} rows but corpus has {n}")
+        if centroids.shape[1] != dim:
+            raise ValueError(f"IVF centroids have dimension {centroids.shape[1]} but corpus has {dim}")
+        return cls(matrix, centroids, list_offsets, list_ids, nprobe=nprobe)
+
+    def _probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Corpus row ids in the nprobe lists closest to the query"""
+        lists = top_k_indices(self.centroids @ query, nprobe)
+        return np.concatenate([
+            self.list_ids[self.list_offsets[i]:self.list_offsets[i + 1]] for i in lists
+        ])
+
+    def search(
+        self,
+        query,
+        top_k: int,
+        mask: Optional[np.ndarray] = None,
+        nprobe: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find approximately the top_k most similar corpus rows
+
+        Args:
+            query: Query embedding
+            top_k: Number of results
+            mask: Optional boolean filter mask over corpus rows
+            nprobe: Lists to probe (defaults to self.nprobe)
+
+        Returns:
+            Tuple of (indices, scores), best first
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+
+        # A selective filter leaves fewer rows than the probed lists would hold,
+        # so exact search over the filtered rows is both cheaper and exact
+        if mask is not None:
+            expected_probed = nprobe * len(self) / self.nlist
+            if mask.sum() <= expected_probed:
+                return self.exact.search(query, top_k, mask=mask)
+
+        query = normalize_vector(query)
+        candidates = self._probe(query, nprobe)
+        if mask is not None:
+            candidates = candidates[mask[candidates]]
+
+        if len(candidates) < top_k:
+            return self.exact.search(query, top_k, mask=mask)
+
+        scores = self.matrix[candidates] @ query
+        best = top_k_indices(scores, top_k)
+        return candidates[best], scores[best]
@@ -0,0 +1,281 @@
+"""
+Semantic answer cache
+
+A full answer costs up to four Gemini calls (refine, generate, format,
+reformulate). Many users ask near-identical questions, so finished answers
+are cached under the embedding of the user's query and served when a new
+query is close enough (cosine >= threshold). Only first-turn questions are
+cached or served: with conversation history the right answer depends on the
+earlier turns.
+
+Entries expire after a TTL, the least recently used entry is evicted beyond
+max_entries, and the cache can be persisted to an .npz file across restarts.
+"""
+import json
+import time
+import logging
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from rag.similarity import normalize_vector
+
+logger = logging.getLogger(__name__)
+
+# Recent hits kept for /api/cache/stats
+RECENT_HITS = 50
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed by query embedding, looked up by cosine similarity
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        ttl_seconds: Optional[float] = 86400.0,
+        max_entries: int = 2048,
+        path: Optional[str] = None
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            threshold: Minimum cosine similarity between queries for a hit
+            ttl_seconds: Entries older than this are treated as misses (None = no expiry)
+            max_entries: Evict the least recently used entry beyond this count
+            path: Optional .npz file the cache is loaded from and saved to
+        """
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.path = Path(path) if path else None
+
+        # Key matrix of max_entries rows, allocated on the first store; row i
+        # belongs to self._entries[i] and is unit length while in use
+        self._keys: Optional[np.ndarray] = None
+        self._entries: List[Optional[Dict]] = []
+        self._used = np.zeros(0, dtype=bool)
+        self._free: List[int] = []
+        # Rows in use, least recently used first
+        self._order: "OrderedDict[int, None]" = OrderedDict()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.stores = 0
+        self.recent_hits = deque(maxlen=RECENT_HITS)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def _expired(self, entry: Dict, now: float) -> bool:
+        return self.ttl_seconds is not None and now - entry["created"] > self.ttl_seconds
+
+    def _allocate(self, dim: int):
+        self._keys = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._entries = [None] * self.max_entries
+        self._used = np.zeros(self.max_entries, dtype=bool)
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        self._order = OrderedDict()
+
+    def _add(self, key: np.ndarray, entry: Dict):
+        """Store an entry in a free row (the caller makes room)"""
+        row = self._free.pop()
+        self._keys[row] = key
+        self._entries[row] = entry
+        self._used[row] = True
+        self._order[row] = None
+
+    def _remove(self, row: int):
+        self._entries[row] = None
+        self._used[row] = False
+        del self._order[row]
+        self._free.append(row)
+
+    def _matches(self, key: np.ndarray, language: str, kind: str):
+        """Rows in use at or above the threshold for this language and kind, best first, and all scores"""
+        scores = self._keys @ key
+        candidates = np.flatnonzero((scores >= self.threshold) & self._used)
+        rows = [
+            int(row) for row in candidates[np.argsort(-scores[candidates], kind="stable")]
+            if self._entries[row]["language"] == language and self._entries[row]["kind"] == kind
+        ]
+        return rows, scores
+
+    def get(self, embedding, language: str, kind: str) -> Optional[Dict]:
+        """
+        Find a cached answer for a similar query
+
+        Args:
+            embedding: Embedding of the user's query
+            language: Answer language; only entries in the same language match
+            kind: Answer flavour ("text" or "stream"), kept apart since the
+                streaming answer is reformulated differently
+
+        Returns:
+            Dict with answer, citations, confidence and similarity, or None
+
+        Expired matches are dropped and the next best match is tried.
+        """
+        if not self._order:
+            self.misses += 1
+            return None
+
+        query = normalize_vector(embedding)
+        if query.shape[0] != self._keys.shape[1] or not query.any():
+            self.misses += 1
+            return None
+
+        matching, scores = self._matches(query, language, kind)
+        now = time.time()
+        for row in matching:
+            if not self._expired(self._entries[row], now):
+                break
+            self._remove(row)
+            self.expirations += 1
+        else:
+            self.misses += 1
+            return None
+
+        entry = self._entries[row]
+        self._order.move_to_end(row)
+        entry["hits"] += 1
+        entry["last_used"] = now
+        similarity = float(scores[row])
+        self.hits += 1
+        self.recent_hits.append({
+            "query": entry["query"],
+            "similarity": similarity,
+            "age_seconds": now - entry["created"],
+            "entry_hits": entry["hits"]
+        })
+        logger.info(f"Answer cache hit (similarity {similarity:.3f}) for cached query: {entry['query'][:50]}")
+
+        return {
+            "answer": entry["answer"],
+            "citations": [dict(c) for c in entry["citations"]],
+            "confidence": entry["confidence"],
+            "similarity": similarity
+        }
+
+    def set(
+        self,
+        embedding,
+        query: str,
+        language: str,
+        kind: str,
+        answer: str,
+        citations: List[Dict],
+        confidence: float
+    ):
+        """
+        Store a finished answer under the embedding of its query
+
+        A near-duplicate entry (above the threshold, same language and kind)
+        is replaced rather than stored twice.
+        """
+        key = normalize_vector(embedding)
+        if not key.any() or self.max_entries < 1:
+            return
+
+        if self._keys is not None and key.shape[0] != self._keys.shape[1]:
+            # Embedding model changed; old keys can't be compared
+            self.clear()
+        if self._keys is None:
+            self._allocate(key.shape[0])
+
+        for row in self._matches(key, language, kind)[0]:
+            self._remove(row)
+
+        if not self._free:
+            self._remove(next(iter(self._order)))
+            self.evictions += 1
+
+        now = time.time()
+        self._add(key, {
+            "query": query,
+            "language": language,
+            "kind": kind,
+            "answer": answer,
+            "citations": [dict(c) for c in citations],
+            "confidence": float(confidence),
+            "created": now,
+            "last_used": now,
+            "hits": 0
+        })
+        self.stores += 1
+
+    def clear(self):
+        """Drop every entry (stats are kept)"""
+        self._keys = None
+        self._entries = []
+        self._used = np.zeros(0, dtype=bool)
+        self._free = []
+        self._order = OrderedDict()
+
+    def save(self, path: Optional[Path] = None):
+        """Write unexpired entries to the .npz file"""
+        path = Path(path) if path else self.path
+        if path is None:
+            return
+
+        now = time.time()
+        rows = [row for row in self._order if not self._expired(self._entries[row], now)]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        keys = self._keys[rows] if rows else np.empty((0, 0), dtype=np.float32)
+        entries = json.dumps([self._entries[i] for i in rows], ensure_ascii=False)
+        with open(path, "wb") as f:
+            np.savez(f, keys=keys, entries=np.array(entries))
+        logger.info(f"Saved {len(rows)} cached answers to {path}")
+
+    def load(self, path: Optional[Path] = None):
+        """Read entries written by save, skipping expired ones"""
+        path = Path(path) if path else self.path
+        if path is None or not path.exists():
+            return
+
+        try:
+            with np.load(path) as data:
+                keys = np.asarray(data["keys"], dtype=np.float32)
+                entries = json.loads(str(data["entries"]))
+        except Exception as e:
+            logger.error(f"Failed to load answer cache from {path}: {str(e)}")
+            return
+
+        if len(entries) != len(keys):
+            logger.error(f"Answer cache {path} is inconsistent ({len(entries)} entries, {len(keys)} keys), ignoring it")
+            return
+
+        now = time.time()
+        rows = [i for i, entry in enumerate(entries) if not self._expired(entry, now)]
+        rows = sorted(rows, key=lambda i: entries[i]["last_used"])[-self.max_entries:]
+        self.clear()
+        if rows:
+            self._allocate(keys.shape[1])
+            for i in rows:
+                self._add(keys[i], entries[i])
+        logger.info(f"Loaded {len(self)} cached answers from {path}")
+
+    def get_stats(self) -> Dict:
+        """Hit/miss counters, size and the most recent hits"""
+        total = self.hits + self.misses
+        similarities = [hit["similarity"] for hit in self.recent_hits]
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            "mean_hit_similarity": float(np.mean(similarities)) if similarities else None,
+            "recent_hits": list(self.recent_hits)
+        }
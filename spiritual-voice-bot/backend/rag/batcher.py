@@ -0,0 +1,162 @@
+"""
+Micro-batching embedding service for concurrent queries
+
+Query texts from concurrent requests are collected for a few milliseconds
+(or until the batch is full), encoded in one batched forward pass on a worker
+thread, and each caller's future is resolved with its own row. The event
+loop is never blocked by the model. Requests still waiting when the batcher
+is closed or moves to another event loop fail instead of hanging.
+"""
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Collects encode requests into batches for a sentence-transformers style model
+    """
+
+    def __init__(self, model, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        """
+        Initialize the batcher
+
+        Args:
+            model: Object with encode(texts, convert_to_tensor=False)
+            max_batch_size: Maximum texts per forward pass
+            max_wait_ms: How long to wait for more requests after the first one
+        """
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Requests taken off the queue by the worker and not resolved yet
+        self._batch: List[Tuple[str, asyncio.Future]] = []
+
+        # Stats
+        self.batches = 0
+        self.texts = 0
+
+    def _ensure_worker(self):
+        """Start the worker task on the running loop (restarting it if the loop changed)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            if self._worker is not None and not self._worker.done() and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._worker.cancel)
+            self._fail_pending(RuntimeError("Embedding batcher worker stopped"))
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    def _fail_pending(self, error: Exception):
+        """Fail every queued or in-flight request (their worker is gone)"""
+        futures = [future for _, future in self._batch]
+        while self._queue is not None and not self._queue.empty():
+            futures.append(self._queue.get_nowait()[1])
+        self._batch = []
+        if not futures or self._loop is None or self._loop.is_closed():
+            return
+
+        def fail():
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            fail()
+        else:
+            # Futures belong to the old loop, which may run in another thread
+            self._loop.call_soon_threadsafe(fail)
+
+    async def encode(self, text: str) -> np.ndarray:
+        """
+        Encode a single text, batched together with concurrent callers
+
+        Args:
+            text: Text to embed
+
+        Returns:
+            Embedding vector
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        """Wait for the first request, then gather more until the batch is full or time is up"""
+        batch = self._batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        # Take anything already queued without waiting
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+        return batch
+
+    async def _run(self):
+        """Worker loop: collect a batch, encode it on a thread, resolve futures"""
+        while True:
+            batch = await self._collect()
+            pending = [(text, future) for text, future in batch if not future.cancelled()]
+            if not pending:
+                self._batch = []
+                continue
+
+            texts = [text for text, _ in pending]
+            try:
+                embeddings = await asyncio.to_thread(self.model.encode, texts, convert_to_tensor=False)
+                embeddings = np.asarray(embeddings)
+            except Exception as e:
+                logger.error(f"Batched embedding failed for {len(texts)} texts: {str(e)}")
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                self._batch = []
+                continue
+
+            self.batches += 1
+            self.texts += len(texts)
+
+            for (_, future), embedding in zip(pending, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+            self._batch = []
+
+    async def close(self):
+        """Stop the worker task and fail the requests it hasn't answered"""
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        self._fail_pending(RuntimeError("Embedding batcher closed"))
+
+    def get_stats(self) -> dict:
+        """Batching statistics"""
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": self.texts / self.batches if self.batches else 0.0
+        }
@@ -0,0 +1,173 @@
+"""
+Query caches for the RAG pipeline
+
+Two memory-bounded LRU caches with TTL expiry:
+- query embeddings keyed by query text with whitespace collapsed
+- search results keyed by (that text, filters, language, top_k)
+
+Case is part of the key: the embedding and rerank models are cased, so
+"Krishna" and "krishna" get different embeddings and scores.
+
+Both are cleared whenever the vector store is reloaded.
+"""
+import sys
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Normalize query text for cache keys (case and whitespace insensitive)"""
+    return " ".join(text.lower().split())
+
+
+def model_text_key(text: str) -> str:
+    """Cache key for text a model sees (whitespace insensitive, case kept)"""
+    return " ".join(text.split())
+
+
+def estimate_size(value: Any) -> int:
+    """Rough memory footprint of a cached value in bytes"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes + 112
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Least-recently-used cache bounded by estimated memory, with optional TTL
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: Optional[float] = None, name: str = "cache"):
+        """
+        Initialize the cache
+
+        Args:
+            max_bytes: Evict least-recently-used entries beyond this size
+            ttl_seconds: Entries older than this are treated as misses (None = no expiry)
+            name: Name used in logs and stats
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.current_bytes = 0
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value or None, refreshing its LRU position"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, size, created = entry
+        if self.ttl_seconds is not None and time.monotonic() - created > self.ttl_seconds:
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """Insert or replace a value, evicting old entries to stay within max_bytes"""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (value, size, time.monotonic())
+        self.current_bytes += size
+
+        while self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def clear(self):
+        """Drop every entry (stats are kept)"""
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def get_stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+class QueryCache:
+    """
+    Embedding and search-result caches for RAGPipeline
+    """
+
+    def __init__(
+        self,
+        embedding_max_bytes: int,
+        results_max_bytes: int,
+        ttl_seconds: Optional[float] = None
+    ):
+        self.embeddings = LRUCache(embedding_max_bytes, ttl_seconds, name="embeddings")
+        self.results = LRUCache(results_max_bytes, ttl_seconds, name="results")
+
+    def get_embedding(self, query: str) -> Optional[np.ndarray]:
+        return self.embeddings.get(model_text_key(query))
+
+    def set_embedding(self, query: str, embedding: np.ndarray):
+        # Cached arrays are shared between requests, so make them read-only
+        embedding = np.array(embedding)
+        embedding.setflags(write=False)
+        self.embeddings.set(model_text_key(query), embedding)
+
+    def get_results(self, key: tuple) -> Optional[List[Dict]]:
+        results = self.results.get(key)
+        if results is None:
+            return None
+        # Hand out copies so callers can't mutate the cached dicts
+        return [dict(r) for r in results]
+
+    def set_results(self, key: tuple, results: List[Dict]):
+        self.results.set(key, [dict(r) for r in results])
+
+    def invalidate(self):
+        """Clear both caches (called when the vector store is reloaded)"""
+        self.embeddings.clear()
+        self.results.clear()
+        logger.info("Query caches invalidated")
+
+    def get_stats(self) -> Dict:
+        return {
+            "embeddings": self.embeddings.get_stats(),
+            "results": self.results.get_stats()
+        }
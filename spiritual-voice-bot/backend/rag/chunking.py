@@ -0,0 +1,396 @@
+"""
+Chunk-level index with parent-verse aggregation
+
+Long fields (commentaries, the Hindi meaning) are split with CHUNK_SIZE /
+CHUNK_OVERLAP and every chunk gets its own embedding. Search scores chunks,
+then aggregates them back to their verse (max or sum) with a vectorized
+group-by and keeps the best-matching passage span, so prompts carry one
+relevant passage instead of a whole commentary.
+
+Chunks are stored sorted by parent verse: the chunks of verse i are rows
+offsets[i]:offsets[i + 1] of the chunk matrix.
+
+Large chunk sets can be searched approximately: an IVF or quantized index
+over the chunk matrix (files prefixed "chunk_", written at ingest time)
+shortlists chunks, and only their parent verses are scored exactly.
+"""
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from loader import LazyModule
+from rag.similarity import SimilarityIndex, normalize_rows, normalize_vector, top_k_indices
+from rag.store import replace_atomic
+
+logger = logging.getLogger(__name__)
+
+text_splitter = LazyModule("langchain.text_splitter", "langchain")
+
+CHUNKS_FILE = "chunks.npz"
+CHUNK_EMBEDDINGS_FILE = "chunk_embeddings.npy"
+
+# File name prefix of the IVF and quantized indexes over the chunk matrix
+CHUNK_PREFIX = "chunk_"
+
+# Verse fields that are chunked and embedded, in passage priority order
+CHUNK_FIELDS = ("text", "meaning", "commentary")
+
+AGGREGATIONS = ("max", "sum")
+
+SEPARATORS = ["\n\n", "\n", "। ", ". ", " ", ""]
+
+
+class SimpleTextSplitter:
+    """Fixed-size character splitter used when langchain is not installed"""
+
+    def __init__(self, chunk_size=512, chunk_overlap=50, separators=None):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split_text(self, text: str) -> List[str]:
+        chunks = []
+        i = 0
+        while i < len(text):
+            chunks.append(text[i:i + self.chunk_size])
+            i += self.chunk_size - self.chunk_overlap
+        return chunks
+
+
+def create_text_splitter(chunk_size: int, chunk_overlap: int):
+    """Recursive character splitter (langchain when installed)"""
+    if text_splitter.available:
+        return text_splitter.RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            separators=SEPARATORS
+        )
+    logger.warning("langchain not installed; using simple text splitter (reduced functionality)")
+    return SimpleTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def chunks_exist(index_dir: Path) -> bool:
+    """Check whether a chunk index has been written to index_dir"""
+    index_dir = Path(index_dir)
+    return (index_dir / CHUNKS_FILE).exists() and (index_dir / CHUNK_EMBEDDINGS_FILE).exists()
+
+
+def remove_chunks(index_dir: Path):
+    """Delete a chunk index and its approximate indexes from index_dir (stale after re-ingesting)"""
+    index_dir = Path(index_dir)
+    for path in [index_dir / CHUNKS_FILE, index_dir / CHUNK_EMBEDDINGS_FILE, *index_dir.glob(f"{CHUNK_PREFIX}*")]:
+        if path.exists():
+            path.unlink()
+            logger.info(f"Removed stale chunk file {path}")
+
+
+def _split_spans(text: str, splitter) -> List[Tuple[int, int]]:
+    """Split text and locate every chunk as a (start, end) span"""
+    spans = []
+    cursor = 0
+    for chunk in splitter.split_text(text):
+        if not chunk:
+            continue
+        start = text.find(chunk, cursor)
+        if start < 0:
+            start = text.find(chunk)
+        if start < 0:
+            # Splitter altered the chunk; keep an approximate span
+            start = min(cursor, max(len(text) - len(chunk), 0))
+        end = min(start + len(chunk), len(text))
+        spans.append((start, end))
+        cursor = start + 1
+    return spans
+
+
+def chunk_verses(
+    verses: List[Dict],
+    splitter,
+    fields=CHUNK_FIELDS
+) -> Tuple[List[str], Dict[str, np.ndarray]]:
+    """
+    Split the chunked fields of every verse
+
+    Args:
+        verses: Verse dicts, aligned with the embedding matrix rows
+        splitter: Text splitter with split_text (see create_text_splitter)
+        fields: Verse fields to chunk
+
+    Returns:
+        Tuple of (chunk texts, arrays parents/fields/starts/ends), sorted by parent
+    """
+    texts: List[str] = []
+    parents: List[int] = []
+    field_ids: List[int] = []
+    starts: List[int] = []
+    ends: List[int] = []
+
+    for parent, verse in enumerate(verses):
+        for field_id, field in enumerate(fields):
+            value = verse.get(field)
+            if not value or not isinstance(value, str):
+                continue
+            for start, end in _split_spans(value, splitter):
+                texts.append(value[start:end])
+                parents.append(parent)
+                field_ids.append(field_id)
+                starts.append(start)
+                ends.append(end)
+
+    return texts, {
+        "parents": np.asarray(parents, dtype=np.int32),
+        "fields": np.asarray(field_ids, dtype=np.uint8),
+        "starts": np.asarray(starts, dtype=np.int32),
+        "ends": np.asarray(ends, dtype=np.int32),
+    }
+
+
+def group_by_parent(
+    parents: np.ndarray,
+    scores: np.ndarray,
+    aggregation: str = "max"
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Aggregate chunk scores per parent
+
+    Args:
+        parents: Parent id of every chunk, sorted ascending
+        scores: Score of every chunk
+        aggregation: "max" or "sum"
+
+    Returns:
+        Tuple of (parent ids, aggregated scores, position of each parent's best chunk)
+    """
+    if len(parents) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, np.empty(0, dtype=np.float32), empty
+
+    starts = np.flatnonzero(np.r_[True, parents[1:] != parents[:-1]])
+    reduce = np.add if aggregation == "sum" else np.maximum
+    aggregated = reduce.reduceat(scores, starts)
+
+    # Within each group, the best chunk sorts first
+    groups = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(parents)]))
+    best = np.lexsort((-scores, groups))[starts]
+    return parents[starts].astype(np.int64), aggregated.astype(np.float32), best
+
+
+class ChunkIndex:
+    """
+    Search over chunk embeddings, ranked by parent verse
+    """
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        parents: np.ndarray,
+        fields: np.ndarray,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        num_parents: int,
+        aggregation: str = "max",
+        normalized: bool = False,
+        field_names=CHUNK_FIELDS,
+        candidates=None,
+        candidate_factor: int = 4
+    ):
+        """
+        Args:
+            matrix: (C, d) chunk embeddings, rows sorted by parent
+            parents: Parent verse of every chunk
+            fields: Field id (into field_names) of every chunk
+            starts, ends: Character span of every chunk within its field
+            num_parents: Number of verses
+            aggregation: "max" (best chunk) or "sum" (all matching chunks)
+            normalized: Rows are already unit-length float32
+            candidates: Optional approximate index over the chunk matrix (IVFIndex,
+                QuantizedIndex) that shortlists chunks; None searches all chunks
+            candidate_factor: Chunks shortlisted per requested verse
+        """
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown chunk aggregation '{aggregation}', expected one of {AGGREGATIONS}")
+        if len(parents) != matrix.shape[0]:
+            raise ValueError(f"{len(parents)} chunk parents but {matrix.shape[0]} chunk embeddings")
+
+        self.chunks = SimilarityIndex(matrix, normalized=normalized)
+        self.parents = np.asarray(parents)
+        self.fields = np.asarray(fields)
+        self.starts = np.asarray(starts)
+        self.ends = np.asarray(ends)
+        self.num_parents = num_parents
+        self.aggregation = aggregation
+        self.field_names = tuple(field_names)
+        self.offsets = np.searchsorted(self.parents, np.arange(num_parents + 1)).astype(np.int64)
+        self.candidates = candidates
+        self.candidate_factor = max(1, candidate_factor)
+
+    def __len__(self) -> int:
+        return self.num_parents
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.chunks.matrix
+
+    @classmethod
+    def build(
+        cls,
+        verses: List[Dict],
+        embed,
+        splitter,
+        aggregation: str = "max",
+        batch_size: int = 64
+    ) -> "ChunkIndex":
+        """
+        Chunk verses and embed the chunks in batches
+
+        Args:
+            verses: Verse dicts
+            embed: Callable mapping a list of texts to an (n, d) array
+            splitter: Text splitter with split_text
+        """
+        texts, arrays = chunk_verses(verses, splitter)
+        batches = [
+            np.asarray(embed(texts[start:start + batch_size]), dtype=np.float32)
+            for start in range(0, len(texts), batch_size)
+        ]
+        matrix = normalize_rows(np.vstack(batches)) if batches else np.empty((0, 0), dtype=np.float32)
+        return cls(matrix, num_parents=len(verses), aggregation=aggregation, normalized=True, **arrays)
+
+    def save(self, index_dir: Path):
+        """
+        Write chunk embeddings and spans next to the verse index
+
+        Each file is renamed into place, embeddings first; the spans file
+        records the matrix shape and verse count so load can tell a pair from
+        an interrupted build apart.
+        """
+        index_dir = Path(index_dir)
+        replace_atomic(index_dir / CHUNK_EMBEDDINGS_FILE, lambda f: np.save(f, self.matrix))
+        replace_atomic(index_dir / CHUNKS_FILE, lambda f: np.savez(
+            f,
+            parents=self.parents,
+            fields=self.fields,
+            starts=self.starts,
+            ends=self.ends,
+            field_names=np.array(self.field_names),
+            shape=np.array(self.matrix.shape, dtype=np.int64),
+            num_parents=np.array(self.num_parents, dtype=np.int64)
+        ))
+        logger.info(f"Saved {len(self.parents)} chunks for {self.num_parents} verses to {index_dir}")
+
+    @classmethod
+    def load(cls, index_dir: Path, num_parents: int, aggregation: str = "max") -> "ChunkIndex":
+        """
+        Memory-map chunk embeddings written by save
+
+        Raises:
+            ValueError: Embeddings, spans and verse index come from different builds
+        """
+        index_dir = Path(index_dir)
+        matrix = np.load(index_dir / CHUNK_EMBEDDINGS_FILE, mmap_mode="r")
+        with np.load(index_dir / CHUNKS_FILE) as data:
+            parents = data["parents"]
+            if "shape" in data.files and tuple(data["shape"].tolist()) != matrix.shape:
+                raise ValueError(f"Chunk spans were saved for {tuple(data['shape'].tolist())} embeddings, found {matrix.shape}")
+            if "num_parents" in data.files and int(data["num_parents"]) != num_parents:
+                raise ValueError(f"Chunks were built for {int(data['num_parents'])} verses but index has {num_parents}")
+            if len(parents) and int(parents.max()) >= num_parents:
+                raise ValueError(f"Chunks reference verse {int(parents.max())} but index has {num_parents}")
+            return cls(
+                matrix, parents, data["fields"], data["starts"], data["ends"], num_parents,
+                aggregation=aggregation, normalized=True, field_names=data["field_names"].tolist()
+            )
+
+    def _chunk_rows(self, parent_ids: np.ndarray) -> np.ndarray:
+        """Chunk rows of the given parents, in ascending parent order"""
+        parent_ids = np.sort(np.asarray(parent_ids, dtype=np.int64))
+        starts, ends = self.offsets[parent_ids], self.offsets[parent_ids + 1]
+        lengths = ends - starts
+        # Concatenated ranges starts[i]:ends[i] without a Python loop
+        return np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths) + np.arange(lengths.sum())
+
+    def search(
+        self,
+        query,
+        top_k: int,
+        mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the top_k verses by aggregated chunk score
+
+        Args:
+            query: Query embedding
+            top_k: Number of verses
+            mask: Optional boolean filter mask over verses
+
+        Returns:
+            Tuple of (verse indices, aggregated scores), best first
+        """
+        query = normalize_vector(query)
+        if self.candidates is not None:
+            found = self._search_candidates(query, top_k, mask)
+            if found is not None:
+                return found
+
+        if mask is None:
+            rows = None
+            scores = self.chunks.scores(query)
+            parents = self.parents
+        else:
+            rows = np.flatnonzero(mask[self.parents])
+            scores = np.asarray(self.matrix[rows], dtype=np.float32) @ query
+            parents = self.parents[rows]
+
+        parent_ids, aggregated, _ = group_by_parent(parents, scores, self.aggregation)
+        best = top_k_indices(aggregated, top_k)
+        return parent_ids[best], aggregated[best]
+
+    def _search_candidates(
+        self,
+        query: np.ndarray,
+        top_k: int,
+        mask: Optional[np.ndarray]
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Verses of the chunks shortlisted by the approximate index, scored exactly
+
+        Returns None (search all chunks) when the shortlist covers fewer than top_k verses.
+        """
+        chunk_mask = None if mask is None else mask[self.parents]
+        rows, _ = self.candidates.search(query, top_k * self.candidate_factor, mask=chunk_mask)
+        parent_ids = np.unique(self.parents[rows])
+        if len(parent_ids) < top_k:
+            return None
+        scores, _ = self.score_parents(query, parent_ids)
+        best = top_k_indices(scores, top_k)
+        return parent_ids[best], scores[best]
+
+    def score_parents(self, query, parent_ids) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Aggregated score and best chunk row for specific verses
+
+        Returns:
+            Tuple of (scores, best chunk rows) aligned with parent_ids; verses
+            without chunks get score 0 and chunk -1
+        """
+        parent_ids = np.asarray(parent_ids, dtype=np.int64)
+        rows = self._chunk_rows(parent_ids)
+        scores = np.asarray(self.matrix[rows], dtype=np.float32) @ normalize_vector(query)
+        found, aggregated, best = group_by_parent(self.parents[rows], scores, self.aggregation)
+
+        position = np.searchsorted(found, parent_ids)
+        position = np.minimum(position, max(len(found) - 1, 0))
+        present = (found[position] == parent_ids) if len(found) else np.zeros(len(parent_ids), dtype=bool)
+
+        result_scores = np.where(present, aggregated[position] if len(found) else 0.0, 0.0).astype(np.float32)
+        result_rows = np.where(present, rows[best[position]] if len(found) else -1, -1)
+        return result_scores, result_rows
+
+    def passage(self, verse: Dict, chunk_row: int) -> Optional[Dict]:
+        """The span of a verse field that a chunk covers"""
+        if chunk_row < 0:
+            return None
+        field = self.field_names[int(self.fields[chunk_row])]
+        start, end = int(self.starts[chunk_row]), int(self.ends[chunk_row])
+        return {"field": field, "start": start, "end": end, "text": str(verse.get(field, ""))[start:end]}
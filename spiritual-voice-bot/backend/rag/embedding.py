@@ -0,0 +1,125 @@
+"""
+Embedding model backends for CPU inference
+
+- torch: the sentence-transformers PyTorch model (fp32)
+- onnx: the same model exported to ONNX Runtime
+- onnx-int8: the ONNX export with dynamic int8 weight quantization
+
+ONNX exports are written once to EMBEDDING_ONNX_DIR and reused on later
+starts. Every backend exposes the sentence-transformers encode() API, so the
+batcher, ingest scripts and pipeline don't care which one is loaded.
+"""
+import logging
+import re
+from pathlib import Path
+from typing import Optional
+
+from loader import LazyModule
+
+logger = logging.getLogger(__name__)
+
+sentence_transformers = LazyModule("sentence_transformers", "sentence-transformers")
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Written by save_pretrained / export_dynamic_quantized_onnx_model
+ONNX_FILE = "onnx/model.onnx"
+
+
+def quantized_onnx_file(quantization_config: str) -> str:
+    """Path of the int8 export inside the export directory"""
+    return f"onnx/model_qint8_{quantization_config}.onnx"
+
+
+def export_dir(cache_dir: str, model_name: str) -> Path:
+    """Directory holding the ONNX exports of a model"""
+    return Path(cache_dir) / re.sub(r"[^\w.-]+", "__", model_name)
+
+
+def _load_onnx(model_name: str, target: Path):
+    """Load the fp32 ONNX model, exporting it on first use"""
+    SentenceTransformer = sentence_transformers.SentenceTransformer
+    if (target / ONNX_FILE).exists():
+        return SentenceTransformer(str(target), backend="onnx")
+
+    logger.info(f"Exporting {model_name} to ONNX (one-time) in {target}")
+    model = SentenceTransformer(model_name, backend="onnx")
+    model.save_pretrained(str(target))
+    return model
+
+
+def _load_onnx_int8(model_name: str, target: Path, quantization_config: str):
+    """Load the int8 ONNX model, quantizing the fp32 export on first use"""
+    file_name = quantized_onnx_file(quantization_config)
+    if not (target / file_name).exists():
+        model = _load_onnx(model_name, target)
+        logger.info(f"Quantizing ONNX model to int8 ({quantization_config}, one-time)")
+        sentence_transformers.export_dynamic_quantized_onnx_model(
+            model,
+            quantization_config=quantization_config,
+            model_name_or_path=str(target)
+        )
+    return sentence_transformers.SentenceTransformer(
+        str(target), backend="onnx", model_kwargs={"file_name": file_name}
+    )
+
+
+def load_embedding_model(
+    model_name: str,
+    backend: str = "torch",
+    cache_dir: str = "./data/models",
+    quantization_config: str = "avx2",
+    fallback: bool = True
+):
+    """
+    Load the embedding model with the requested inference backend
+
+    Args:
+        model_name: sentence-transformers model name or path
+        backend: "torch", "onnx" or "onnx-int8"
+        cache_dir: Where ONNX exports are kept
+        quantization_config: int8 kernel target ("arm64", "avx2", "avx512", "avx512_vnni")
+        fallback: Load the PyTorch model if the ONNX backend fails (e.g. optimum
+            or onnxruntime not installed)
+
+    Returns:
+        Model with a sentence-transformers compatible encode()
+
+    Raises:
+        ValueError: If the backend is unknown
+        ImportError: If sentence-transformers is not installed
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}")
+
+    SentenceTransformer = sentence_transformers.SentenceTransformer
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+
+    target = export_dir(cache_dir, model_name)
+    try:
+        if backend == "onnx":
+            model = _load_onnx(model_name, target)
+        else:
+            model = _load_onnx_int8(model_name, target, quantization_config)
+        logger.info(f"Loaded {model_name} with {backend} backend")
+        return model
+    except Exception as e:
+        if not fallback:
+            raise
+        logger.error(
+            f"Failed to load {backend} embedding backend, using PyTorch: {str(e)}. "
+            "Install with: pip install 'sentence-transformers[onnx]'"
+        )
+        return SentenceTransformer(model_name)
+
+
+def load_from_settings(settings, fallback: bool = True, backend: Optional[str] = None):
+    """Embedding model configured by EMBEDDING_BACKEND and related settings"""
+    return load_embedding_model(
+        settings.EMBEDDING_MODEL,
+        backend=backend or settings.EMBEDDING_BACKEND,
+        cache_dir=settings.EMBEDDING_ONNX_DIR,
+        quantization_config=settings.EMBEDDING_ONNX_QUANTIZATION,
+        fallback=fallback
+    )
@@ -0,0 +1,106 @@
+"""
+Metadata filter index for scripture search
+
+Boolean masks per language, scripture, chapter and topic are built once when
+the vector store is loaded, so filters are applied before top-k selection and
+only the matching rows get scored.
+"""
+import re
+import numpy as np
+from typing import Dict, List, Optional, Tuple, Union
+
+ChapterFilter = Union[int, str, Tuple[int, int]]
+
+_CHAPTER_RANGE = re.compile(r'^\s*(\d+)\s*(?:(?:\.\.|-|–)\s*(\d+))?\s*$')
+
+
+def parse_chapter_filter(chapter: Optional[ChapterFilter]) -> Optional[Tuple[int, int]]:
+    """
+    Parse a chapter filter into an inclusive (start, end) range
+
+    Accepts 2, "2", "2..6", "2-6" or (2, 6).
+
+    Raises:
+        ValueError: If the filter can't be parsed
+    """
+    if chapter is None or chapter == "":
+        return None
+    if isinstance(chapter, tuple):
+        start, end = chapter
+        return (int(start), int(end)) if start <= end else (int(end), int(start))
+    if isinstance(chapter, int):
+        return chapter, chapter
+
+    match = _CHAPTER_RANGE.match(str(chapter))
+    if not match:
+        raise ValueError(f"Invalid chapter filter '{chapter}', expected e.g. '2' or '2..6'")
+
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else start
+    return (start, end) if start <= end else (end, start)
+
+
+def _to_int(value) -> int:
+    """Chapter numbers may be stored as strings by the ingestion scripts"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class MetadataIndex:
+    """
+    Boolean masks over the verse list for fast combined filtering
+    """
+
+    FIELDS = ("language", "scripture", "topic")
+
+    def __init__(self, scriptures: List[Dict]):
+        """
+        Build masks for every distinct value of the indexed fields
+
+        Args:
+            scriptures: Verse dicts, aligned with the embedding matrix rows
+        """
+        self.size = len(scriptures)
+        self.masks: Dict[str, Dict[str, np.ndarray]] = {}
+
+        for field in self.FIELDS:
+            values = np.array([str(s.get(field, "")) for s in scriptures], dtype=object)
+            self.masks[field] = {value: values == value for value in set(values.tolist())}
+
+        self.chapters = np.array([_to_int(s.get("chapter")) for s in scriptures], dtype=np.int32)
+
+    def _field_mask(self, field: str, value: str) -> np.ndarray:
+        mask = self.masks[field].get(str(value))
+        if mask is None:
+            return np.zeros(self.size, dtype=bool)
+        return mask
+
+    def mask(
+        self,
+        language: Optional[str] = None,
+        scripture: Optional[str] = None,
+        chapter: Optional[ChapterFilter] = None,
+        topic: Optional[str] = None
+    ) -> Optional[np.ndarray]:
+        """
+        Combine filters into one boolean mask
+
+        Returns:
+            Boolean mask of matching rows, or None if no filter was given
+        """
+        result = None
+
+        for field, value in (("language", language), ("scripture", scripture), ("topic", topic)):
+            if value:
+                field_mask = self._field_mask(field, value)
+                result = field_mask if result is None else result & field_mask
+
+        chapter_range = parse_chapter_filter(chapter)
+        if chapter_range is not None:
+            start, end = chapter_range
+            chapter_mask = (self.chapters >= start) & (self.chapters <= end)
+            result = chapter_mask if result is None else result & chapter_mask
+
+        return result
@@ -0,0 +1,260 @@
+"""
+BM25 lexical index and reciprocal-rank fusion for hybrid retrieval
+
+Dense embeddings miss concrete terms ("Arjuna", "sthitaprajna"), so verses are
+also indexed lexically over their text, meaning, transliteration and word
+meanings. Postings are stored CSR-style in compact numpy arrays and saved
+next to the embeddings at ingest time.
+"""
+import re
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag.similarity import top_k_indices
+from rag.store import replace_atomic
+
+logger = logging.getLogger(__name__)
+
+BM25_FILE = "bm25.npz"
+
+# Verse fields that make up the lexical document
+LEXICAL_FIELDS = ("text", "meaning", "transliteration", "word_meaning")
+
+# Word characters plus Devanagari combining marks, so Hindi words aren't split at matras
+_TOKEN = re.compile(r"[\w\u0900-\u097F]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens (Latin and Devanagari)"""
+    return _TOKEN.findall(text.lower())
+
+
+def verse_document(verse: Dict) -> str:
+    """Concatenate the lexically indexed fields of a verse"""
+    return " ".join(str(verse.get(field) or "") for field in LEXICAL_FIELDS)
+
+
+def lexical_exists(index_dir: Path) -> bool:
+    """Check whether a BM25 index has been written to index_dir"""
+    return (Path(index_dir) / BM25_FILE).exists()
+
+
+def reciprocal_rank_fusion(rankings: Sequence[np.ndarray], k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse several best-first rankings of document ids
+
+    Each document scores sum(1 / (k + rank)) over the rankings it appears in.
+
+    Returns:
+        Tuple of (document ids, fused scores), best first
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(np.asarray(ranking).tolist(), 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+
+    if not fused:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    ids = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    scores = np.fromiter(fused.values(), dtype=np.float64, count=len(fused))
+    order = np.argsort(-scores, kind="stable")
+    return ids[order], scores[order]
+
+
+def merge_results(result_lists: Sequence[List[Dict]], top_k: int, k: int = 60) -> List[Dict]:
+    """
+    Fuse several best-first search result lists with reciprocal-rank fusion
+
+    Results are matched by (reference, language). A verse found by several
+    lists keeps its highest score. Ties go to the earlier list.
+
+    Returns:
+        Up to top_k result dicts, best first
+    """
+    keys: Dict[tuple, int] = {}
+    best: List[Dict] = []
+    rankings = []
+    for results in result_lists:
+        ranking = []
+        for result in results:
+            key = (result.get("reference"), result.get("language"))
+            if key not in keys:
+                keys[key] = len(best)
+                best.append(result)
+            elif result.get("score", 0.0) > best[keys[key]].get("score", 0.0):
+                best[keys[key]] = result
+            ranking.append(keys[key])
+        rankings.append(np.asarray(ranking, dtype=np.int64))
+
+    fused, _ = reciprocal_rank_fusion(rankings, k=k)
+    return [best[i] for i in fused[:top_k].tolist()]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index with CSR postings
+    """
+
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.5,
+        b: float = 0.75
+    ):
+        """
+        Args:
+            vocabulary: term -> term id
+            offsets: (V + 1,) start of every term's postings
+            doc_ids: Document ids of all postings, grouped by term
+            term_freqs: Term frequency of every posting
+            doc_lengths: Token count of every document
+        """
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths.astype(np.float32)
+        self.k1 = k1
+        self.b = b
+
+        n = len(doc_lengths)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if n else 0.0
+        doc_freqs = np.diff(offsets).astype(np.float64)
+        self.idf = np.log(1.0 + (n - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+
+        # Per-document length normalization, precomputed once
+        if n and self.avg_doc_length > 0:
+            self._length_norm = k1 * (1 - b + b * self.doc_lengths / self.avg_doc_length)
+        else:
+            self._length_norm = np.full(n, k1, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, documents: List[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Tokenize documents and build CSR postings"""
+        vocabulary: Dict[str, int] = {}
+        term_ids: List[int] = []
+        posting_docs: List[int] = []
+        doc_lengths = np.zeros(len(documents), dtype=np.int32)
+
+        for doc_id, document in enumerate(documents):
+            tokens = tokenize(document)
+            doc_lengths[doc_id] = len(tokens)
+            for token in tokens:
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                posting_docs.append(doc_id)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        posting_docs = np.asarray(posting_docs, dtype=np.int64)
+
+        # Collapse (term, doc) pairs into postings with term frequencies
+        pairs = term_ids * max(len(documents), 1) + posting_docs
+        unique_pairs, term_freqs = np.unique(pairs, return_counts=True)
+        posting_terms = unique_pairs // max(len(documents), 1)
+        doc_ids = (unique_pairs % max(len(documents), 1)).astype(np.int32)
+
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(posting_terms, minlength=len(vocabulary)), out=offsets[1:])
+
+        term_freqs = np.minimum(term_freqs, np.iinfo(np.uint16).max).astype(np.uint16)
+        return cls(vocabulary, offsets, doc_ids, term_freqs, doc_lengths, k1, b)
+
+    def save(self, index_dir: Path) -> Path:
+        """Write the index next to the embeddings (through a temp file renamed into place)"""
+        path = Path(index_dir) / BM25_FILE
+        terms = np.empty(len(self.vocabulary), dtype=object)
+        for term, term_id in self.vocabulary.items():
+            terms[term_id] = term
+
+        replace_atomic(path, lambda f: np.savez(
+            f,
+            terms=terms.astype(str),
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            term_freqs=self.term_freqs,
+            doc_lengths=self.doc_lengths,
+            params=np.array([self.k1, self.b], dtype=np.float64)
+        ))
+        logger.info(f"Saved BM25 index ({len(self.vocabulary)} terms, {len(self.doc_ids)} postings) to {path}")
+        return path
+
+    @classmethod
+    def load(cls, index_dir: Path) -> "BM25Index":
+        """Load an index written by save"""
+        with np.load(Path(index_dir) / BM25_FILE) as data:
+            vocabulary = {term: i for i, term in enumerate(data["terms"].tolist())}
+            k1, b = data["params"].tolist()
+            return cls(
+                vocabulary, data["offsets"], data["doc_ids"], data["term_freqs"],
+                data["doc_lengths"], k1=k1, b=b
+            )
+
+    def _query_terms(self, query: str) -> List[int]:
+        """Distinct vocabulary term ids in the query"""
+        return list(dict.fromkeys(
+            self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary
+        ))
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document"""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term_id in self._query_terms(query):
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end].astype(np.float32)
+            # Postings hold each document once per term, so fancy-index += is safe
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+        return scores
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top documents with a positive BM25 score
+
+        Returns:
+            Tuple of (indices, scores), best first
+        """
+        scores = self.scores(query)
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        matching = np.flatnonzero(scores > 0)
+        best = top_k_indices(scores[matching], top_k)
+        return matching[best], scores[matching[best]]
+
+    def match_strength(self, query: str) -> float:
+        """
+        How well the best document covers the query's terms, from 0 to 1
+
+        The best BM25 score divided by the score of a document containing every
+        query term once at average length (which is the sum of their idfs).
+        Words missing from the corpus count as maximally rare, so casual phrasing
+        scores low and only concrete queries the corpus covers score high.
+        """
+        tokens = set(tokenize(query))
+        if not tokens or not len(self):
+            return 0.0
+
+        term_ids = self._query_terms(query)
+        if not term_ids:
+            return 0.0
+
+        n = len(self)
+        max_idf = float(np.log(1.0 + (n + 0.5) / 0.5))
+        ceiling = float(self.idf[term_ids].sum()) + (len(tokens) - len(term_ids)) * max_idf
+        best = float(self.scores(query).max())
+        return min(1.0, best / ceiling) if ceiling > 0 else 0.0
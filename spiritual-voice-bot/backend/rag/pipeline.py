@@ -1,17 +1,30 @@
 """
 RAG Pipeline for Scripture-grounded responses with LLM integration
 """
+import asyncio
 import numpy as np
 from typing import List, Dict, Optional
-from llm.service import get_llm_service
-from llm.formatter import get_refiner, get_reformatter, ensure_paragraph_breaks
-
-try:
-    from sentence_transformers import SentenceTransformer
-    SENTENCE_TRANSFORMERS_AVAILABLE = True
-except Exception:
-    SentenceTransformer = None
-    SENTENCE_TRANSFORMERS_AVAILABLE = False
+from llm.service import CitationTrailer, get_llm_service
+from llm.formatter import StreamFormatter, StreamingParagraphFormatter, get_refiner, get_reformatter
+from llm.trace import llm_trace
+from rag.similarity import SimilarityIndex, normalize_vector
+from rag.filters import MetadataIndex, ChapterFilter, parse_chapter_filter
+from rag.batcher import EmbeddingBatcher
+from rag.cache import QueryCache, model_text_key, normalize_query
+from rag.answer_cache import SemanticAnswerCache
+from rag.singleflight import SingleFlight
+from rag.sessions import Session, SessionStore, verse_id
+from rag.store import index_exists, load_index
+from rag.ann import IVFIndex, ann_exists
+from rag.quantization import QuantizedIndex, quantized_exists
+from rag.lexical import BM25Index, lexical_exists, merge_results, reciprocal_rank_fusion, verse_document
+from rag.rerank import Reranker
+from rag.references import VerseReference, build_verse_index, parse_verse_reference
+from rag.vector_store import InMemoryVectorStore, MmapVectorStore, create_qdrant_store
+from rag.chunking import CHUNK_FIELDS, CHUNK_PREFIX, ChunkIndex, chunks_exist, create_text_splitter
+from rag.embedding import load_from_settings, sentence_transformers
+
+from loader import timed
 
 
 class _DummyEmbeddingModel:
@@ -24,39 +37,8 @@ class _DummyEmbeddingModel:
             return np.zeros((len(texts), self.dim))
         return np.zeros(self.dim)
 
-try:
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
-    from langchain.prompts import PromptTemplate
-    LANGCHAIN_AVAILABLE = True
-except Exception:
-    RecursiveCharacterTextSplitter = None
-    PromptTemplate = None
-    LANGCHAIN_AVAILABLE = False
-
-
-class _DummyTextSplitter:
-    """Simple fallback text splitter"""
-    def __init__(self, chunk_size=512, chunk_overlap=50, separators=None):
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
-
-    def split_text(self, text: str):
-        chunks = []
-        i = 0
-        while i < len(text):
-            chunks.append(text[i:i+self.chunk_size])
-            i += self.chunk_size - self.chunk_overlap
-        return chunks
 import logging
 
-# Try to import torch if available; otherwise, use numpy for similarity calculations
-try:
-    import torch
-    TORCH_AVAILABLE = True
-except Exception:
-    torch = None
-    TORCH_AVAILABLE = False
-
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -70,56 +52,68 @@ class RAGPipeline:
 
     def __init__(self):
         self.embedding_model = None
+        self.embedding_batcher = None
         self.vector_store = None
+        self.remote_store = None
         self.llm = None
         self.text_splitter = None
+        self.reranker = Reranker(
+            settings.RERANK_MODEL,
+            cache_max_bytes=int(settings.RERANK_CACHE_MB * 1024 * 1024)
+        )
+        self.init_timings: Dict[str, float] = {}
+        self.query_cache = QueryCache(
+            embedding_max_bytes=int(settings.QUERY_CACHE_EMBEDDING_MB * 1024 * 1024),
+            results_max_bytes=int(settings.QUERY_CACHE_RESULTS_MB * 1024 * 1024),
+            ttl_seconds=settings.QUERY_CACHE_TTL_SECONDS
+        )
+        self.answer_cache = SemanticAnswerCache(
+            threshold=settings.ANSWER_CACHE_THRESHOLD,
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+            path=settings.ANSWER_CACHE_PATH or None
+        )
+        self.inflight = SingleFlight()
+        self.sessions = SessionStore(
+            max_sessions=settings.SESSION_MAX_SESSIONS,
+            ttl_seconds=settings.SESSION_TTL_SECONDS,
+            path=settings.SESSION_DB_PATH or None
+        )
         self.initialized = False
 
     async def initialize(self):
-        """Initialize all components"""
+        """
+        Initialize all components
+
+        The embedding model, rerank model and Qdrant connection load
+        concurrently on worker threads; the vector store loads once the
+        embedding model is ready (legacy stores may need it to embed).
+        """
         try:
-            logger.info("Loading embedding model...")
-            if SENTENCE_TRANSFORMERS_AVAILABLE:
-                self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
-            else:
-                # Use a lightweight dummy embedding model for quick local start
-                logger.warning("sentence-transformers not installed; using dummy embeddings for RAG (reduced functionality)")
-                self.embedding_model = _DummyEmbeddingModel(dim=getattr(settings, 'EMBEDDING_DIM', 768))
+            logger.info("Loading embedding and rerank models...")
+            await asyncio.gather(
+                asyncio.to_thread(self._load_embedding_model),
+                asyncio.to_thread(self._load_reranker),
+                self._connect_qdrant() if settings.VECTOR_STORE_BACKEND == "qdrant" else asyncio.sleep(0)
+            )
+
+            # Concurrent queries share batched forward passes off the event loop
+            self.embedding_batcher = EmbeddingBatcher(
+                self.embedding_model,
+                max_batch_size=settings.EMBEDDING_BATCH_SIZE,
+                max_wait_ms=settings.EMBEDDING_BATCH_WAIT_MS
+            )
 
             logger.info("Initializing text splitter...")
-            if LANGCHAIN_AVAILABLE:
-                self.text_splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=settings.CHUNK_SIZE,
-                    chunk_overlap=settings.CHUNK_OVERLAP,
-                    separators=["\n\n", "\n", "। ", ". ", " ", ""]
-                )
-            else:
-                logger.warning("langchain not installed; using dummy text splitter (reduced functionality)")
-                self.text_splitter = _DummyTextSplitter(
-                    chunk_size=settings.CHUNK_SIZE,
-                    chunk_overlap=settings.CHUNK_OVERLAP
-                )
+            self.text_splitter = create_text_splitter(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
 
-            # Initialize vector store (in-memory for POC)
             logger.info("Initializing vector store...")
-            self.vector_store = self._load_vector_store()
+            with timed("vector_store", self.init_timings):
+                self.vector_store = await asyncio.to_thread(self._load_vector_store)
+            self.query_cache.invalidate()
 
-            # Ensure embeddings are numpy arrays for compatibility when torch isn't installed
-            if TORCH_AVAILABLE:
-                # if torch is available keep tensors as-is
-                pass
-            else:
-                # convert embeddings to numpy arrays
-                if isinstance(self.vector_store.get("embeddings"), list):
-                    # already numpy
-                    pass
-                else:
-                    # handle the case where embeddings are torch tensors
-                    try:
-                        self.vector_store["embeddings"] = np.array(self.vector_store["embeddings"])
-                    except Exception:
-                        # leave as-is; methods below can handle arrays
-                        pass
+            if settings.ANSWER_CACHE_ENABLED:
+                self.answer_cache.load()
 
             # For POC, we'll use the embedding model for semantic similarity
             # In production, this would be a fine-tuned Airavata model
@@ -132,20 +126,261 @@ class RAGPipeline:
             logger.error(f"Failed to initialize RAG pipeline: {str(e)}")
             raise
 
+    def _load_embedding_model(self):
+        """Load the embedding model with EMBEDDING_BACKEND (blocking, runs on a worker thread)"""
+        with timed("embedding_model", self.init_timings):
+            if sentence_transformers.available:
+                self.embedding_model = load_from_settings(settings)
+            else:
+                # Use a lightweight dummy embedding model for quick local start
+                logger.warning("sentence-transformers not installed; using dummy embeddings for RAG (reduced functionality)")
+                self.embedding_model = _DummyEmbeddingModel(dim=getattr(settings, 'EMBEDDING_DIM', 768))
+
+    def _load_reranker(self):
+        """Load the cross-encoder (blocking, runs on a worker thread)"""
+        if settings.RERANK_ENABLED:
+            with timed("rerank_model", self.init_timings):
+                self.reranker.load()
+
+    async def warm_up(self):
+        """
+        Run a synthetic query through the embedding model and reranker
+
+        The first forward pass pays for lazy weight init and kernel selection;
+        doing it here keeps that off the first user request. The query cache
+        is bypassed so nothing synthetic is served later.
+        """
+        with timed("warm_up", self.init_timings):
+            query = "What does the Bhagavad Gita teach about duty?"
+            await self.embedding_batcher.encode(query)
+
+            if self.reranker.available and self.vector_store:
+                docs = self.vector_store["scriptures"][:2]
+                await self.reranker.rerank(query, docs, 1)
+                self.reranker.cache.clear()
+
+    async def _connect_qdrant(self):
+        """
+        Connect the shared Qdrant client
+
+        Qdrant point ids are verse row ids, so the local verse list is still
+        loaded and the local index serves as fallback when Qdrant errors.
+        """
+        try:
+            store = create_qdrant_store(settings)
+            points = await store.count()
+            if points == 0:
+                logger.warning(f"Qdrant collection '{settings.QDRANT_COLLECTION}' is empty, using local search")
+                await store.close()
+                return
+            self.remote_store = store
+            logger.info(f"Using Qdrant collection '{settings.QDRANT_COLLECTION}' ({points} points)")
+        except Exception as e:
+            logger.error(f"Failed to connect to Qdrant, using local search: {str(e)}")
+
+    async def close(self):
+        """Stop the embedding batcher, persist cached answers and sessions and close vector store connections"""
+        if settings.ANSWER_CACHE_ENABLED:
+            try:
+                self.answer_cache.save()
+            except Exception as e:
+                logger.error(f"Failed to save answer cache: {str(e)}")
+        try:
+            await asyncio.to_thread(self.sessions.close)
+        except Exception as e:
+            logger.error(f"Failed to save sessions: {str(e)}")
+        if self.embedding_batcher:
+            await self.embedding_batcher.close()
+        if self.remote_store:
+            await self.remote_store.close()
+
+    def reload_vector_store(self):
+        """Reload the vector store from disk and drop cached embeddings, results and answers"""
+        logger.info("Reloading vector store...")
+        self.vector_store = self._load_vector_store()
+        self.query_cache.invalidate()
+        self.answer_cache.clear()
+
+    def _build_vector_store(
+        self,
+        scriptures: List[Dict],
+        embeddings,
+        normalized: bool = False,
+        index_dir=None,
+        mmap: bool = False
+    ) -> Dict:
+        """
+        Assemble the vector store dict and its similarity index
+
+        Embeddings are L2-normalized into a contiguous float32 matrix once here,
+        so search only has to do a matrix-vector product per query. When
+        VECTOR_QUANTIZATION is set, quantized codes shortlist candidates for an
+        exact float rerank; otherwise large corpora with an IVF index built at
+        ingest time use approximate search. With a chunk index, dense search
+        runs over chunks and ranks verses by aggregated chunk score instead;
+        the same quantized or IVF search then shortlists chunks.
+        Searches go through
+        vector_store["store"], which is Qdrant when connected and the local
+        index otherwise.
+        """
+        index = SimilarityIndex(embeddings, normalized=normalized)
+        verse_matrix = index.matrix
+        chunk_index = self._load_chunk_index(scriptures, index_dir) if settings.CHUNK_SEARCH else None
+
+        if chunk_index is not None:
+            chunk_index.candidates = self._approximate_index(chunk_index.matrix, index_dir, CHUNK_PREFIX, "chunk")
+            chunk_index.candidate_factor = settings.CHUNK_CANDIDATE_FACTOR
+            index = chunk_index
+            logger.info(
+                f"Using chunk search ({len(chunk_index.parents)} chunks, {chunk_index.aggregation} per verse, "
+                f"{'exact' if chunk_index.candidates is None else 'approximate'})"
+            )
+        else:
+            index = self._approximate_index(index.matrix, index_dir) or index
+
+        # BM25 postings are built at ingest time; small or legacy stores build them here
+        lexical_index = BM25Index.load(index_dir) if index_dir is not None and lexical_exists(index_dir) else None
+        if lexical_index is not None and len(lexical_index) != len(scriptures):
+            logger.warning(f"BM25 index covers {len(lexical_index)} verses but {len(scriptures)} are loaded; rebuilding it")
+            lexical_index = None
+        if lexical_index is None:
+            lexical_index = BM25Index.build([verse_document(item) for item in scriptures])
+
+        local_store = MmapVectorStore(index) if mmap else InMemoryVectorStore(index)
+        store = local_store
+        if self.remote_store is not None:
+            # Point ids are row ids: a collection from another ingest would return the wrong verses
+            if self.remote_store.points == len(scriptures):
+                self.remote_store.fallback = local_store
+                store = self.remote_store
+            else:
+                logger.warning(
+                    f"Qdrant collection '{self.remote_store.collection}' has {self.remote_store.points} points "
+                    f"but {len(scriptures)} verses are loaded; re-run ingestion. Using local search"
+                )
+
+        return {
+            "scriptures": scriptures,
+            "embeddings": verse_matrix,
+            "index": index,
+            "chunk_index": chunk_index,
+            "store": store,
+            "lexical_index": lexical_index,
+            "metadata_index": MetadataIndex(scriptures),
+            "verse_index": build_verse_index(scriptures),
+            "texts": [item["text"] for item in scriptures]
+        }
+
+    def _approximate_index(self, matrix: np.ndarray, index_dir=None, prefix: str = "", name: str = "verse"):
+        """
+        Quantized (VECTOR_QUANTIZATION) or IVF index over a normalized matrix
+
+        Codes and IVF lists are loaded from index_dir when written at ingest
+        time (file name prefix distinguishes chunk indexes); codes are
+        otherwise built here. Returns None for exact search.
+        """
+        quantization = settings.VECTOR_QUANTIZATION
+        if quantization != "none":
+            try:
+                if index_dir is not None and quantized_exists(index_dir, quantization, prefix):
+                    index = QuantizedIndex.load(
+                        index_dir, matrix, quantization, settings.QUANTIZATION_RERANK_FACTOR, prefix=prefix
+                    )
+                else:
+                    index = QuantizedIndex.build(matrix, quantization, settings.QUANTIZATION_RERANK_FACTOR)
+                logger.info(f"Using {quantization} quantized {name} search with exact rerank")
+                return index
+            except Exception as e:
+                logger.error(f"Failed to set up {quantization} quantized {name} search, using exact search: {e}")
+                return None
+
+        if index_dir is None or len(matrix) < settings.ANN_MIN_CORPUS_SIZE:
+            return None
+        if not ann_exists(index_dir, prefix):
+            logger.info(f"No {name} IVF index found; re-run ingestion for approximate search")
+            return None
+        try:
+            index = IVFIndex.load(index_dir, matrix, nprobe=settings.ANN_NPROBE, prefix=prefix)
+            logger.info(f"Using {name} IVF index ({index.nlist} lists, nprobe={index.nprobe})")
+            return index
+        except Exception as e:
+            logger.error(f"Failed to load {name} IVF index, using exact search: {e}")
+            return None
+
+    def _load_chunk_index(self, scriptures: List[Dict], index_dir=None) -> Optional[ChunkIndex]:
+        """
+        Chunk index written at ingest time, or built here for small stores
+
+        Stores without an on-disk index (legacy JSON, sample data) are chunked
+        with the text splitter at load time, but only if some field is longer
+        than one chunk; otherwise verse embeddings already cover every field.
+        """
+        if index_dir is not None:
+            if not chunks_exist(index_dir):
+                logger.info("No chunk index found; re-run ingestion to enable chunk search")
+                return None
+            try:
+                return ChunkIndex.load(index_dir, len(scriptures), settings.CHUNK_AGGREGATION)
+            except Exception as e:
+                logger.error(f"Failed to load chunk index, using verse embeddings: {e}")
+                return None
+
+        has_long_fields = any(
+            len(str(scripture.get(field) or "")) > settings.CHUNK_SIZE
+            for scripture in scriptures
+            for field in CHUNK_FIELDS
+        )
+        if not has_long_fields:
+            return None
+
+        logger.info("Chunking and embedding long fields...")
+        return ChunkIndex.build(
+            scriptures,
+            lambda texts: self.embedding_model.encode(texts, convert_to_tensor=False),
+            self.text_splitter,
+            aggregation=settings.CHUNK_AGGREGATION,
+            batch_size=settings.CHUNK_EMBED_BATCH_SIZE
+        )
+
     def _load_vector_store(self) -> Dict:
         """
         Load or create vector store with scripture embeddings
-        Tries to load from processed dataset, falls back to sample data
+        Tries the memory-mapped binary index, then the legacy JSON dataset,
+        and falls back to sample data
         """
         import json
         from pathlib import Path
 
-        # Try to load processed dataset
-        processed_file = Path(__file__).parent.parent / "data" / "processed" / "bhagavad_gita_processed.json"
+        processed_dir = Path(__file__).parent.parent / "data" / "processed"
+
+        # Try to load the binary index (embeddings are memory-mapped, not parsed)
+        index_dir = processed_dir / "bhagavad_gita_index"
+
+        if index_exists(index_dir):
+            try:
+                logger.info(f"Loading binary index from {index_dir}")
+                mmap = settings.VECTOR_STORE_BACKEND != "memory"
+                scriptures, embeddings, metadata = load_index(index_dir, mmap=mmap)
+
+                vector_store = self._build_vector_store(
+                    scriptures, embeddings, normalized=True, index_dir=index_dir, mmap=mmap
+                )
+
+                logger.info(f"✅ Loaded {len(scriptures)} verses from Bhagavad Gita index")
+                logger.info(f"   Embedding dimension: {metadata.get('embedding_dim', 'unknown')}")
+                return vector_store
+
+            except Exception as e:
+                logger.error(f"Failed to load binary index: {e}")
+                logger.warning("Falling back to processed JSON dataset...")
+
+        # Try to load legacy processed dataset (embeddings stored as JSON lists)
+        processed_file = processed_dir / "bhagavad_gita_processed.json"
 
         if processed_file.exists():
             try:
                 logger.info(f"Loading processed dataset from {processed_file}")
+                logger.warning("   JSON embeddings are slow to load; re-run the ingestion script to build the binary index")
                 with open(processed_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
 
@@ -168,16 +403,8 @@ class RAGPipeline:
                     logger.warning("No embeddings found in processed file, regenerating...")
                     texts = [v["text"] for v in scriptures]
                     embeddings = self.embedding_model.encode(texts, convert_to_tensor=False)
-                else:
-                    embeddings = np.array(embeddings)
 
-                texts = [item["text"] for item in scriptures]
-
-                vector_store = {
-                    "scriptures": scriptures,
-                    "embeddings": embeddings,
-                    "texts": texts
-                }
+                vector_store = self._build_vector_store(scriptures, embeddings)
 
                 logger.info(f"✅ Loaded {len(scriptures)} verses from Bhagavad Gita dataset")
                 logger.info(f"   Embedding dimension: {metadata.get('embedding_dim', 'unknown')}")
@@ -270,11 +497,7 @@ class RAGPipeline:
         texts = [item["text"] for item in sample_scriptures]
         embeddings = self.embedding_model.encode(texts, convert_to_tensor=False)
 
-        vector_store = {
-            "scriptures": sample_scriptures,
-            "embeddings": embeddings,
-            "texts": texts
-        }
+        vector_store = self._build_vector_store(sample_scriptures, embeddings)
 
         logger.info(f"Loaded {len(sample_scriptures)} sample scripture passages")
         return vector_store
@@ -284,122 +507,507 @@ class RAGPipeline:
         if not self.initialized:
             raise RuntimeError("Pipeline not initialized")
 
-        embeddings = self.embedding_model.encode(text, convert_to_tensor=False)
-        return embeddings
+        return await self._embed_query(text)
+
+    async def _embed_query(self, text: str) -> np.ndarray:
+        """Embed a query, using the embedding cache when possible"""
+        embedding = self.query_cache.get_embedding(text)
+        if embedding is None:
+            embedding = await self.embedding_batcher.encode(text)
+            self.query_cache.set_embedding(text, embedding)
+        return embedding
 
     async def search(
         self,
         query: str,
         scripture_filter: Optional[str] = None,
         language: str = "en",
-        top_k: int = 5
+        top_k: int = 5,
+        chapter: Optional[ChapterFilter] = None,
+        topic: Optional[str] = None
     ) -> List[Dict]:
         """
         Search for relevant scripture passages
+
+        Filters (language, scripture, chapter or chapter range, topic) are
+        applied before top-k selection, so only matching verses are scored.
         """
         if not self.initialized:
             raise RuntimeError("Pipeline not initialized")
 
-        # Generate query embedding (numpy by default)
-        query_embedding = self.embedding_model.encode(query, convert_to_tensor=False)
+        # Serve repeated queries from the result cache (also validates the chapter filter)
+        cache_key = (
+            model_text_key(query), scripture_filter, language,
+            parse_chapter_filter(chapter), topic, top_k
+        )
+        cached = self.query_cache.get_results(cache_key)
+        if cached is not None:
+            return cached
+
+        mask = self.vector_store["metadata_index"].mask(
+            language=language,
+            scripture=scripture_filter,
+            chapter=chapter,
+            topic=topic
+        )
+
+        # Generate query embedding (cached, batched with concurrent requests, off the event loop)
+        query_embedding = await self._embed_query(query)
+
+        # Same filters as field values, for backends that filter server-side
+        filters = {
+            "language": language,
+            "scripture": scripture_filter,
+            "topic": topic,
+            "chapter": parse_chapter_filter(chapter)
+        }
 
-        # Calculate cosine similarity using Torch if available, else NumPy
-        if TORCH_AVAILABLE and hasattr(self.vector_store.get("embeddings"), "dtype") and "torch" in str(type(self.vector_store["embeddings"])):
-            similarities = torch.nn.functional.cosine_similarity(
-                torch.tensor(query_embedding).unsqueeze(0),
-                self.vector_store["embeddings"]
+        if settings.HYBRID_SEARCH:
+            ranked = await self._hybrid_rank(query, query_embedding, top_k, mask, filters)
+        else:
+            # Cosine similarity against the matching rows of the pre-normalized corpus matrix
+            top_indices, top_scores = await self.vector_store["store"].search(
+                query_embedding, top_k, mask=mask, filters=filters
             )
-            top_indices = torch.argsort(similarities, descending=True)[:top_k]
-            results = []
-            for idx in top_indices:
-                idx = idx.item()
-                scripture = self.vector_store["scriptures"][idx]
-                score = similarities[idx].item()
-                # Apply filters
-                if scripture_filter and scripture["scripture"] != scripture_filter:
-                    continue
-                if scripture["language"] != language:
-                    continue
-                if score >= settings.MIN_SIMILARITY_SCORE:
-                    results.append({
-                        **scripture,
-                        "score": score
-                    })
-            return results
+            ranked = [(int(idx), float(score), 0.0) for idx, score in zip(top_indices, top_scores)]
+
+        # Best matching passage of each verse (chunk search only)
+        chunk_index = self.vector_store["chunk_index"]
+        if chunk_index is not None and ranked:
+            _, chunk_rows = chunk_index.score_parents(query_embedding, [idx for idx, _, _ in ranked])
         else:
-            # Ensure embeddings are a NumPy array
-            embeddings = self.vector_store["embeddings"]
-            if hasattr(embeddings, "cpu"):
-                try:
-                    embeddings = embeddings.cpu().numpy()
-                except Exception:
-                    pass
-
-            # Normalize and compute cosine similarity with NumPy
-            qe = np.array(query_embedding)
-            # In case embeddings are tensors or lists, ensure numpy array
-            emb = np.array(embeddings)
-
-            # compute cosine similarity
-            emb_norms = np.linalg.norm(emb, axis=1)
-            qe_norm = np.linalg.norm(qe)
-            if qe_norm == 0 or np.any(emb_norms == 0):
-                similarities = np.zeros(len(emb))
+            chunk_rows = [-1] * len(ranked)
+
+        # Retrieve results
+        results = []
+        for (idx, score, lexical_score), chunk_row in zip(ranked, chunk_rows):
+            scripture = self.vector_store["scriptures"][idx]
+
+            # Exact term matches are kept even when the dense score is low
+            if score >= settings.MIN_SIMILARITY_SCORE or lexical_score > 0:
+                result = {
+                    **scripture,
+                    "score": score,
+                    "lexical_score": lexical_score
+                }
+                if chunk_row >= 0:
+                    result["passage"] = chunk_index.passage(scripture, int(chunk_row))
+                results.append(result)
+
+        self.query_cache.set_results(cache_key, results)
+        return results
+
+    async def _hybrid_rank(
+        self,
+        query: str,
+        query_embedding,
+        top_k: int,
+        mask,
+        filters: Optional[Dict] = None
+    ) -> List[tuple]:
+        """
+        Fuse dense and BM25 rankings with reciprocal-rank fusion
+
+        Returns:
+            List of (row index, dense cosine score, BM25 score), best first
+        """
+        pool = max(top_k, settings.HYBRID_CANDIDATES)
+        dense_indices, dense_scores = await self.vector_store["store"].search(
+            query_embedding, pool, mask=mask, filters=filters
+        )
+        lexical_indices, lexical_scores = self.vector_store["lexical_index"].search(query, pool, mask=mask)
+
+        fused, _ = reciprocal_rank_fusion([dense_indices, lexical_indices], k=settings.HYBRID_RRF_K)
+
+        dense = dict(zip(dense_indices.tolist(), dense_scores.tolist()))
+        lexical = dict(zip(lexical_indices.tolist(), lexical_scores.tolist()))
+        top = fused[:top_k].tolist()
+
+        # Lexical-only hits: score them against their embeddings for confidence
+        missing = [idx for idx in top if idx not in dense]
+        if missing:
+            chunk_index = self.vector_store["chunk_index"]
+            if chunk_index is not None:
+                missing_scores, _ = chunk_index.score_parents(query_embedding, missing)
+            else:
+                missing_scores = self.vector_store["embeddings"][missing] @ normalize_vector(query_embedding)
+            dense.update(zip(missing, np.asarray(missing_scores).tolist()))
+
+        return [(idx, float(dense[idx]), float(lexical.get(idx, 0.0))) for idx in top]
+
+    def _needs_refinement(self, query: str) -> bool:
+        """
+        Whether the Gemini query refiner is worth a round trip
+
+        Queries that name concrete terms the BM25 index covers well already
+        retrieve the right verses, so the refiner call is skipped for them.
+        The single-call LLM plan relies on local retrieval (hybrid search and
+        reranking) unless LLM_PLAN_REFINE keeps the refiner.
+        """
+        if settings.LLM_PLAN == "single" and not settings.LLM_PLAN_REFINE:
+            return False
+
+        refiner = get_refiner()
+        if not (refiner and refiner.available):
+            return False
+
+        if settings.HYBRID_SEARCH:
+            strength = self.vector_store["lexical_index"].match_strength(query)
+            if strength >= settings.LEXICAL_SKIP_REFINER_THRESHOLD:
+                logger.info(f"Strong lexical match ({strength:.2f}), skipping query refinement")
+                return False
+
+        return True
+
+    async def _retrieve(self, query: str, language: str) -> List[Dict]:
+        """
+        Retrieve verses for a query, refining it concurrently with search
+
+        The Gemini refiner round trip used to sit in front of retrieval. Now
+        the raw query is searched speculatively while the refiner runs; the
+        refined query's results are then merged with (or replace) the raw
+        results. If refinement plus the refined search miss
+        REFINE_DEADLINE_MS, the raw-query results are used alone.
+        """
+        top_k = settings.RETRIEVAL_TOP_K
+        if not self._needs_refinement(query):
+            return await self.search(query=query, language=language, top_k=top_k)
+
+        if not settings.SPECULATIVE_RETRIEVAL:
+            logger.info("Refining query for better scripture search...")
+            search_query = await get_refiner().refine_query(query, language)
+            logger.info(f"Refined query: '{search_query}'")
+            return await self.search(query=search_query, language=language, top_k=top_k)
+
+        raw_task = asyncio.create_task(self.search(query=query, language=language, top_k=top_k))
+        refined_task = asyncio.create_task(self._refine_and_search(query, language, top_k))
+
+        try:
+            refined_docs = await asyncio.wait_for(refined_task, timeout=settings.REFINE_DEADLINE_MS / 1000)
+        except asyncio.TimeoutError:
+            logger.info(f"Query refinement missed its {settings.REFINE_DEADLINE_MS:.0f}ms deadline, using raw-query results")
+            refined_docs = None
+        except Exception as e:
+            logger.error(f"Refined search failed, using raw-query results: {str(e)}")
+            refined_docs = None
+
+        raw_docs = await raw_task
+        if refined_docs is None:
+            return raw_docs
+        if settings.SPECULATIVE_MERGE == "replace":
+            return refined_docs
+        return merge_results([refined_docs, raw_docs], top_k, k=settings.HYBRID_RRF_K)
+
+    async def _refine_and_search(self, query: str, language: str, top_k: int) -> Optional[List[Dict]]:
+        """Refine the query and search it; None if refinement left the query unchanged"""
+        search_query = await get_refiner().refine_query(query, language)
+        logger.info(f"Refined query: '{search_query}'")
+        if normalize_query(search_query) == normalize_query(query):
+            return None
+        return await self.search(query=search_query, language=language, top_k=top_k)
+
+    async def _rerank(self, query: str, docs: List[Dict]) -> List[Dict]:
+        """Keep the RERANK_TOP_K most relevant retrieved docs for the prompt"""
+        if not settings.RERANK_ENABLED:
+            return docs[:settings.RERANK_TOP_K]
+        return await self.reranker.rerank(query, docs, settings.RERANK_TOP_K)
+
+    def lookup_verses(self, reference: VerseReference, language: str = "en") -> List[Dict]:
+        """
+        Fetch the verses of a reference by direct (chapter, verse) lookup
+
+        Rows in the requested language are preferred; otherwise any language is used.
+        """
+        scriptures = self.vector_store["scriptures"]
+        docs = []
+        for verse in range(reference.start, reference.end + 1):
+            rows = self.vector_store["verse_index"].get((reference.chapter, verse), [])
+            if not rows:
+                continue
+            row = next((i for i in rows if scriptures[i].get("language") == language), rows[0])
+            docs.append({**scriptures[row], "score": 1.0})
+        return docs
+
+    def _match_verse_lookup(self, query: str, language: str) -> List[Dict]:
+        """Verses for a direct reference question ("what is 2.47"), or [] for normal retrieval"""
+        if not settings.VERSE_LOOKUP_ENABLED:
+            return []
+        reference = parse_verse_reference(query)
+        if reference is None:
+            return []
+        docs = self.lookup_verses(reference, language)
+        if docs:
+            logger.info(f"Verse lookup fast path: {reference.chapter}.{reference.start}-{reference.end}")
+        return docs
+
+    def _format_verse_answer(self, docs: List[Dict], language: str) -> str:
+        """Answer a verse lookup from the verse data (and a precomputed explanation if ingested)"""
+        paragraphs = []
+        for doc in docs:
+            reference = f"{doc.get('chapter')}.{doc.get('verse')}"
+            if language == "hi":
+                paragraphs.append(f"भगवद गीता {reference} में कहा गया है:")
             else:
-                similarities = (emb @ qe) / (emb_norms * qe_norm)
+                paragraphs.append(f"In Bhagavad Gita {reference}, the verse reads:")
 
-            # Get top-k indices
-            top_indices = np.argsort(similarities)[::-1][:top_k]
+            if doc.get("sanskrit"):
+                paragraphs.append(doc["sanskrit"])
 
-            # Retrieve results
-            results = []
-            for idx in top_indices:
-                scripture = self.vector_store["scriptures"][idx]
-                score = float(similarities[idx])
+            text = doc.get("meaning") if language == "hi" and doc.get("meaning") else doc.get("text", "")
+            paragraphs.append(f'"{text}"')
 
-                # Apply filters
-                if scripture_filter and scripture["scripture"] != scripture_filter:
-                    continue
-                if scripture["language"] != language:
-                    continue
+            if doc.get("explanation"):
+                paragraphs.append(doc["explanation"])
 
-                if score >= settings.MIN_SIMILARITY_SCORE:
-                    results.append({
-                        **scripture,
-                        "score": score
-                    })
+        return "\n\n".join(paragraphs)
 
-            return results
+    async def _answer_verse_lookup(
+        self,
+        query: str,
+        docs: List[Dict],
+        language: str,
+        conversation_history: Optional[List[Dict]]
+    ) -> str:
+        """Exact verse text, optionally explained by a single LLM call"""
+        if settings.VERSE_LOOKUP_EXPLAIN:
+            llm_service = get_llm_service()
+            if llm_service.available:
+                return await llm_service.generate_response(
+                    query=query,
+                    context_docs=docs,
+                    language=language,
+                    conversation_history=conversation_history
+                )
+        return self._format_verse_answer(docs, language)
+
+    def _build_citations(self, docs: List[Dict]) -> List[Dict]:
+        """Citation dicts for the response"""
+        return [
+            {
+                "reference": doc["reference"],
+                "text": doc["text"],
+                "scripture": doc["scripture"],
+                "chapter": doc["chapter"],
+                "verse": doc["verse"],
+                "score": doc["score"]
+            }
+            for doc in docs
+        ]
+
+    def _cited_docs(self, docs: List[Dict], references: List[str]) -> List[Dict]:
+        """Docs the answer quoted, in citation order; all docs if none of the references match"""
+        by_reference = {f"{doc.get('chapter')}.{doc.get('verse')}": doc for doc in reversed(docs)}
+        cited = [by_reference[reference] for reference in references if reference in by_reference]
+        return cited or docs
+
+    async def _cached_answer(
+        self,
+        query: str,
+        language: str,
+        kind: str,
+        conversation_history: Optional[List[Dict]]
+    ) -> Optional[Dict]:
+        """Answer of a near-identical earlier question, for first-turn queries only"""
+        if not settings.ANSWER_CACHE_ENABLED or conversation_history:
+            return None
+        return self.answer_cache.get(await self._embed_query(query), language, kind)
+
+    async def _cache_answer(
+        self,
+        query: str,
+        language: str,
+        kind: str,
+        answer: str,
+        docs: List[Dict],
+        conversation_history: Optional[List[Dict]],
+        generated: Optional[str] = None,
+        cited_docs: Optional[List[Dict]] = None
+    ):
+        """
+        Cache a finished first-turn answer
+
+        Template answers (Gemini unavailable or failed) are not cached, so a
+        transient LLM error isn't served to similar questions for the TTL.
+
+        Args:
+            generated: Raw LLM output the answer was reformulated from, if different
+            cited_docs: Docs the answer quoted, if only some of docs
+        """
+        if not settings.ANSWER_CACHE_ENABLED or conversation_history or not answer:
+            return
+        llm_service = get_llm_service()
+        if not llm_service.available or llm_service.is_fallback_response(generated or answer, query, docs, language):
+            return
+
+        confidence = min(1.0, np.mean([doc["score"] for doc in docs])) if docs else 0.0
+        self.answer_cache.set(
+            await self._embed_query(query),
+            query=query,
+            language=language,
+            kind=kind,
+            answer=answer,
+            citations=self._build_citations(cited_docs if cited_docs is not None else docs),
+            confidence=float(confidence)
+        )
+
+    def _verse_embedding(self, doc: Dict) -> Optional[np.ndarray]:
+        """Stored unit-length embedding of a verse, or None if it is not in the index"""
+        try:
+            rows = self.vector_store["verse_index"].get((int(doc.get("chapter")), int(doc.get("verse"))), [])
+        except (TypeError, ValueError):
+            return None
+        if not rows:
+            return None
+        scriptures = self.vector_store["scriptures"]
+        row = next((i for i in rows if scriptures[i].get("text") == doc.get("text")), rows[0])
+        return np.asarray(self.vector_store["embeddings"][row], dtype=np.float32)
+
+    def _remember_docs(self, session: Optional[Session], docs: List[Dict]):
+        """Keep the verses of this turn in the session, for reuse in later turns"""
+        if session is None or not docs:
+            return
+        session.remember(docs, [self._verse_embedding(doc) for doc in docs], settings.SESSION_MAX_VERSES)
+
+    async def _with_session_docs(self, session: Optional[Session], query: str, docs: List[Dict]) -> List[Dict]:
+        """
+        Add verses from earlier turns of the session that relate to this query
+
+        Reused verses are ranked among the retrieved ones by score and left
+        to the reranker. With SESSION_SKIP_DISCUSSED, verses already cited
+        in the conversation are dropped (unless nothing else is left).
+        """
+        if session is None or not session.verses:
+            return docs
+
+        related = session.related(await self._embed_query(query), settings.SESSION_REUSE_THRESHOLD)
+        retrieved = {verse_id(doc) for doc in docs}
+        merged = list(docs)
+        for doc in [doc for doc in related if verse_id(doc) not in retrieved][:settings.RERANK_TOP_K]:
+            position = next((i for i, other in enumerate(merged) if other["score"] < doc["score"]), len(merged))
+            merged.insert(position, doc)
+        if len(merged) > len(docs):
+            logger.info(f"Reusing {len(merged) - len(docs)} verses from earlier turns of the session")
+
+        if settings.SESSION_SKIP_DISCUSSED:
+            fresh = [doc for doc in merged if verse_id(doc) not in session.discussed]
+            merged = fresh or merged
+        return merged
+
+    def _end_turn(self, session: Optional[Session], query: str, answer: str):
+        if session is not None and answer:
+            session.add_turn(
+                query, answer,
+                recent_messages=settings.SESSION_RECENT_MESSAGES,
+                summary_max_chars=settings.SESSION_SUMMARY_MAX_CHARS
+            )
+
+    def _coalesce_key(
+        self,
+        query: str,
+        language: str,
+        kind: str,
+        include_citations: bool,
+        conversation_history: Optional[List[Dict]]
+    ) -> Optional[tuple]:
+        """Singleflight key for first-turn queries (None = don't coalesce)"""
+        if not settings.COALESCE_QUERIES or conversation_history:
+            return None
+        return (kind, normalize_query(query), language, include_citations)
 
     async def query(
         self,
         query: str,
         language: str = "en",
         include_citations: bool = True,
-        conversation_history: Optional[List[Dict]] = None
+        conversation_history: Optional[List[Dict]] = None,
+        session_id: Optional[str] = None
     ) -> Dict:
         """
         Process query and generate response with citations using LLM
+
+        The result's "llm" entry reports the LLM calls the request made
+        (count and latency per call) under the configured LLM_PLAN.
+        Concurrent identical first-turn queries are coalesced: only the first
+        computes the answer, so the others report no LLM calls.
+
+        With a session_id the conversation is kept server-side (see
+        rag/sessions.py): its compacted history replaces conversation_history
+        once the session has turns, and verses from earlier turns are reused.
+        Turns of one session run one at a time.
         """
         if not self.initialized:
             raise RuntimeError("Pipeline not initialized")
 
+        session = await self._begin_turn(session_id)
+        try:
+            if session is not None and session.turns:
+                conversation_history = session.history()
+
+            # Identical concurrent first-turn queries share one answer (sessions record their own turn)
+            key = None if session else self._coalesce_key(query, language, "text", include_citations, conversation_history)
+            with llm_trace(settings.LLM_PLAN) as trace:
+                result = dict(await self.inflight.do(
+                    key, lambda: self._answer(query, language, include_citations, conversation_history, session)
+                ))
+            result["llm"] = trace.summary()
+            self._end_turn(session, query, result["answer"])
+            return result
+        finally:
+            if session is not None:
+                session.lock.release()
+
+    async def _begin_turn(self, session_id: Optional[str]) -> Optional[Session]:
+        """Session for a request, locked until its turn is recorded (the caller releases session.lock)"""
+        if not session_id:
+            return None
+        while True:
+            session = await self.sessions.get_or_create_async(session_id)
+            await session.lock.acquire()
+            # The session may have been deleted or evicted while this request waited
+            if await self.sessions.get_or_create_async(session_id) is session:
+                return session
+            session.lock.release()
+
+    async def _answer(
+        self,
+        query: str,
+        language: str,
+        include_citations: bool,
+        conversation_history: Optional[List[Dict]],
+        session: Optional[Session] = None
+    ) -> Dict:
+        """Answer a query: verse lookup, answer cache, then retrieval and the LLM plan"""
         logger.info(f"Processing query: {query[:100]}...")
 
-        # Optionally refine query for better RAG retrieval
-        search_query = query
-        refiner = get_refiner()
-        if refiner and refiner.available:
-            logger.info("Refining query for better scripture search...")
-            search_query = await refiner.refine_query(query, language)
-            logger.info(f"Refined query: '{search_query}'")
+        # Direct verse references skip embedding, search and the LLM chain
+        lookup_docs = self._match_verse_lookup(query, language)
+        if lookup_docs:
+            self._remember_docs(session, lookup_docs)
+            answer = await self._answer_verse_lookup(query, lookup_docs, language, conversation_history)
+            return {
+                "answer": answer,
+                "citations": self._build_citations(lookup_docs) if include_citations else [],
+                "confidence": 1.0
+            }
 
-        # Retrieve relevant passages
-        retrieved_docs = await self.search(
-            query=search_query,
-            language=language,
-            top_k=settings.RETRIEVAL_TOP_K
-        )
+        # Near-identical first-turn questions reuse a cached answer
+        cached = await self._cached_answer(query, language, "text", conversation_history)
+        if cached is not None:
+            self._remember_docs(session, cached["citations"])
+            return {
+                "answer": cached["answer"],
+                "citations": cached["citations"] if include_citations else [],
+                "confidence": cached["confidence"],
+                "cached": True
+            }
+
+        # Retrieve relevant passages (raw-query search runs while the query is refined)
+        retrieved_docs = await self._retrieve(query, language)
+        retrieved_docs = await self._with_session_docs(session, query, retrieved_docs)
+
+        # Cross-encoder rerank: only the best RERANK_TOP_K verses reach the prompt
+        retrieved_docs = await self._rerank(query, retrieved_docs)
+        self._remember_docs(session, retrieved_docs)
 
         # Even if no documents retrieved, we can still have a conversation
         # The LLM will provide empathetic guidance without scripture citations
@@ -411,32 +1019,38 @@ class RAGPipeline:
 
         # Generate response using LLM with retrieved context
         logger.info("Generating response with LLM...")
-        answer = await llm_service.generate_response(
-            query=query,
-            context_docs=retrieved_docs,
-            language=language,
-            conversation_history=conversation_history
-        )
+        if settings.LLM_PLAN == "single":
+            # One call returns the final answer and the verses it quoted
+            answer, references = await llm_service.generate_planned_response(
+                query=query,
+                context_docs=retrieved_docs,
+                language=language,
+                conversation_history=conversation_history
+            )
+            cited_docs = self._cited_docs(retrieved_docs, references)
+        else:
+            answer = await llm_service.generate_response(
+                query=query,
+                context_docs=retrieved_docs,
+                language=language,
+                conversation_history=conversation_history
+            )
+            cited_docs = retrieved_docs
 
         # Extract citations
-        citations = [
-            {
-                "reference": doc["reference"],
-                "text": doc["text"],
-                "scripture": doc["scripture"],
-                "chapter": doc["chapter"],
-                "verse": doc["verse"],
-                "score": doc["score"]
-            }
-            for doc in retrieved_docs
-        ] if include_citations and retrieved_docs else []
+        citations = self._build_citations(cited_docs) if include_citations and cited_docs else []
 
         # Calculate confidence
         if retrieved_docs:
-            avg_score = np.mean([doc["score"] for doc in retrieved_docs])
+            # Summed chunk scores can exceed 1
+            avg_score = min(1.0, np.mean([doc["score"] for doc in retrieved_docs]))
         else:
             avg_score = 0.0
 
+        await self._cache_answer(
+            query, language, "text", answer, retrieved_docs, conversation_history, cited_docs=cited_docs
+        )
+
         return {
             "answer": answer,
             "citations": citations,
@@ -448,31 +1062,77 @@ class RAGPipeline:
         query: str,
         language: str = "en",
         include_citations: bool = True,
-        conversation_history: Optional[List[Dict]] = None
+        conversation_history: Optional[List[Dict]] = None,
+        session_id: Optional[str] = None
     ):
         """
         Process query and generate streaming response with citations using LLM
         Yields chunks of text as they're generated
+
+        With STREAM_MODE "incremental" (and always under the single-call
+        LLM_PLAN) the answer structure is part of the generation prompt and
+        tokens are cleaned and yielded as they arrive. "reformulate" buffers
+        the whole answer for one Gemini reformulation pass and yields it at
+        the end; without a reformatter the answer is paragraph-formatted
+        incrementally instead.
+
+        Concurrent identical first-turn streams share one generation; a
+        stream that joins late replays the chunks sent so far. Sessions work
+        as in query(); the turn is recorded once the stream completes.
         """
         if not self.initialized:
             raise RuntimeError("Pipeline not initialized")
 
+        session = await self._begin_turn(session_id)
+        try:
+            if session is not None and session.turns:
+                conversation_history = session.history()
+
+            # Identical concurrent first-turn streams fan out from one generation
+            key = None if session else self._coalesce_key(query, language, "stream", include_citations, conversation_history)
+            answer = ""
+            with llm_trace(settings.LLM_PLAN):
+                async for chunk in self.inflight.stream(
+                    key, lambda: self._answer_stream(query, language, conversation_history, session)
+                ):
+                    answer += chunk
+                    yield chunk
+            self._end_turn(session, query, answer)
+        finally:
+            if session is not None:
+                session.lock.release()
+
+    async def _answer_stream(
+        self,
+        query: str,
+        language: str,
+        conversation_history: Optional[List[Dict]],
+        session: Optional[Session] = None
+    ):
+        """Streaming counterpart of _answer"""
         logger.info(f"Processing streaming query: {query[:100]}...")
 
-        # Optionally refine query for better RAG retrieval
-        search_query = query
-        refiner = get_refiner()
-        if refiner and refiner.available:
-            logger.info("Refining query for better scripture search...")
-            search_query = await refiner.refine_query(query, language)
-            logger.info(f"Refined query: '{search_query}'")
+        # Direct verse references skip embedding, search and the LLM chain
+        lookup_docs = self._match_verse_lookup(query, language)
+        if lookup_docs:
+            self._remember_docs(session, lookup_docs)
+            yield await self._answer_verse_lookup(query, lookup_docs, language, conversation_history)
+            return
 
-        # Retrieve relevant passages
-        retrieved_docs = await self.search(
-            query=search_query,
-            language=language,
-            top_k=settings.RETRIEVAL_TOP_K
-        )
+        # Near-identical first-turn questions reuse a cached answer
+        cached = await self._cached_answer(query, language, "stream", conversation_history)
+        if cached is not None:
+            self._remember_docs(session, cached["citations"])
+            yield cached["answer"]
+            return
+
+        # Retrieve relevant passages (raw-query search runs while the query is refined)
+        retrieved_docs = await self._retrieve(query, language)
+        retrieved_docs = await self._with_session_docs(session, query, retrieved_docs)
+
+        # Cross-encoder rerank: only the best RERANK_TOP_K verses reach the prompt
+        retrieved_docs = await self._rerank(query, retrieved_docs)
+        self._remember_docs(session, retrieved_docs)
 
         # Even if no documents retrieved in streaming, continue conversation
         if not retrieved_docs:
@@ -484,6 +1144,70 @@ class RAGPipeline:
         # Generate streaming response using LLM with retrieved context
         logger.info("Generating streaming response with LLM...")
 
+        single_call = settings.LLM_PLAN == "single"
+        if single_call or settings.STREAM_MODE == "incremental":
+            # The single-call plan also asks for a CITATIONS line, stripped before formatting
+            trailer = CitationTrailer() if single_call else None
+            formatter = StreamFormatter()
+            full_response = ""
+            answer = ""
+            async for chunk in llm_service.generate_response_stream(
+                query=query,
+                context_docs=retrieved_docs,
+                language=language,
+                conversation_history=conversation_history,
+                structured=True,
+                cite=single_call
+            ):
+                full_response += chunk
+                text = formatter.feed(trailer.feed(chunk) if trailer else chunk)
+                if text:
+                    answer += text
+                    yield text
+
+            tail = formatter.feed(trailer.flush()) if trailer else ""
+            tail += formatter.flush()
+            if tail:
+                answer += tail
+                yield tail
+
+            await self._cache_answer(
+                query, language, "stream", answer, retrieved_docs, conversation_history,
+                generated=full_response,
+                cited_docs=self._cited_docs(retrieved_docs, trailer.references) if trailer else None
+            )
+            return
+
+        reformatter = get_reformatter(settings.GEMINI_API_KEY)
+        if not (reformatter and reformatter.available):
+            # No reformulation pass: paragraph-format the stream as it arrives
+            logger.error("❌ Reformatter NOT available! Using fallback")
+            formatter = StreamingParagraphFormatter()
+            full_response = ""
+            answer = ""
+            async for chunk in llm_service.generate_response_stream(
+                query=query,
+                context_docs=retrieved_docs,
+                language=language,
+                conversation_history=conversation_history
+            ):
+                full_response += chunk
+                text = formatter.feed(chunk)
+                if text:
+                    answer += text
+                    yield text
+
+            tail = formatter.flush()
+            if tail:
+                answer += tail
+                yield tail
+
+            await self._cache_answer(
+                query, language, "stream", answer, retrieved_docs, conversation_history,
+                generated=full_response
+            )
+            return
+
         # Collect the full response first
         full_response = ""
         async for chunk in llm_service.generate_response_stream(
@@ -496,27 +1220,25 @@ class RAGPipeline:
 
         # Use Gemini reformatter to completely rebuild the response
         logger.info(f"Reformulating response. Original: {len(full_response)} chars, Docs retrieved: {len(retrieved_docs)}")
-        reformatter = get_reformatter(settings.GEMINI_API_KEY)
 
-        if reformatter and reformatter.available:
-            # Build context string for reformatter
-            context_verses = self._build_verse_context(retrieved_docs)
-            logger.info(f"Context verses built: {context_verses[:300]}...")
+        # Build context string for reformatter
+        context_verses = self._build_verse_context(retrieved_docs)
+        logger.info(f"Context verses built: {context_verses[:300]}...")
 
-            # Reformulate using Gemini
-            reformulated_response = await reformatter.reformulate_response(
-                original_response=full_response,
-                user_query=query,
-                context_verses=context_verses
-            )
-            logger.info(f"✅ Reformulated! Length: {len(reformulated_response)} chars")
+        # Reformulate using Gemini
+        reformulated_response = await reformatter.reformulate_response(
+            original_response=full_response,
+            user_query=query,
+            context_verses=context_verses
+        )
+        logger.info(f"✅ Reformulated! Length: {len(reformulated_response)} chars")
 
-            yield reformulated_response
-        else:
-            # Fallback to simple formatting if reformatter not available
-            logger.error("❌ Reformatter NOT available! Using fallback")
-            formatted_response = ensure_paragraph_breaks(full_response)
-            yield formatted_response
+        yield reformulated_response
+
+        await self._cache_answer(
+            query, language, "stream", reformulated_response, retrieved_docs, conversation_history,
+            generated=full_response
+        )
 
     def _build_verse_context(self, docs: List[Dict]) -> str:
         """
@@ -532,11 +1254,14 @@ class RAGPipeline:
             return "No specific verses available."
 
         verses = []
-        for i, doc in enumerate(docs[:3], 1):  # Top 3 verses
+        for i, doc in enumerate(docs[:settings.RERANK_TOP_K], 1):
             verse_text = f"""Verse {i}:
 - Reference: {doc.get('scripture', 'Bhagavad Gita')} Chapter {doc.get('chapter', '?')}, Verse {doc.get('verse', '?')}
 - Text: "{doc.get('text', '')}"
 - Topic: {doc.get('topic', 'General wisdom')}"""
+            passage = doc.get('passage')
+            if passage and passage['field'] != 'text':
+                verse_text += f"\n- Relevant passage ({passage['field']}): \"{passage['text']}\""
             verses.append(verse_text)
 
         return "\n\n".join(verses)
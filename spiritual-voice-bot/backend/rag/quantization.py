@@ -0,0 +1,208 @@
+"""
+Quantized embedding codes with exact float rerank
+
+Two code formats are written at ingest time next to the float embeddings:
+- int8: per-row symmetric scalar quantization (4x smaller than float32)
+- binary: sign bits packed 8 per byte (32x smaller), compared by Hamming distance
+
+Search is two-stage: the codes shortlist rerank_factor * top_k candidates,
+then only those rows of the (memory-mapped) float matrix are scored exactly.
+"""
+import logging
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from rag.similarity import normalize_vector, top_k_indices
+from rag.store import replace_atomic
+
+logger = logging.getLogger(__name__)
+
+INT8_CODES_FILE = "codes_int8.npy"
+INT8_SCALES_FILE = "scales_int8.npy"
+BINARY_CODES_FILE = "codes_binary.npy"
+
+QUANTIZATION_MODES = ("int8", "binary")
+
+# Rows decoded per int8 scoring step, bounds the temporary float32 buffer
+_SCORE_CHUNK = 16384
+
+# Set bits per byte value, for Hamming distance on numpy versions without bitwise_count
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric per-row int8 quantization
+
+    Returns:
+        Tuple of (int8 codes, float32 per-row scales) with row ~= codes * scale
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def binarize(matrix: np.ndarray) -> np.ndarray:
+    """Pack the sign bits of every row into uint8 codes"""
+    return np.packbits(np.asarray(matrix) > 0, axis=-1)
+
+
+def hamming_distances(codes: np.ndarray, query_code: np.ndarray) -> np.ndarray:
+    """Hamming distance between every packed code row and a packed query"""
+    xor = np.bitwise_xor(codes, query_code)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[xor].sum(axis=1, dtype=np.int32)
+
+
+def quantized_exists(index_dir: Path, mode: str, prefix: str = "") -> bool:
+    """Check whether codes for the given mode have been written to index_dir (prefix: file name prefix)"""
+    index_dir = Path(index_dir)
+    if mode == "int8":
+        return (
+            (index_dir / f"{prefix}{INT8_CODES_FILE}").exists()
+            and (index_dir / f"{prefix}{INT8_SCALES_FILE}").exists()
+        )
+    if mode == "binary":
+        return (index_dir / f"{prefix}{BINARY_CODES_FILE}").exists()
+    return False
+
+
+def save_quantized(index_dir: Path, matrix: np.ndarray, prefix: str = ""):
+    """Write int8 and binary codes for a normalized corpus matrix (each file renamed into place)"""
+    index_dir = Path(index_dir)
+    codes, scales = quantize_int8(matrix)
+    binary = binarize(matrix)
+    for name, array in ((INT8_CODES_FILE, codes), (INT8_SCALES_FILE, scales), (BINARY_CODES_FILE, binary)):
+        replace_atomic(index_dir / f"{prefix}{name}", lambda f, array=array: np.save(f, array))
+    logger.info(f"Saved int8 and binary codes for {matrix.shape[0]} rows to {index_dir}")
+
+
+class QuantizedIndex:
+    """
+    Two-stage search: quantized prefilter, then exact float rerank
+    """
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        mode: str,
+        codes: np.ndarray,
+        scales: Optional[np.ndarray] = None,
+        rerank_factor: int = 10
+    ):
+        """
+        Args:
+            matrix: (N, d) normalized float32 corpus matrix, typically memory-mapped
+            mode: "int8" or "binary"
+            codes: int8 codes (N, d) or packed binary codes (N, d / 8)
+            scales: Per-row scales for int8 codes
+            rerank_factor: Candidates kept per requested result for the rerank
+        """
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode '{mode}', expected one of {QUANTIZATION_MODES}")
+        if mode == "int8" and scales is None:
+            raise ValueError("int8 quantization requires per-row scales")
+
+        self.matrix = matrix
+        self.mode = mode
+        self.codes = codes
+        self.scales = scales
+        self.rerank_factor = max(1, rerank_factor)
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, mode: str, rerank_factor: int = 10) -> "QuantizedIndex":
+        """Quantize an in-memory normalized matrix"""
+        if mode == "int8":
+            codes, scales = quantize_int8(matrix)
+            return cls(matrix, mode, codes, scales, rerank_factor)
+        return cls(matrix, mode, binarize(matrix), rerank_factor=rerank_factor)
+
+    @classmethod
+    def load(
+        cls,
+        index_dir: Path,
+        matrix: np.ndarray,
+        mode: str,
+        rerank_factor: int = 10,
+        prefix: str = ""
+    ) -> "QuantizedIndex":
+        """
+        Memory-map codes written by save_quantized
+
+        Raises:
+            ValueError: Codes or scales don't cover the corpus rows and dimension
+                (left over from another build)
+        """
+        index_dir = Path(index_dir)
+        if mode == "int8":
+            codes = np.load(index_dir / f"{prefix}{INT8_CODES_FILE}", mmap_mode="r")
+            scales = np.load(index_dir / f"{prefix}{INT8_SCALES_FILE}")
+        else:
+            codes = np.load(index_dir / f"{prefix}{BINARY_CODES_FILE}", mmap_mode="r")
+            scales = None
+
+        n, dim = matrix.shape
+        width = dim if mode == "int8" else (dim + 7) // 8
+        if codes.ndim != 2 or codes.shape != (n, width):
+            raise ValueError(f"{mode} codes have shape {codes.shape} but corpus needs {(n, width)}")
+        if scales is not None and scales.shape != (n,):
+            raise ValueError(f"int8 scales cover {scales.shape[0]} rows but corpus has {n}")
+        return cls(matrix, mode, codes, scales, rerank_factor)
+
+    def _prefilter_scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Approximate scores (higher is better) for all rows or the given row ids"""
+        codes = self.codes if rows is None else self.codes[rows]
+
+        if self.mode == "binary":
+            return -hamming_distances(codes, binarize(query))
+
+        scales = self.scales if rows is None else self.scales[rows]
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], _SCORE_CHUNK):
+            chunk = codes[start:start + _SCORE_CHUNK]
+            scores[start:start + len(chunk)] = chunk.astype(np.float32) @ query
+        return scores * scales
+
+    def search(
+        self,
+        query,
+        top_k: int,
+        mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the top_k most similar corpus rows
+
+        Args:
+            query: Query embedding
+            top_k: Number of results
+            mask: Optional boolean filter mask over corpus rows
+
+        Returns:
+            Tuple of (indices, exact cosine scores), best first
+        """
+        query = normalize_vector(query)
+        rows = None if mask is None else np.flatnonzero(mask)
+        if rows is not None and len(rows) == 0:
+            return rows, np.empty(0, dtype=np.float32)
+
+        approx = self._prefilter_scores(query, rows)
+        shortlist = top_k_indices(approx, top_k * self.rerank_factor)
+        candidates = shortlist if rows is None else rows[shortlist]
+
+        # Exact rerank touches only the shortlisted float rows (sorted for sequential mmap reads)
+        candidates = np.sort(candidates)
+        scores = np.asarray(self.matrix[candidates], dtype=np.float32) @ query
+        best = top_k_indices(scores, top_k)
+        return candidates[best], scores[best]
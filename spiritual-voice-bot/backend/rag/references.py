@@ -0,0 +1,120 @@
+"""
+Verse reference parsing and direct (chapter, verse) lookup
+
+Questions like "what is 2.47", "BG 18.66", "chapter 6 verse 35", "२.४७" or
+"2.47-50" name the verse they want, so they can be answered from an O(1)
+index instead of embedding search and several LLM round trips.
+
+A bare "N.M" / "N:M" is also how people write times and version numbers, so
+it only counts as a reference next to a cue word ("verse", "gita", "BG",
+...) or when nothing but lookup words surrounds it, and never before "am"/"pm".
+"""
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Longest range served by one lookup ("2.1-72" would dump a whole chapter)
+MAX_RANGE = 20
+
+_DEVANAGARI_DIGITS = str.maketrans("०१२३४५६७८९", "0123456789")
+
+_RANGE = r"(?:\s*(?:-|–|to)\s*(\d{1,3}))?"
+
+_PATTERNS = [
+    # "chapter 6 verse 35", "ch 6, verse 35-36", "chapter 2 shloka 47"
+    re.compile(
+        r"\b(?:chapter|ch\.?|adhyaya)\s*(\d{1,2})\s*[,:]?\s*(?:verse|shloka|sloka|text|v\.?)\s*(\d{1,3})" + _RANGE,
+        re.IGNORECASE
+    ),
+    # "अध्याय 2 श्लोक 47"
+    re.compile(r"अध्याय\s*(\d{1,2})\s*[,:]?\s*श्लोक\s*(\d{1,3})" + _RANGE),
+    # "2.47", "BG 18.66", "gita 2:47", "2.47-50"
+    re.compile(r"(?<![\d.])(\d{1,2})\s*[.:]\s*(\d{1,3})(?![\d.]\d)" + _RANGE),
+]
+
+# Index of the bare "2.47" pattern, which needs a cue word or a plain lookup question
+_BARE_PATTERN = 2
+
+# Words that mark a number pair as a scripture reference
+_CUE_WORDS = {
+    "verse", "verses", "shloka", "sloka", "bg", "bhagavad", "bhagwad", "gita", "geeta", "chapter",
+    "श्लोक", "अध्याय", "गीता", "भगवद"
+}
+
+# "5:30 am", "7.15 p.m.", "6:00 o'clock" are times, not verses
+_TIME_SUFFIX = re.compile(r"\s*(?:[ap]\.?m\.?|o'?clock|hrs|hours)", re.IGNORECASE)
+
+# Words that can accompany a reference without changing what is being asked
+_LOOKUP_WORDS = {
+    "what", "whats", "is", "are", "the", "of", "in", "show", "me", "tell", "about", "explain",
+    "meaning", "mean", "means", "verse", "verses", "shloka", "sloka", "bg", "bhagavad", "bhagwad",
+    "gita", "geeta", "read", "give", "please", "chapter", "say", "says", "does", "श्लोक", "अध्याय",
+    "गीता", "भगवद", "क्या", "है", "का", "अर्थ", "बताइए", "बताओ"
+}
+
+_WORD = re.compile(r"[\w\u0900-\u097F]+")
+
+
+class VerseReference(NamedTuple):
+    """Inclusive verse range within one chapter"""
+    chapter: int
+    start: int
+    end: int
+
+
+def parse_verse_reference(query: str, max_extra_words: int = 2) -> Optional[VerseReference]:
+    """
+    Parse a verse lookup question
+
+    Only queries that are essentially a reference ("what is 2.47") match; a
+    reference inside a longer personal question is left to normal retrieval.
+    A bare number pair with other words around it needs a cue word ("verse",
+    "gita", "BG", ...), so "give me 5:30 am routine" isn't a lookup.
+
+    Args:
+        query: User question
+        max_extra_words: Words allowed besides the reference and lookup words
+
+    Returns:
+        VerseReference, or None if the query isn't a verse lookup
+    """
+    text = query.translate(_DEVANAGARI_DIGITS)
+
+    for i, pattern in enumerate(_PATTERNS):
+        match = pattern.search(text)
+        if not match:
+            continue
+        if i == _BARE_PATTERN and _TIME_SUFFIX.match(text, match.end()):
+            return None
+
+        chapter, start = int(match.group(1)), int(match.group(2))
+        end = int(match.group(3)) if match.group(3) else start
+        if not 1 <= chapter <= 18 or start < 1 or end < start or end - start >= MAX_RANGE:
+            return None
+
+        rest = _WORD.findall((text[:match.start()] + " " + text[match.end():]).lower())
+        extra = [w for w in rest if w not in _LOOKUP_WORDS]
+        if len(extra) > max_extra_words:
+            return None
+        if i == _BARE_PATTERN and extra and not _CUE_WORDS.intersection(rest):
+            return None
+
+        return VerseReference(chapter, start, end)
+
+    return None
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def build_verse_index(scriptures: List[Dict]) -> Dict[Tuple[int, int], List[int]]:
+    """Map (chapter, verse) to the row indices of that verse (one per language)"""
+    index: Dict[Tuple[int, int], List[int]] = {}
+    for i, scripture in enumerate(scriptures):
+        chapter, verse = _to_int(scripture.get("chapter")), _to_int(scripture.get("verse"))
+        if chapter is not None and verse is not None:
+            index.setdefault((chapter, verse), []).append(i)
+    return index
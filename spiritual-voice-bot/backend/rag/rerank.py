@@ -0,0 +1,99 @@
+"""
+Cross-encoder rerank stage for retrieved verses
+
+Retrieval casts a wide net (RETRIEVAL_TOP_K); a local cross-encoder scores
+every (query, verse) pair in one batched forward pass on a worker thread and
+only the best RERANK_TOP_K verses reach the LLM prompt. Pair scores are cached
+by content hash, so repeated questions skip the forward pass.
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+from loader import LazyModule
+from rag.cache import LRUCache, model_text_key
+
+logger = logging.getLogger(__name__)
+
+sentence_transformers = LazyModule("sentence_transformers", "sentence-transformers")
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class Reranker:
+    """
+    Batched cross-encoder reranker with a pair-score cache
+    """
+
+    def __init__(self, model_name: str, cache_max_bytes: int = 4 * 1024 * 1024, model=None):
+        """
+        Args:
+            model_name: Cross-encoder model to load
+            cache_max_bytes: Memory budget for cached pair scores
+            model: Already loaded model with predict(pairs) (mainly for tests)
+        """
+        self.model_name = model_name
+        self.model = model
+        self.cache = LRUCache(cache_max_bytes, name="rerank")
+
+    @property
+    def available(self) -> bool:
+        return self.model is not None
+
+    def load(self):
+        """Load the cross-encoder (blocking; call from a worker thread or at startup)"""
+        if self.model is not None:
+            return
+        if not sentence_transformers.available:
+            logger.warning("sentence-transformers CrossEncoder not installed; reranking keeps retrieval order")
+            return
+        try:
+            logger.info(f"Loading rerank model: {self.model_name}")
+            self.model = sentence_transformers.CrossEncoder(self.model_name)
+        except Exception as e:
+            logger.error(f"Failed to load rerank model, keeping retrieval order: {str(e)}")
+
+    async def rerank(self, query: str, docs: List[Dict], top_k: int) -> List[Dict]:
+        """
+        Reorder docs by cross-encoder relevance and keep the best top_k
+
+        Args:
+            query: The user's question
+            docs: Retrieved verse dicts, best first by retrieval score
+            top_k: Number of docs to keep
+
+        Returns:
+            Up to top_k docs with a "rerank_score", best first (retrieval order
+            when no model is available)
+        """
+        if not docs:
+            return []
+        if not self.available or len(docs) == 1:
+            return docs[:top_k]
+
+        query_hash = _digest(model_text_key(query))
+        keys = [(query_hash, _digest(f"{doc.get('reference', '')}\x00{doc.get('text', '')}")) for doc in docs]
+
+        scores: List[Optional[float]] = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+
+        if missing:
+            pairs = [(query, docs[i].get("text", "")) for i in missing]
+            try:
+                predicted = await asyncio.to_thread(self.model.predict, pairs, batch_size=len(pairs))
+            except Exception as e:
+                logger.error(f"Reranking failed, keeping retrieval order: {str(e)}")
+                return docs[:top_k]
+
+            for i, score in zip(missing, predicted):
+                scores[i] = float(score)
+                self.cache.set(keys[i], scores[i])
+
+        order = sorted(range(len(docs)), key=lambda i: scores[i], reverse=True)
+        return [{**docs[i], "rerank_score": scores[i]} for i in order[:top_k]]
+
+    def get_stats(self) -> Dict:
+        return self.cache.get_stats()
@@ -0,0 +1,384 @@
+"""
+Server-side conversation sessions
+
+Clients used to resend the whole conversation_history with every query.
+With a session_id the server keeps the conversation instead:
+- the most recent messages verbatim; older turns are compacted into a
+  rolling summary, so the history part of the prompt stays bounded
+- the verses retrieved in earlier turns, with their embeddings, so a
+  follow-up question can reuse them without searching again
+- the verses already cited, so retrieval can skip them (optional)
+
+Sessions live in memory (LRU, TTL). With a SQLite path, sessions evicted
+from memory and all sessions at shutdown are written to the database and
+loaded back on their next request, also across restarts. Requests use the
+async methods, which run the database reads and writes on worker threads.
+
+Turns of one session are serialized with its lock, so concurrent requests
+on a session_id don't mix up each other's retrieved verses and history.
+"""
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from rag.similarity import normalize_vector
+
+logger = logging.getLogger(__name__)
+
+# Characters of a user message kept in the summary
+SUMMARY_MESSAGE_CHARS = 160
+
+_SENTENCE_END = re.compile(r'(?<=[.!?।])\s')
+
+
+def verse_id(doc: Dict) -> str:
+    """Session key of a verse ("chapter.verse")"""
+    return f"{doc.get('chapter')}.{doc.get('verse')}"
+
+
+def _first_sentence(text: str, max_chars: int = SUMMARY_MESSAGE_CHARS) -> str:
+    text = " ".join(text.split())
+    sentence = _SENTENCE_END.split(text, maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars - 3].rstrip() + "..."
+
+
+class Session:
+    """
+    One conversation: recent messages, rolling summary and remembered verses
+    """
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.messages: List[Dict] = []
+        self.summary: List[str] = []
+        # Verse id -> (doc, unit-length embedding or None), least recently retrieved first
+        self.verses: "OrderedDict[str, tuple]" = OrderedDict()
+        self.discussed: List[str] = []
+        # Verses retrieved for the turn in progress
+        self.turn_verses: List[str] = []
+        self.turns = 0
+        self.updated = time.time()
+        # Held for a whole turn (see RAGPipeline.query)
+        self.lock = asyncio.Lock()
+
+    def history(self) -> List[Dict]:
+        """
+        Conversation history for the prompt: the rolling summary (role
+        "summary") followed by the recent messages
+        """
+        history = [{"role": "summary", "content": " ".join(self.summary)}] if self.summary else []
+        return history + list(self.messages)
+
+    def add_turn(self, query: str, answer: str, recent_messages: int = 6, summary_max_chars: int = 1200):
+        """
+        Record a question and its answer, compacting the oldest turns
+
+        Verses retrieved for this turn that the answer mentions count as discussed.
+
+        Args:
+            query: User's question
+            answer: Answer sent back
+            recent_messages: Messages kept verbatim
+            summary_max_chars: Rolling summary length; the oldest lines are dropped beyond it
+        """
+        cited = [key for key in self.turn_verses if re.search(rf'(?<![\d.]){re.escape(key)}(?!\d)', answer)]
+        self.turn_verses = []
+        self.messages.append({"role": "user", "content": query})
+        self.messages.append({"role": "assistant", "content": answer, "verses": cited})
+        for key in cited:
+            if key not in self.discussed:
+                self.discussed.append(key)
+        self.turns += 1
+        self.updated = time.time()
+
+        while len(self.messages) > recent_messages:
+            old = self.messages.pop(0)
+            if old["role"] == "user":
+                self.summary.append(f"The user said: \"{_first_sentence(old['content'])}\"")
+            elif old.get("verses"):
+                self.summary.append(f"You discussed Bhagavad Gita {', '.join(old['verses'])}.")
+        while self.summary and len(" ".join(self.summary)) > summary_max_chars:
+            self.summary.pop(0)
+
+    def remember(self, docs: List[Dict], embeddings: List[Optional[np.ndarray]], max_verses: int = 20):
+        """Keep the verses retrieved for this turn (and their embeddings) for later turns"""
+        for doc, embedding in zip(docs, embeddings):
+            key = verse_id(doc)
+            if key not in self.turn_verses:
+                self.turn_verses.append(key)
+            self.verses.pop(key, None)
+            self.verses[key] = (doc, embedding)
+        while len(self.verses) > max_verses:
+            self.verses.popitem(last=False)
+
+    def related(self, query_embedding: np.ndarray, threshold: float) -> List[Dict]:
+        """Remembered verses similar to a new query, scored by cosine similarity"""
+        query_embedding = normalize_vector(np.asarray(query_embedding, dtype=np.float32))
+        related = []
+        for doc, embedding in self.verses.values():
+            if embedding is None:
+                continue
+            score = float(embedding @ query_embedding)
+            if score >= threshold:
+                related.append({**doc, "score": score, "lexical_score": 0.0})
+        return sorted(related, key=lambda doc: doc["score"], reverse=True)
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "messages": self.messages,
+            "summary": self.summary,
+            "verses": [
+                [key, doc, embedding.tolist() if embedding is not None else None]
+                for key, (doc, embedding) in self.verses.items()
+            ],
+            "discussed": self.discussed,
+            "turns": self.turns,
+            "updated": self.updated
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Session":
+        session = cls(data["id"])
+        session.messages = data["messages"]
+        session.summary = data["summary"]
+        for key, doc, embedding in data["verses"]:
+            session.verses[key] = (doc, np.asarray(embedding, dtype=np.float32) if embedding is not None else None)
+        session.discussed = data["discussed"]
+        session.turns = data["turns"]
+        session.updated = data["updated"]
+        return session
+
+
+class SessionStore:
+    """
+    In-memory LRU of sessions with TTL expiry and an optional SQLite spill
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: Optional[float] = 86400.0, path: Optional[str] = None):
+        """
+        Initialize the store
+
+        Args:
+            max_sessions: Sessions kept in memory; least recently used ones spill (or are dropped)
+            ttl_seconds: Sessions idle longer than this expire (None = no expiry)
+            path: Optional SQLite database for spilled sessions
+        """
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.path = Path(path) if path else None
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        # Evicted sessions until their spill is written, so a request can't restore a stale row
+        self._spilling: Dict[str, Session] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        # The connection is shared by the worker threads of the async methods
+        self._db_lock = threading.Lock()
+
+        # Stats
+        self.created = 0
+        self.spilled = 0
+        self.restored = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Database connection (opened on first use); callers hold _db_lock"""
+        if self.path is None:
+            return None
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+        return self._db
+
+    def _expired(self, session: Session, now: float) -> bool:
+        return self.ttl_seconds is not None and now - session.updated > self.ttl_seconds
+
+    def _spill(self, sessions: List[Session]):
+        """Write sessions to the database (blocking)"""
+        rows = [
+            (session.id, json.dumps(session.to_dict(), ensure_ascii=False), session.updated)
+            for session in sessions
+        ]
+        with self._db_lock:
+            db = self._connect()
+            if db is None:
+                return
+            with db:
+                db.executemany("INSERT OR REPLACE INTO sessions (id, data, updated) VALUES (?, ?, ?)", rows)
+        self.spilled += len(rows)
+
+    def _restore(self, session_id: str) -> Optional[Session]:
+        """Read a session from the database (blocking)"""
+        with self._db_lock:
+            db = self._connect()
+            if db is None:
+                return None
+            row = db.execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        self.restored += 1
+        return Session.from_dict(json.loads(row[0]))
+
+    def _delete_row(self, session_id: str) -> bool:
+        """Delete a session from the database (blocking); returns whether it was there"""
+        with self._db_lock:
+            db = self._connect()
+            if db is None:
+                return False
+            with db:
+                return db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+
+    def _cached(self, session_id: str) -> Optional[Session]:
+        """Session in memory (or still being spilled)"""
+        return self._sessions.get(session_id) or self._spilling.get(session_id)
+
+    def _restored(self, session: Optional[Session], error: Optional[Exception], session_id: str) -> Optional[Session]:
+        """Log a failed restore; a restore that lost the race to a new session yields to it"""
+        if error is not None:
+            logger.error(f"Failed to restore session {session_id}: {str(error)}")
+        return self._cached(session_id) or session
+
+    def _checked(self, session: Optional[Session]) -> Optional[Session]:
+        """Session marked most recently used; None (and forgotten in memory) if expired"""
+        if session is None:
+            return None
+        if self._expired(session, time.time()):
+            self.expired += 1
+            self._sessions.pop(session.id, None)
+            return None
+        return session
+
+    def _put(self, session: Session) -> List[Session]:
+        """Mark a session most recently used; returns the sessions evicted to make room"""
+        self._sessions.pop(session.id, None)
+        self._sessions[session.id] = session
+        evicted = []
+        while len(self._sessions) > self.max_sessions:
+            evicted.append(self._sessions.popitem(last=False)[1])
+        return [session for session in evicted if self.path is not None]
+
+    def _write_evicted(self, evicted: List[Session]):
+        """Spill evicted sessions (blocking)"""
+        try:
+            self._spill(evicted)
+        except Exception as e:
+            logger.error(f"Failed to spill {len(evicted)} sessions: {str(e)}")
+
+    def _written(self, evicted: List[Session]):
+        for session in evicted:
+            if self._spilling.get(session.id) is session:
+                del self._spilling[session.id]
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Session by id, from memory or the database; None if unknown or expired (blocking)"""
+        session, error = self._cached(session_id), None
+        if session is None:
+            try:
+                session = self._restore(session_id)
+            except Exception as e:
+                error = e
+        session = self._restored(session, error, session_id)
+        if self._checked(session) is None:
+            if session is not None:
+                self.delete(session_id)
+            return None
+        evicted = self._evict_for(session)
+        self._write_evicted(evicted)
+        self._written(evicted)
+        return session
+
+    def get_or_create(self, session_id: str) -> Session:
+        """Session by id, created if unknown or expired (blocking)"""
+        session = self.get(session_id)
+        if session is None:
+            session = self._create(session_id)
+            evicted = self._evict_for(session)
+            self._write_evicted(evicted)
+            self._written(evicted)
+        return session
+
+    async def get_or_create_async(self, session_id: str) -> Session:
+        """get_or_create with the database reads and writes on a worker thread"""
+        session, error = self._cached(session_id), None
+        if session is None and self.path is not None:
+            try:
+                session = await asyncio.to_thread(self._restore, session_id)
+            except Exception as e:
+                error = e
+        session = self._restored(session, error, session_id)
+        if session is not None and self._checked(session) is None:
+            await self.delete_async(session_id)
+            session = None
+        if session is None:
+            session = self._create(session_id)
+
+        evicted = self._evict_for(session)
+        if evicted:
+            await asyncio.to_thread(self._write_evicted, evicted)
+            self._written(evicted)
+        return session
+
+    def _create(self, session_id: str) -> Session:
+        session = Session(session_id)
+        self.created += 1
+        return session
+
+    def _evict_for(self, session: Session) -> List[Session]:
+        """Put a session in memory; evicted sessions stay readable until written"""
+        evicted = self._put(session)
+        for old in evicted:
+            self._spilling[old.id] = old
+        return evicted
+
+    def delete(self, session_id: str) -> bool:
+        """Forget a session; returns whether it existed (blocking)"""
+        existed = self._forget(session_id)
+        return self._delete_row(session_id) or existed
+
+    async def delete_async(self, session_id: str) -> bool:
+        """delete with the database write on a worker thread"""
+        existed = self._forget(session_id)
+        if self.path is None:
+            return existed
+        return await asyncio.to_thread(self._delete_row, session_id) or existed
+
+    def _forget(self, session_id: str) -> bool:
+        existed = self._sessions.pop(session_id, None) is not None
+        return self._spilling.pop(session_id, None) is not None or existed
+
+    def close(self):
+        """Write all in-memory sessions to the database (if any) and close it"""
+        if self.path is None:
+            return
+        now = time.time()
+        self._spill([session for session in self._sessions.values() if not self._expired(session, now)])
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+        logger.info(f"Saved {len(self._sessions)} sessions to {self.path}")
+
+    def get_stats(self) -> Dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "created": self.created,
+            "spilled": self.spilled,
+            "restored": self.restored,
+            "expired": self.expired,
+            "db_path": str(self.path) if self.path else None
+        }
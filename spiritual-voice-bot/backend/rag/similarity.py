@@ -0,0 +1,126 @@
+"""
+Cosine similarity kernel for scripture retrieval
+
+The corpus is L2-normalized and stored as a contiguous float32 matrix once,
+so every query costs a single matrix-vector product plus an argpartition top-k.
+"""
+import numpy as np
+from typing import Optional, Tuple
+
+
+def _to_numpy(array) -> np.ndarray:
+    """Convert lists, numpy arrays or torch tensors to a numpy array"""
+    if hasattr(array, "detach"):
+        array = array.detach()
+    if hasattr(array, "cpu"):
+        array = array.cpu().numpy()
+    return np.asarray(array)
+
+
+def normalize_rows(matrix) -> np.ndarray:
+    """
+    L2-normalize every row of an embedding matrix
+
+    Args:
+        matrix: (N, d) embeddings as list, numpy array or torch tensor
+
+    Returns:
+        Contiguous float32 matrix with unit-length rows (zero rows stay zero)
+    """
+    matrix = np.array(_to_numpy(matrix), dtype=np.float32, order="C")
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1) if matrix.size else matrix.reshape(0, 0)
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def normalize_vector(vector) -> np.ndarray:
+    """L2-normalize a single query vector as float32 (zero vector stays zero)"""
+    vector = np.asarray(_to_numpy(vector), dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return vector
+    return vector / norm
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first
+
+    Uses argpartition so only the k selected entries are sorted.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class SimilarityIndex:
+    """
+    Exact cosine similarity index over a pre-normalized float32 matrix
+    """
+
+    def __init__(self, embeddings, normalized: bool = False):
+        """
+        Build the index
+
+        Args:
+            embeddings: (N, d) corpus embeddings in any array-like format
+            normalized: Rows are already unit-length float32 (e.g. a memory-mapped
+                index), so use them as-is without copying
+        """
+        if normalized:
+            self.matrix = np.asarray(embeddings, dtype=np.float32)
+        else:
+            self.matrix = normalize_rows(embeddings)
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self) -> int:
+        """Embedding dimension"""
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def scores(self, query) -> np.ndarray:
+        """Cosine similarity of the query against every corpus row"""
+        if len(self) == 0:
+            return np.empty(0, dtype=np.float32)
+        return self.matrix @ normalize_vector(query)
+
+    def search(
+        self,
+        query,
+        top_k: int,
+        mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the top_k most similar corpus rows
+
+        Args:
+            query: Query embedding
+            top_k: Number of results
+            mask: Optional boolean mask; only matching rows are scored
+
+        Returns:
+            Tuple of (indices, scores), best first
+        """
+        if mask is None:
+            scores = self.scores(query)
+            indices = top_k_indices(scores, top_k)
+            return indices, scores[indices]
+
+        candidates = np.flatnonzero(mask)
+        if len(candidates) == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+
+        scores = self.matrix[candidates] @ normalize_vector(query)
+        best = top_k_indices(scores, top_k)
+        return candidates[best], scores[best]
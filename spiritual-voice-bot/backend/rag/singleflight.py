@@ -0,0 +1,146 @@
+"""
+Singleflight coalescing of identical in-flight requests
+
+Concurrent callers with the same key share one computation: the first
+starts it, the others wait for its result. Streams fan out from one
+upstream generator through a replay buffer, so a subscriber that joins
+late first receives every chunk produced so far, then the live ones.
+
+The shared computation runs in its own task: a caller that goes away
+(client disconnect) does not cancel it for the others, and it still
+finishes (and fills the answer cache) when every caller has gone.
+Entries are dropped as soon as the computation ends; answers for later
+requests come from the answer cache.
+"""
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Broadcast:
+    """One upstream stream, replayed to any number of subscribers"""
+
+    def __init__(self, stream: AsyncIterator[Any]):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(stream))
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _pump(self, stream: AsyncIterator[Any]):
+        try:
+            async for chunk in stream:
+                self.chunks.append(chunk)
+                self._notify()
+        except asyncio.CancelledError as e:
+            self.error = e
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        position = 0
+        while True:
+            if position < len(self.chunks):
+                yield self.chunks[position]
+                position += 1
+            elif self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Share in-flight computations among concurrent callers with the same key
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+
+        # Stats
+        self.leaders = 0
+        self.followers = 0
+
+    def _forget(self, flights: Dict, key: Hashable, flight: Any):
+        if flights.get(key) is flight:
+            del flights[key]
+
+    async def do(self, key: Optional[Hashable], fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Result of fn(), shared with concurrent calls for the same key
+
+        Every caller gets the same result object; copy it before mutating.
+
+        Args:
+            key: Coalescing key (None = run fn() on its own)
+            fn: Coroutine function computing the result
+        """
+        if key is None:
+            return await fn()
+
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+
+            def finished(done: asyncio.Future):
+                self._forget(self._calls, key, done)
+                if not done.cancelled():
+                    # Mark the error retrieved, even if every caller has gone
+                    done.exception()
+
+            task.add_done_callback(finished)
+        else:
+            self.followers += 1
+            logger.info("Joining an identical in-flight query")
+        # Shielded: one caller's cancellation must not cancel the shared task
+        return await asyncio.shield(task)
+
+    async def stream(self, key: Optional[Hashable], fn: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Chunks of fn(), shared with concurrent streams for the same key
+
+        Args:
+            key: Coalescing key (None = iterate fn() on its own)
+            fn: Function returning the async iterator of chunks
+        """
+        if key is None:
+            async for chunk in fn():
+                yield chunk
+            return
+
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self.leaders += 1
+            broadcast = _Broadcast(fn())
+            self._streams[key] = broadcast
+            broadcast.task.add_done_callback(lambda _: self._forget(self._streams, key, broadcast))
+        else:
+            self.followers += 1
+            logger.info(f"Joining an identical in-flight stream ({len(broadcast.chunks)} chunks replayed)")
+
+        async for chunk in broadcast.subscribe():
+            yield chunk
+
+    def get_stats(self) -> Dict:
+        total = self.leaders + self.followers
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "computations": self.leaders,
+            "coalesced": self.followers,
+            "coalesced_rate": self.followers / total if total else 0.0
+        }
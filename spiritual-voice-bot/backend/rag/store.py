@@ -0,0 +1,160 @@
+"""
+On-disk vector index format for scripture embeddings
+
+An index is a directory holding:
+- embeddings.npy: L2-normalized float32 (N, d) matrix, opened with np.memmap
+- metadata.json: compact JSON with the format version, model info and verses
+
+Memory-mapping the embeddings means no float parsing on startup, and several
+uvicorn workers share the same page-cache pages instead of private copies.
+
+Both files are written to temp files and renamed into place, embeddings
+first; metadata.json is renamed last and records the matrix shape, so a
+reader never pairs verses with embeddings from another save.
+"""
+import os
+import json
+import logging
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rag.similarity import normalize_rows
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.json"
+
+
+def index_exists(index_dir: Path) -> bool:
+    """Check whether a binary index has been written to index_dir"""
+    index_dir = Path(index_dir)
+    return (index_dir / EMBEDDINGS_FILE).exists() and (index_dir / METADATA_FILE).exists()
+
+
+class IndexMismatchError(ValueError):
+    """Embeddings and metadata come from different saves"""
+
+
+def replace_atomic(path: Path, write, mode: str = "wb", **kwargs):
+    """
+    Write a file through a temp file in the same directory and rename it into place
+
+    Readers see the old file or the complete new one, never a partial write.
+
+    Args:
+        path: Target file
+        write: Function writing the contents to an open file object
+        mode: File mode of the temp file ("wb" or "w")
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def save_index(
+    index_dir: Path,
+    verses: List[Dict],
+    embeddings,
+    metadata: Optional[Dict] = None
+) -> Path:
+    """
+    Write verses and embeddings as a binary index
+
+    Args:
+        index_dir: Target directory (created if missing)
+        verses: Verse dicts without embeddings, aligned with embedding rows
+        embeddings: (N, d) embeddings, normalized before writing
+        metadata: Extra metadata fields (model name, scripture, ...)
+
+    Returns:
+        Path of the index directory
+    """
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    matrix = normalize_rows(embeddings)
+    if len(verses) != matrix.shape[0]:
+        raise ValueError(f"Got {len(verses)} verses but {matrix.shape[0]} embeddings")
+
+    data = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "metadata": {
+            **(metadata or {}),
+            "total_verses": len(verses),
+            "embedding_dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            "dtype": "float32",
+            "normalized": True
+        },
+        "verses": [{k: v for k, v in verse.items() if k != "embedding"} for verse in verses]
+    }
+
+    # Metadata goes last: it describes the embeddings already in place
+    replace_atomic(index_dir / EMBEDDINGS_FILE, lambda f: np.save(f, matrix))
+    replace_atomic(
+        index_dir / METADATA_FILE,
+        lambda f: json.dump(data, f, ensure_ascii=False, separators=(",", ":")),
+        mode="w", encoding="utf-8"
+    )
+
+    logger.info(f"Saved binary index with {len(verses)} verses to {index_dir}")
+    return index_dir
+
+
+def load_index(index_dir: Path, mmap: bool = True) -> Tuple[List[Dict], np.ndarray, Dict]:
+    """
+    Load a binary index
+
+    Args:
+        index_dir: Index directory written by save_index
+        mmap: Memory-map the embeddings read-only instead of reading them into RAM
+
+    Returns:
+        Tuple of (verses, normalized float32 embeddings, metadata)
+
+    Raises:
+        ValueError: Unknown format version, or embeddings that don't match
+            the metadata (read again once, in case a save was between renames)
+    """
+    try:
+        return _load_index(Path(index_dir), mmap)
+    except IndexMismatchError as e:
+        logger.warning(f"{e}, reading the index again")
+        return _load_index(Path(index_dir), mmap)
+
+
+def _load_index(index_dir: Path, mmap: bool) -> Tuple[List[Dict], np.ndarray, Dict]:
+    with open(index_dir / METADATA_FILE, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    version = data.get("format_version")
+    if version != INDEX_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported index format version {version} (expected {INDEX_FORMAT_VERSION}), "
+            f"re-run the ingestion script"
+        )
+
+    embeddings = np.load(index_dir / EMBEDDINGS_FILE, mmap_mode="r" if mmap else None)
+    verses = data.get("verses", [])
+    metadata = data.get("metadata", {})
+
+    if embeddings.dtype != np.float32 or embeddings.ndim != 2:
+        raise ValueError(f"Expected a 2-D float32 matrix, got {embeddings.dtype} {embeddings.shape}")
+    expected = (len(verses), metadata.get("embedding_dim", embeddings.shape[1]))
+    if embeddings.shape != expected or metadata.get("total_verses", len(verses)) != len(verses):
+        raise IndexMismatchError(
+            f"Index has {len(verses)} verses of dimension {expected[1]} but {embeddings.shape} embeddings"
+        )
+
+    return verses, embeddings, metadata
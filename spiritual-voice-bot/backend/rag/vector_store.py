@@ -0,0 +1,298 @@
+"""
+Vector store backends for scripture retrieval
+
+- InMemoryVectorStore: embeddings held in process memory (sample data, legacy JSON)
+- MmapVectorStore: embeddings memory-mapped from the binary index on disk
+- QdrantVectorStore: embeddings served by Qdrant with server-side payload filters
+
+All backends return (row ids, cosine scores) aligned with the verse list in
+vector_store["scriptures"]; Qdrant point ids are those same row ids.
+"""
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from loader import LazyModule
+
+logger = logging.getLogger(__name__)
+
+# qdrant-client takes about a second to import; only the qdrant backend needs it
+qdrant_client = LazyModule("qdrant_client", "qdrant-client")
+models = LazyModule("qdrant_client.models", "qdrant-client")
+httpx = LazyModule("httpx", "httpx")
+
+
+class VectorStore(ABC):
+    """
+    Interface shared by all vector store backends
+    """
+
+    backend = "base"
+
+    @abstractmethod
+    async def search(
+        self,
+        query_embedding,
+        top_k: int,
+        mask: Optional[np.ndarray] = None,
+        filters: Optional[Dict] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the top_k most similar rows
+
+        Args:
+            query_embedding: Query embedding
+            top_k: Number of results
+            mask: Boolean filter mask over rows (used by local backends)
+            filters: Same filters as field values, e.g. {"language": "en",
+                "chapter": (2, 6)} (used by remote backends)
+
+        Returns:
+            Tuple of (row ids, scores), best first
+        """
+
+    async def close(self):
+        """Release connections"""
+
+    def get_stats(self) -> Dict:
+        return {"backend": self.backend}
+
+
+class InMemoryVectorStore(VectorStore):
+    """
+    Local search over an index held in process memory
+    """
+
+    backend = "memory"
+
+    def __init__(self, index):
+        """
+        Args:
+            index: SimilarityIndex, IVFIndex or QuantizedIndex
+        """
+        self.index = index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    async def search(self, query_embedding, top_k, mask=None, filters=None):
+        return self.index.search(query_embedding, top_k, mask=mask)
+
+    def get_stats(self) -> Dict:
+        return {"backend": self.backend, "index": type(self.index).__name__, "rows": len(self.index)}
+
+
+class MmapVectorStore(InMemoryVectorStore):
+    """
+    Local search over embeddings memory-mapped from the binary index
+
+    Pages are shared through the OS page cache by every worker process.
+    """
+
+    backend = "mmap"
+
+
+def _qdrant_filter(filters: Optional[Dict]):
+    """Translate search filters into a Qdrant payload filter"""
+    if not filters:
+        return None
+
+    conditions = []
+    for field in ("language", "scripture", "topic"):
+        value = filters.get(field)
+        if value:
+            conditions.append(models.FieldCondition(key=field, match=models.MatchValue(value=value)))
+
+    chapter = filters.get("chapter")
+    if chapter is not None:
+        start, end = chapter
+        conditions.append(models.FieldCondition(key="chapter", range=models.Range(gte=start, lte=end)))
+
+    return models.Filter(must=conditions) if conditions else None
+
+
+def _payload(verse: Dict) -> Dict:
+    """Qdrant payload for a verse (chapter and verse as ints so range filters work)"""
+    payload = {k: v for k, v in verse.items() if k != "embedding"}
+    for field in ("chapter", "verse"):
+        try:
+            payload[field] = int(payload.get(field))
+        except (TypeError, ValueError):
+            pass
+    return payload
+
+
+class QdrantVectorStore(VectorStore):
+    """
+    Remote search on a Qdrant collection through one pooled async client
+    """
+
+    backend = "qdrant"
+
+    def __init__(
+        self,
+        collection: str,
+        client=None,
+        host: str = "localhost",
+        port: int = 6333,
+        pool_size: int = 16,
+        timeout: float = 5.0,
+        fallback: Optional[VectorStore] = None
+    ):
+        """
+        Args:
+            collection: Collection name
+            client: Existing AsyncQdrantClient (created from host/port if omitted;
+                host ":memory:" gives an in-process stand-in)
+            pool_size: Maximum pooled HTTP connections shared by all requests
+            timeout: Per-request timeout in seconds (sub-second values are
+                enforced here; the client itself rounds up to whole seconds)
+            fallback: Local store used when Qdrant errors
+        """
+        if client is None:
+            if not qdrant_client.available:
+                raise RuntimeError("qdrant-client not installed. Install with: pip install qdrant-client")
+            if host == ":memory:":
+                client = qdrant_client.AsyncQdrantClient(location=":memory:")
+            else:
+                client = qdrant_client.AsyncQdrantClient(
+                    host=host,
+                    port=port,
+                    timeout=timeout,
+                    limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+                )
+
+        self.client = client
+        self.collection = collection
+        self.fallback = fallback
+        self.timeout = timeout
+        self.errors = 0
+        # Points in the collection when last counted
+        self.points: Optional[int] = None
+
+    async def ensure_collection(self, dim: int, recreate: bool = False):
+        """Create the cosine collection and payload indexes used by filters"""
+        exists = await self._collection_exists()
+        if exists and recreate:
+            await self.client.delete_collection(self.collection)
+            exists = False
+        if exists:
+            return
+
+        await self.client.create_collection(
+            collection_name=self.collection,
+            vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE)
+        )
+        for field, schema in (
+            ("language", models.PayloadSchemaType.KEYWORD),
+            ("scripture", models.PayloadSchemaType.KEYWORD),
+            ("topic", models.PayloadSchemaType.KEYWORD),
+            ("chapter", models.PayloadSchemaType.INTEGER),
+        ):
+            await self.client.create_payload_index(self.collection, field_name=field, field_schema=schema)
+
+    async def _collection_exists(self) -> bool:
+        try:
+            await self.client.get_collection(self.collection)
+            return True
+        except Exception:
+            return False
+
+    async def count(self) -> int:
+        """Number of points in the collection (0 if it doesn't exist)"""
+        if not await self._collection_exists():
+            self.points = 0
+        else:
+            self.points = (await self.client.count(self.collection, exact=True)).count
+        return self.points
+
+    async def upsert(
+        self,
+        verses: List[Dict],
+        embeddings,
+        batch_size: int = 256,
+        start_id: int = 0
+    ):
+        """
+        Upload verses and embeddings in batches
+
+        Point ids are row positions (start_id + i), matching the local verse list.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        for start in range(0, len(verses), batch_size):
+            end = min(start + batch_size, len(verses))
+            await self.client.upsert(
+                collection_name=self.collection,
+                points=models.Batch(
+                    ids=list(range(start_id + start, start_id + end)),
+                    vectors=embeddings[start:end].tolist(),
+                    payloads=[_payload(v) for v in verses[start:end]]
+                ),
+                wait=True
+            )
+            logger.info(f"Upserted {end}/{len(verses)} points to Qdrant collection '{self.collection}'")
+
+    async def search(self, query_embedding, top_k, mask=None, filters=None):
+        vector = np.asarray(query_embedding, dtype=np.float32).reshape(-1).tolist()
+        query_filter = _qdrant_filter(filters)
+
+        try:
+            if hasattr(self.client, "query_points"):
+                response = await asyncio.wait_for(self.client.query_points(
+                    collection_name=self.collection,
+                    query=vector,
+                    query_filter=query_filter,
+                    limit=top_k,
+                    with_payload=False
+                ), self.timeout)
+                points = response.points
+            else:
+                points = await asyncio.wait_for(self.client.search(
+                    collection_name=self.collection,
+                    query_vector=vector,
+                    query_filter=query_filter,
+                    limit=top_k,
+                    with_payload=False
+                ), self.timeout)
+        except Exception as e:
+            self.errors += 1
+            if self.fallback is None:
+                raise
+            logger.error(f"Qdrant search failed, using local fallback: {str(e) or type(e).__name__}")
+            return await self.fallback.search(query_embedding, top_k, mask=mask, filters=filters)
+
+        ids = np.array([int(p.id) for p in points], dtype=np.int64)
+        scores = np.array([p.score for p in points], dtype=np.float32)
+        return ids, scores
+
+    async def close(self):
+        await self.client.close()
+
+    def get_stats(self) -> Dict:
+        return {"backend": self.backend, "collection": self.collection, "points": self.points, "errors": self.errors}
+
+
+def create_qdrant_store(settings, fallback: Optional[VectorStore] = None) -> QdrantVectorStore:
+    """Qdrant store configured from settings"""
+    return QdrantVectorStore(
+        collection=settings.QDRANT_COLLECTION,
+        host=settings.QDRANT_HOST,
+        port=settings.QDRANT_PORT,
+        pool_size=settings.QDRANT_POOL_SIZE,
+        timeout=settings.QDRANT_TIMEOUT,
+        fallback=fallback
+    )
+
+
+async def publish_to_qdrant(settings, verses: List[Dict], embeddings, batch_size: int = 256):
+    """Recreate the configured Qdrant collection from ingested verses (used by ingest scripts)"""
+    store = create_qdrant_store(settings)
+    try:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        await store.ensure_collection(embeddings.shape[1], recreate=True)
+        await store.upsert(verses, embeddings, batch_size=batch_size)
+    finally:
+        await store.close()
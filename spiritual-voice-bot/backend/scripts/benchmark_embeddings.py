@@ -0,0 +1,104 @@
+"""
+Benchmark embedding backends (PyTorch, ONNX, ONNX int8) on CPU
+
+Reports load time, single-query latency (p50 / p95), batched latency per text
+and cosine agreement with the PyTorch embeddings for the same texts.
+"""
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import settings
+from rag.embedding import EMBEDDING_BACKENDS, load_embedding_model
+from rag.similarity import normalize_rows
+
+QUERIES = [
+    "What does the Bhagavad Gita say about duty?",
+    "How can I control my restless mind?",
+    "मुझे अपने कर्म के फल की चिंता क्यों नहीं करनी चाहिए?",
+    "What happens to the soul after death?",
+    "How do I deal with fear and anxiety?",
+    "What is the meaning of karma yoga?",
+    "भक्ति योग क्या है?",
+    "How should I treat success and failure?",
+]
+
+
+def encode(model, texts, batch_size: int) -> np.ndarray:
+    return np.asarray(model.encode(texts, batch_size=batch_size, convert_to_tensor=False), dtype=np.float32)
+
+
+def single_query_ms(model, texts, repeats: int) -> np.ndarray:
+    """Latency in milliseconds of encoding one text at a time"""
+    timings = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        model.encode(texts[i % len(texts)], convert_to_tensor=False)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.asarray(timings)
+
+
+def batched_ms_per_text(model, texts, batch_size: int) -> float:
+    start = time.perf_counter()
+    encode(model, texts, batch_size)
+    return (time.perf_counter() - start) * 1000 / len(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS), choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--repeats", type=int, default=100, help="Single-query encodes per backend")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--batch-texts", type=int, default=256, help="Texts encoded in the batched run")
+    parser.add_argument("--quantization", default=settings.EMBEDDING_ONNX_QUANTIZATION)
+    args = parser.parse_args()
+
+    batch_texts = [QUERIES[i % len(QUERIES)] + f" ({i})" for i in range(args.batch_texts)]
+
+    reference = None
+    logger.info(
+        f"{'backend':>10} | {'load s':>7} | {'p50 ms':>7} | {'p95 ms':>7} | "
+        f"{'batch ms/text':>13} | {'cos mean':>8} | {'cos min':>8}"
+    )
+    for backend in args.backends:
+        start = time.perf_counter()
+        model = load_embedding_model(
+            args.model, backend=backend, cache_dir=settings.EMBEDDING_ONNX_DIR,
+            quantization_config=args.quantization, fallback=False
+        )
+        load_s = time.perf_counter() - start
+
+        # Warm up once so lazy initialization isn't counted
+        model.encode(QUERIES[0], convert_to_tensor=False)
+
+        single = single_query_ms(model, QUERIES, args.repeats)
+        batched = batched_ms_per_text(model, batch_texts, args.batch_size)
+
+        embeddings = normalize_rows(encode(model, batch_texts, args.batch_size))
+        if reference is None and backend == "torch":
+            reference = embeddings
+
+        cos_mean, cos_min = float("nan"), float("nan")
+        if reference is not None:
+            cosines = np.sum(reference * embeddings, axis=1)
+            cos_mean, cos_min = float(cosines.mean()), float(cosines.min())
+
+        logger.info(
+            f"{backend:>10} | {load_s:>7.1f} | {np.percentile(single, 50):>7.2f} | {np.percentile(single, 95):>7.2f} | "
+            f"{batched:>13.2f} | {cos_mean:>8.4f} | {cos_min:>8.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
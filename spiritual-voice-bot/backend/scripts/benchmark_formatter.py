@@ -0,0 +1,93 @@
+"""
+Benchmark paragraph formatting: batch ensure_paragraph_breaks vs the
+incremental StreamingParagraphFormatter
+
+Reports throughput for each chunk size, how much of the answer had to be
+generated before the first paragraph came out, and whether the streamed
+output matches the batch output.
+"""
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from llm.formatter import StreamingParagraphFormatter, ensure_paragraph_breaks
+
+ANSWER = (
+    "I understand your worry about the outcome.It is natural to feel anxious when so much is at stake. "
+    "In Bhagavad Gita 2.47, Krishna says: \"You have a right to perform your prescribed duties, but you are "
+    "not entitled to the fruits of your actions. Never consider yourself the cause of the results.\" "
+    "This verse teaches detachment from results. Focus on the work itself and let go of the rest. "
+    "Krishna says: \"Perform your duty equipoised, abandoning all attachment to success or failure.\" "
+    "Such equanimity is called yoga. When you act without clinging, the mind becomes steady. "
+    "What would change today if you gave your full effort and released the outcome? "
+)
+
+
+def chunked(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def run_batch(text: str, repeats: int) -> float:
+    """Characters per second of the batch formatter"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        ensure_paragraph_breaks(text)
+    return len(text) * repeats / (time.perf_counter() - start)
+
+
+def run_stream(chunks, repeats: int):
+    """
+    Returns:
+        Tuple of (characters per second, characters fed before the first output, output)
+    """
+    total = sum(len(chunk) for chunk in chunks)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        formatter = StreamingParagraphFormatter()
+        output = []
+        first = None
+        fed = 0
+        for chunk in chunks:
+            fed += len(chunk)
+            text = formatter.feed(chunk)
+            if text:
+                output.append(text)
+                if first is None:
+                    first = fed
+        output.append(formatter.flush())
+    elapsed = time.perf_counter() - start
+    return total * repeats / elapsed, first if first is not None else total, "".join(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=[4, 16, 64])
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--copies", type=int, default=4, help="Answer repetitions per text")
+    args = parser.parse_args()
+
+    text = ANSWER * args.copies
+    expected = ensure_paragraph_breaks(text)
+
+    logger.info(f"Text: {len(text)} chars, {expected.count(chr(10) * 2) + 1} paragraphs")
+    logger.info(f"{'formatter':>14} | {'chars/s':>10} | {'first output at':>15} | {'identical':>9}")
+    logger.info(f"{'batch':>14} | {run_batch(text, args.repeats):>10.0f} | {len(text):>15} | {'yes':>9}")
+
+    for size in args.chunk_sizes:
+        throughput, first, output = run_stream(chunked(text, size), args.repeats)
+        logger.info(
+            f"{f'stream ({size})':>14} | {throughput:>10.0f} | {first:>15} | "
+            f"{'yes' if output == expected else 'NO':>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
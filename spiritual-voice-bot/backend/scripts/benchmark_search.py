@@ -0,0 +1,96 @@
+"""
+Benchmark per-query similarity search latency against corpus size
+
+Compares the previous per-query approach (re-wrap matrix, recompute norms,
+full argsort) with the pre-normalized SimilarityIndex kernel and, for
+corpora of at least --ann-min rows, the IVF-flat ANN index (with recall@k).
+"""
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from rag.similarity import SimilarityIndex
+from rag.ann import IVFIndex
+
+
+def legacy_search(embeddings, query: np.ndarray, top_k: int) -> np.ndarray:
+    """Search as RAGPipeline.search used to do it on every query"""
+    emb = np.array(embeddings)
+    emb_norms = np.linalg.norm(emb, axis=1)
+    qe_norm = np.linalg.norm(query)
+    similarities = (emb @ query) / (emb_norms * qe_norm)
+    return np.argsort(similarities)[::-1][:top_k]
+
+
+def time_per_query(fn, queries: np.ndarray) -> float:
+    """Average milliseconds per query"""
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def clustered_corpus(rng, size: int, dim: int, clusters: int = 200) -> np.ndarray:
+    """Random corpus with topical structure, closer to real embeddings than pure noise"""
+    centers = rng.standard_normal((clusters, dim))
+    return (centers[rng.integers(0, clusters, size)] + 0.5 * rng.standard_normal((size, dim))).astype(np.float32)
+
+
+def recall_at_k(exact: SimilarityIndex, approx: IVFIndex, queries: np.ndarray, k: int) -> float:
+    """Fraction of exact top-k results the ANN index also returns"""
+    hits = 0
+    for q in queries:
+        hits += len(set(exact.search(q, k)[0]) & set(approx.search(q, k)[0]))
+    return hits / (k * len(queries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[700, 5000, 20000, 100000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=7)
+    parser.add_argument("--ann-min", type=int, default=20000, help="Smallest corpus to build an IVF index for")
+    parser.add_argument("--nprobe", type=int, default=16)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    logger.info(
+        f"{'corpus':>10} | {'legacy ms/q':>12} | {'kernel ms/q':>12} | {'speedup':>8} | "
+        f"{'ivf ms/q':>9} | {'recall@k':>8}"
+    )
+    for size in args.sizes:
+        corpus = clustered_corpus(rng, size, args.dim)
+        queries = clustered_corpus(rng, args.queries, args.dim)
+        # The legacy path received the embeddings as loaded from JSON (float64)
+        corpus_f64 = corpus.astype(np.float64)
+        index = SimilarityIndex(corpus)
+
+        legacy_ms = time_per_query(lambda q: legacy_search(corpus_f64, q, args.top_k), queries)
+        kernel_ms = time_per_query(lambda q: index.search(q, args.top_k), queries)
+
+        ivf_ms, recall = float("nan"), float("nan")
+        if size >= args.ann_min:
+            ivf = IVFIndex.build(index.matrix, nprobe=args.nprobe)
+            ivf_ms = time_per_query(lambda q: ivf.search(q, args.top_k), queries)
+            recall = recall_at_k(index, ivf, queries, args.top_k)
+
+        logger.info(
+            f"{size:>10} | {legacy_ms:>12.3f} | {kernel_ms:>12.3f} | {legacy_ms / kernel_ms:>7.1f}x | "
+            f"{ivf_ms:>9.3f} | {recall:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import os
 import sys
 import json
 import csv
+import asyncio
 import logging
 from pathlib import Path
 from typing import List, Dict
@@ -17,13 +18,17 @@ logger = logging.getLogger(__name__)
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config import settings
-
-# Try to import sentence transformers
-try:
-    from sentence_transformers import SentenceTransformer
-    EMBEDDING_AVAILABLE = True
-except ImportError:
-    EMBEDDING_AVAILABLE = False
+from rag.store import save_index
+from rag.ann import IVFIndex
+from rag.similarity import normalize_rows
+from rag.quantization import save_quantized
+from rag.lexical import BM25Index, verse_document
+from rag.vector_store import publish_to_qdrant
+from rag.chunking import CHUNK_PREFIX, ChunkIndex, create_text_splitter, remove_chunks
+from rag.embedding import load_from_settings, sentence_transformers
+
+EMBEDDING_AVAILABLE = sentence_transformers.available
+if not EMBEDDING_AVAILABLE:
     logger.warning("sentence-transformers not available. Install with: pip install sentence-transformers")
 
 class BhagavadGitaIngester:
@@ -38,8 +43,8 @@ class BhagavadGitaIngester:
         self.embedding_model = None
         if EMBEDDING_AVAILABLE:
             try:
-                logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL}")
-                self.embedding_model = SentenceTransformer(settings.EMBEDDING_MODEL)
+                logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL} ({settings.EMBEDDING_BACKEND})")
+                self.embedding_model = load_from_settings(settings)
                 logger.info("Embedding model loaded successfully")
             except Exception as e:
                 logger.error(f"Failed to load embedding model: {e}")
@@ -137,6 +142,7 @@ class BhagavadGitaIngester:
             'sanskrit': ['sanskrit', 'sanskrit_text', 'original', 'devanagari'],
             'transliteration': ['transliteration', 'iast', 'romanized'],
             'meaning': ['meaning', 'explanation', 'commentary', 'description'],
+            'word_meaning': ['wordmeaning', 'word_meaning', 'word_meanings', 'synonyms'],
         }
 
         # Extract fields
@@ -214,26 +220,50 @@ class BhagavadGitaIngester:
         return embeddings
 
     def save_processed_data(self, verses: List[Dict], embeddings: np.ndarray):
-        """Save processed verses and embeddings"""
-        output_file = self.processed_data_dir / "bhagavad_gita_processed.json"
-
-        # Convert embeddings to list for JSON serialization
-        for i, verse in enumerate(verses):
-            verse['embedding'] = embeddings[i].tolist()
-
-        # Save as JSON
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                'verses': verses,
-                'metadata': {
-                    'total_verses': len(verses),
-                    'embedding_dim': len(embeddings[0]) if len(embeddings) > 0 else 0,
-                    'embedding_model': settings.EMBEDDING_MODEL,
-                    'scripture': 'Bhagavad Gita'
-                }
-            }, f, ensure_ascii=False, indent=2)
-
-        logger.info(f"Saved processed data to {output_file}")
+        """Save processed verses and embeddings as a memory-mappable binary index"""
+        index_dir = self.processed_data_dir / "bhagavad_gita_index"
+
+        save_index(index_dir, verses, embeddings, metadata={
+            'embedding_model': settings.EMBEDDING_MODEL,
+            'scripture': 'Bhagavad Gita'
+        })
+
+        logger.info(f"Saved binary index to {index_dir}")
+
+        # Quantized codes for the int8 / binary prefilter (VECTOR_QUANTIZATION)
+        matrix = normalize_rows(embeddings)
+        save_quantized(index_dir, matrix)
+
+        # BM25 postings for hybrid lexical + dense search
+        BM25Index.build([verse_document(verse) for verse in verses]).save(index_dir)
+
+        # Chunk embeddings for passage-level search (long meanings and commentaries),
+        # with their own quantized codes and IVF index; chunks of a previous ingest are stale
+        remove_chunks(index_dir)
+        if self.embedding_model:
+            logger.info("Chunking and embedding verse fields...")
+            chunks = ChunkIndex.build(
+                verses,
+                lambda texts: self.embedding_model.encode(texts, convert_to_tensor=False),
+                create_text_splitter(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP),
+                batch_size=settings.CHUNK_EMBED_BATCH_SIZE
+            )
+            chunks.save(index_dir)
+            save_quantized(index_dir, chunks.matrix, prefix=CHUNK_PREFIX)
+            if len(chunks.parents) >= settings.ANN_MIN_CORPUS_SIZE:
+                logger.info("Building chunk IVF index for approximate search...")
+                IVFIndex.build(chunks.matrix, nlist=settings.ANN_NLIST or None).save(index_dir, prefix=CHUNK_PREFIX)
+
+        # Large corpora get an IVF index for approximate search
+        if len(verses) >= settings.ANN_MIN_CORPUS_SIZE:
+            logger.info("Building IVF index for approximate search...")
+            ivf = IVFIndex.build(matrix, nlist=settings.ANN_NLIST or None)
+            ivf.save(index_dir)
+
+        # Publish to Qdrant when it serves search (point ids are verse row ids)
+        if settings.VECTOR_STORE_BACKEND == "qdrant":
+            logger.info(f"Uploading to Qdrant collection '{settings.QDRANT_COLLECTION}'...")
+            asyncio.run(publish_to_qdrant(settings, verses, matrix, batch_size=settings.QDRANT_UPSERT_BATCH_SIZE))
 
         # Also save just the verse data without embeddings for easy inspection
         verses_only_file = self.processed_data_dir / "bhagavad_gita_verses.json"
@@ -301,7 +331,7 @@ class BhagavadGitaIngester:
         logger.info("=" * 70)
         logger.info(f"📊 Total verses processed: {len(all_verses)}")
         logger.info(f"📁 Output directory: {self.processed_data_dir}")
-        logger.info(f"📄 Processed data: bhagavad_gita_processed.json")
+        logger.info(f"📄 Binary index: bhagavad_gita_index/ (embeddings.npy + metadata.json)")
         logger.info(f"📄 Verses only: bhagavad_gita_verses.json")
         logger.info("\n🚀 Ready to use with RAG pipeline!")
 
@@ -2,8 +2,8 @@
 Simple ingestion script for Bhagwad_Gita.csv
 """
 import sys
-import json
 import csv
+import asyncio
 import logging
 from pathlib import Path
 
@@ -12,10 +12,17 @@ logger = logging.getLogger(__name__)
 
 sys.path.append(str(Path(__file__).parent.parent))
 from config import settings
+from rag.store import save_index
+from rag.ann import IVFIndex
+from rag.similarity import normalize_rows
+from rag.quantization import save_quantized
+from rag.lexical import BM25Index, verse_document
+from rag.vector_store import publish_to_qdrant
+from rag.chunking import CHUNK_PREFIX, ChunkIndex, create_text_splitter, remove_chunks
+from rag.embedding import load_from_settings
 
 try:
-    from sentence_transformers import SentenceTransformer
-    model = SentenceTransformer(settings.EMBEDDING_MODEL)
+    model = load_from_settings(settings)
     logger.info("Embedding model loaded")
 except Exception as e:
     logger.error(f"Failed to load model: {e}")
@@ -43,6 +50,7 @@ with open(raw_file, 'r', encoding='utf-8') as f:
                 'sanskrit': row['Shloka'].strip() if row['Shloka'] else '',
                 'transliteration': row['Transliteration'].strip() if row['Transliteration'] else '',
                 'meaning': row['HinMeaning'].strip() if row['HinMeaning'] else '',
+                'word_meaning': row['WordMeaning'].strip() if row.get('WordMeaning') else '',
                 'reference': f"Bhagavad Gita {chapter}.{verse}",
                 'scripture': 'Bhagavad Gita',
                 'topic': 'General Wisdom',
@@ -63,21 +71,45 @@ logger.info("Generating embeddings...")
 texts = [v['text'] for v in verses]
 embeddings = model.encode(texts, show_progress_bar=True, convert_to_tensor=False)
 
-# Add embeddings
-for i, v in enumerate(verses):
-    v['embedding'] = embeddings[i].tolist()
-
-# Save
-output_file = output_dir / "bhagavad_gita_processed.json"
-with open(output_file, 'w', encoding='utf-8') as f:
-    json.dump({
-        'verses': verses,
-        'metadata': {
-            'total_verses': len(verses),
-            'embedding_dim': len(embeddings[0]),
-            'embedding_model': settings.EMBEDDING_MODEL
-        }
-    }, f, ensure_ascii=False, indent=2)
-
-logger.info(f"✅ Saved to {output_file}")
+# Save binary index (embeddings.npy is memory-mapped by the RAG pipeline)
+index_dir = output_dir / "bhagavad_gita_index"
+save_index(index_dir, verses, embeddings, metadata={
+    'embedding_model': settings.EMBEDDING_MODEL,
+    'scripture': 'Bhagavad Gita'
+})
+
+# Quantized codes for the int8 / binary prefilter (VECTOR_QUANTIZATION)
+matrix = normalize_rows(embeddings)
+save_quantized(index_dir, matrix)
+
+# BM25 postings for hybrid lexical + dense search
+BM25Index.build([verse_document(v) for v in verses]).save(index_dir)
+
+# Chunk embeddings for passage-level search (long Hindi meanings), with their
+# own quantized codes and IVF index; chunks of a previous ingest are stale
+logger.info("Chunking and embedding verse fields...")
+remove_chunks(index_dir)
+chunks = ChunkIndex.build(
+    verses,
+    lambda texts: model.encode(texts, convert_to_tensor=False),
+    create_text_splitter(settings.CHUNK_SIZE, settings.CHUNK_OVERLAP),
+    batch_size=settings.CHUNK_EMBED_BATCH_SIZE
+)
+chunks.save(index_dir)
+save_quantized(index_dir, chunks.matrix, prefix=CHUNK_PREFIX)
+if len(chunks.parents) >= settings.ANN_MIN_CORPUS_SIZE:
+    logger.info("Building chunk IVF index...")
+    IVFIndex.build(chunks.matrix, nlist=settings.ANN_NLIST or None).save(index_dir, prefix=CHUNK_PREFIX)
+
+# Large corpora get an IVF index for approximate search
+if len(verses) >= settings.ANN_MIN_CORPUS_SIZE:
+    logger.info("Building IVF index...")
+    IVFIndex.build(matrix, nlist=settings.ANN_NLIST or None).save(index_dir)
+
+# Publish to Qdrant when it serves search (point ids are verse row ids)
+if settings.VECTOR_STORE_BACKEND == "qdrant":
+    logger.info(f"Uploading to Qdrant collection '{settings.QDRANT_COLLECTION}'...")
+    asyncio.run(publish_to_qdrant(settings, verses, matrix, batch_size=settings.QDRANT_UPSERT_BATCH_SIZE))
+
+logger.info(f"✅ Saved to {index_dir}")
 logger.info(f"📊 Total: {len(verses)} verses with embeddings")
@@ -0,0 +1,166 @@
+"""
+Load test the text query API: throughput and tail latency
+
+By default the app runs in-process with LLM_BACKEND=mock, so the whole
+pipeline (retrieval, rerank, LLM plan, formatting) is measured offline
+against a simulated Gemini. Pass --url to load a running server instead
+(e.g. `LLM_BACKEND=mock uvicorn main:app --workers 4`). httpx's in-process
+ASGI transport buffers responses, so time to first chunk of --stream is
+only meaningful with --url.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+QUERIES = [
+    "Why should I not worry about the results of my work?",
+    "How can I control my restless mind?",
+    "I feel lost and do not know my purpose",
+    "What happens to the soul after death?",
+    "How do I deal with fear before an exam?",
+    "मुझे अपने कर्म के फल की चिंता क्यों नहीं करनी चाहिए?",
+    "How should I treat success and failure?",
+    "I am angry at my family, what should I do?",
+]
+
+
+async def one_request(client, path: str, query: str, language: str, stream: bool):
+    """
+    Returns:
+        Tuple of (seconds to first byte, total seconds, ok)
+    """
+    body = {"query": query, "language": language}
+    start = time.perf_counter()
+    first = None
+    try:
+        if stream:
+            async with client.stream("POST", path + "/stream", json=body) as response:
+                async for line in response.aiter_lines():
+                    if first is None and line.startswith("data:"):
+                        first = time.perf_counter() - start
+                    if line.startswith("data: [ERROR]"):
+                        return first, time.perf_counter() - start, False
+                ok = response.status_code == 200
+        else:
+            response = await client.post(path, json=body)
+            first = time.perf_counter() - start
+            ok = response.status_code == 200
+    except Exception as e:
+        logger.warning(f"Request failed: {str(e)}")
+        ok = False
+    total = time.perf_counter() - start
+    return first if first is not None else total, total, ok
+
+
+async def run_load(client, args):
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(args.requests):
+        # Suffix the query so the answer cache doesn't turn the test into cache hits
+        query = QUERIES[i % len(QUERIES)] + ("" if args.repeat_queries else f" ({i})")
+        queue.put_nowait(query)
+
+    results = []
+
+    async def worker():
+        while not queue.empty():
+            query = queue.get_nowait()
+            language = "hi" if any("ऀ" <= c <= "ॿ" for c in query) else "en"
+            results.append(await one_request(client, "/api/text/query", query, language, args.stream))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return results, time.perf_counter() - start
+
+
+def report(results, elapsed: float, stream: bool):
+    first = np.asarray([r[0] for r in results if r[2]])
+    total = np.asarray([r[1] for r in results if r[2]])
+    errors = sum(not r[2] for r in results)
+
+    logger.info(f"Requests: {len(results)} in {elapsed:.2f}s ({len(results) / elapsed:.1f} req/s), errors: {errors}")
+    if not len(total):
+        return
+    rows = [("total", total)] + ([("first chunk", first)] if stream else [])
+    for name, seconds in rows:
+        p50, p95, p99 = np.percentile(seconds, [50, 95, 99]) * 1000
+        logger.info(f"{name:>12} ms: p50 {p50:7.0f} | p95 {p95:7.0f} | p99 {p99:7.0f} | max {seconds.max() * 1000:7.0f}")
+
+
+async def main_async(args):
+    import httpx
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            results, elapsed = await run_load(client, args)
+            stats = (await client.get("/api/llm/stats")).json()
+    else:
+        import main
+
+        await main.startup_event()
+        if main.warmup_task:
+            await main.warmup_task
+        try:
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=args.timeout) as client:
+                results, elapsed = await run_load(client, args)
+                stats = (await client.get("/api/llm/stats")).json()
+        finally:
+            await main.shutdown_event()
+
+    report(results, elapsed, args.stream)
+    logger.info(f"LLM plans: {json.dumps(stats['plans'], indent=2)}")
+    scheduler = stats.get("scheduler", {})
+    logger.info(
+        f"LLM scheduler: circuit {scheduler.get('circuit')} (opened {scheduler.get('circuit_opened')}x), "
+        f"retries {scheduler.get('retries')}, timeouts {scheduler.get('timeouts')}, "
+        f"short-circuited {scheduler.get('short_circuited')}, "
+        f"hedges {scheduler.get('hedges')} (won {scheduler.get('hedge_wins')})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", help="Load a running server instead of the in-process app")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--stream", action="store_true", help="Use /api/text/query/stream")
+    parser.add_argument("--repeat-queries", action="store_true", help="Send identical queries (answer cache hits, coalesced while in flight)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--latency-ms", type=float, help="Mock median time to first token")
+    parser.add_argument("--tokens-per-second", type=float, help="Mock streaming rate")
+    parser.add_argument("--error-rate", type=float, help="Mock error rate")
+    parser.add_argument("--hedge", action="store_true", help="Enable hedged LLM requests (LLM_HEDGE)")
+    parser.add_argument("--max-concurrency", type=int, help="LLM calls in flight (LLM_MAX_CONCURRENCY)")
+    args = parser.parse_args()
+
+    # Settings are read at import: the in-process app is configured through the environment
+    if not args.url:
+        os.environ.setdefault("LLM_BACKEND", "mock")
+        for option, name in (("latency_ms", "MOCK_LLM_LATENCY_MS"),
+                             ("tokens_per_second", "MOCK_LLM_TOKENS_PER_SECOND"),
+                             ("error_rate", "MOCK_LLM_ERROR_RATE")):
+            if getattr(args, option) is not None:
+                os.environ[name] = str(getattr(args, option))
+        if args.hedge:
+            os.environ["LLM_HEDGE"] = "true"
+        if args.max_concurrency is not None:
+            os.environ["LLM_MAX_CONCURRENCY"] = str(args.max_concurrency)
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,24 +3,23 @@ Automatic Speech Recognition (ASR) using Whisper
 """
 import numpy as np
 import io
+import asyncio
 import logging
-from pydub import AudioSegment
 
 from config import settings
+from loader import LazyModule
 
 logger = logging.getLogger(__name__)
 
-# Try to import heavy ASR deps; otherwise provide a dummy fallback
-try:
-    import torch
-    import whisper
-    ASR_AVAILABLE = True
-    logger.info("Whisper library loaded successfully")
-except Exception as e:
-    torch = None
-    whisper = None
-    ASR_AVAILABLE = False
-    logger.error(f"Failed to import Whisper: {str(e)}. Install with: pip install openai-whisper")
+# Heavy ASR deps are imported on first use; without them a dummy fallback is used
+torch = LazyModule("torch", "torch")
+whisper = LazyModule("whisper", "openai-whisper")
+pydub = LazyModule("pydub", "pydub")
+
+
+def asr_available() -> bool:
+    """Whether torch and Whisper import (imports them on first call)"""
+    return torch.available and whisper.available
 
 
 class ASRProcessor:
@@ -30,22 +29,20 @@ class ASRProcessor:
 
     def __init__(self):
         self.model = None
-        if ASR_AVAILABLE and torch is not None:
-            self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        else:
-            self.device = "cpu"
-
-        # Auto-initialize if available
-        if ASR_AVAILABLE:
-            logger.info("ASR is available, will initialize on first use")
+        # Resolved when the model loads, so constructing the processor doesn't import torch
+        self.device = "cpu"
 
     async def initialize(self):
-        """Load Whisper model"""
-        if not ASR_AVAILABLE:
+        """Load Whisper model on a worker thread"""
+        await asyncio.to_thread(self._load_model)
+
+    def _load_model(self):
+        if not asr_available():
             logger.warning("Whisper not available; ASR functionality is disabled in lightweight mode")
             return
 
         try:
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
             logger.info(f"Loading Whisper model on {self.device}...")
             # Use base model for POC
             self.model = whisper.load_model("base", device=self.device)
@@ -54,6 +51,20 @@ class ASRProcessor:
             logger.error(f"Failed to load Whisper model: {str(e)}")
             raise
 
+    async def warm_up(self):
+        """Transcribe one second of silence so the first real request isn't slow"""
+        if self.model is None:
+            return
+
+        silence = np.zeros(16000, dtype=np.float32)
+        await asyncio.to_thread(
+            self.model.transcribe,
+            silence,
+            language="en",
+            task="transcribe",
+            fp16=torch.cuda.is_available()
+        )
+
     async def transcribe(
         self,
         audio_bytes: bytes,
@@ -62,8 +73,8 @@ class ASRProcessor:
         """
         Transcribe audio to text. If Whisper not available, returns a descriptive placeholder.
         """
-        if not ASR_AVAILABLE:
-            logger.error("ASR_AVAILABLE is False - Whisper library not loaded. Please install: pip install openai-whisper")
+        if not asr_available():
+            logger.error("Whisper library not available. Please install: pip install openai-whisper")
             return "[ASR disabled in lightweight mode]"
 
         try:
@@ -85,7 +96,7 @@ class ASRProcessor:
                 audio,
                 language=language if language == "hi" else "en",
                 task="transcribe",
-                fp16=torch.cuda.is_available() if torch else False
+                fp16=torch.cuda.is_available()
             )
 
             transcription = result["text"].strip()
@@ -109,7 +120,7 @@ class ASRProcessor:
         """
         try:
             # Load audio using pydub
-            audio_segment = AudioSegment.from_file(io.BytesIO(audio_bytes))
+            audio_segment = pydub.AudioSegment.from_file(io.BytesIO(audio_bytes))
 
             # Convert to mono
             audio_segment = audio_segment.set_channels(1)
@@ -131,6 +142,6 @@ class ASRProcessor:
 
     def get_supported_languages(self) -> list:
         """Get list of supported languages"""
-        if ASR_AVAILABLE:
+        if asr_available():
             return ["en", "hi", "sa"]  # English, Hindi, Sanskrit
         return ["en"]
@@ -4,21 +4,15 @@ Text-to-Speech (TTS) using gTTS (Google Text-to-Speech)
 import numpy as np
 import io
 import logging
-from pydub import AudioSegment
 
 from config import settings
+from loader import LazyModule
 
 logger = logging.getLogger(__name__)
 
-# Try to import gTTS; otherwise use a dummy fallback
-try:
-    from gtts import gTTS as GoogleTTS
-    TTS_AVAILABLE = True
-    logger.info("gTTS library loaded successfully")
-except Exception as e:
-    GoogleTTS = None
-    TTS_AVAILABLE = False
-    logger.error(f"Failed to import gTTS: {str(e)}. Install with: pip install gtts")
+# gTTS and pydub are imported on first use; without gTTS a dummy fallback is used
+gtts = LazyModule("gtts", "gtts")
+pydub = LazyModule("pydub", "pydub")
 
 
 class TTSProcessor:
@@ -29,16 +23,9 @@ class TTSProcessor:
     def __init__(self):
         self.initialized = False
 
-        # Auto-initialize if available
-        if TTS_AVAILABLE:
-            logger.info("gTTS is available and ready to use")
-            self.initialized = True
-        else:
-            logger.warning("gTTS not available; speech synthesis is disabled")
-
     async def initialize(self):
         """Initialize TTS (gTTS doesn't need initialization)"""
-        if not TTS_AVAILABLE:
+        if not gtts.available:
             logger.warning("TTS not available; speech synthesis is disabled in lightweight mode")
             return
 
@@ -54,8 +41,8 @@ class TTSProcessor:
         """
         Convert text to speech using gTTS. If TTS is not available, returns a short beep audio.
         """
-        if not TTS_AVAILABLE:
-            logger.error("TTS_AVAILABLE is False - gTTS library not loaded. Please install: pip install gtts")
+        if not gtts.available:
+            logger.error("gTTS library not available. Please install: pip install gtts")
             return self._generate_error_audio()
 
         if not self.initialized:
@@ -70,7 +57,7 @@ class TTSProcessor:
             logger.info(f"Using language code: {lang_code}")
 
             # Generate speech using gTTS
-            tts = GoogleTTS(text=text, lang=lang_code, slow=False)
+            tts = gtts.gTTS(text=text, lang=lang_code, slow=False)
 
             # Save to BytesIO buffer
             mp3_fp = io.BytesIO()
@@ -79,7 +66,7 @@ class TTSProcessor:
             logger.info(f"Generated MP3 audio: {len(mp3_fp.getvalue())} bytes")
 
             # Convert MP3 to WAV format for consistency
-            audio_segment = AudioSegment.from_mp3(mp3_fp)
+            audio_segment = pydub.AudioSegment.from_mp3(mp3_fp)
             logger.info(f"Converted to AudioSegment: duration={len(audio_segment)}ms")
 
             # Export as WAV
@@ -117,7 +104,7 @@ class TTSProcessor:
             wav = (wav * 32767).astype(np.int16)
 
             # Create audio segment
-            audio_segment = AudioSegment(
+            audio_segment = pydub.AudioSegment(
                 wav.tobytes(),
                 frame_rate=sample_rate,
                 sample_width=2,  # 16-bit
@@ -154,7 +141,7 @@ class TTSProcessor:
 
     def get_available_speakers(self) -> list:
         """Get list of available speakers"""
-        if TTS_AVAILABLE and self.model and hasattr(self.model, 'speakers'):
+        if gtts.loaded and getattr(self, 'model', None) and hasattr(self.model, 'speakers'):
             return self.model.speakers
         return []
 
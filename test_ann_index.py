@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test the IVF-flat approximate nearest neighbour index
+"""
+import sys
+import os
+import tempfile
+
+import numpy as np
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from rag.ann import IVFIndex, ann_exists
+from rag.similarity import SimilarityIndex
+
+
+def clustered(rng, n, dim=32, clusters=20):
+    centers = rng.standard_normal((clusters, dim))
+    return centers[rng.integers(0, clusters, n)] + 0.3 * rng.standard_normal((n, dim))
+
+
+def test_full_probe_is_exact():
+    """Probing every list gives the same results as exact search"""
+    rng = np.random.default_rng(0)
+    exact = SimilarityIndex(clustered(rng, 2000))
+    ivf = IVFIndex.build(exact.matrix, nlist=16)
+
+    for q in clustered(rng, 10):
+        expected, _ = exact.search(q, 10)
+        found, _ = ivf.search(q, 10, nprobe=ivf.nlist)
+        assert list(found) == list(expected)
+
+
+def test_recall_with_partial_probe():
+    """A few probes already recover most of the exact top-k"""
+    rng = np.random.default_rng(1)
+    exact = SimilarityIndex(clustered(rng, 5000))
+    ivf = IVFIndex.build(exact.matrix, nlist=50, nprobe=8)
+
+    hits = 0
+    queries = clustered(rng, 20)
+    for q in queries:
+        hits += len(set(exact.search(q, 10)[0]) & set(ivf.search(q, 10)[0]))
+    assert hits / (10 * len(queries)) >= 0.9
+
+
+def test_filtered_search_and_roundtrip():
+    """Masks are honoured and a saved index loads back identically"""
+    rng = np.random.default_rng(2)
+    exact = SimilarityIndex(clustered(rng, 3000))
+    ivf = IVFIndex.build(exact.matrix, nlist=30)
+
+    mask = np.zeros(3000, dtype=bool)
+    mask[::7] = True
+    q = rng.standard_normal(32)
+    found, scores = ivf.search(q, 5, mask=mask)
+    assert len(found) == 5 and mask[found].all()
+    assert list(scores) == sorted(scores, reverse=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ivf.save(tmp)
+        assert ann_exists(tmp)
+        loaded = IVFIndex.load(tmp, exact.matrix, nprobe=ivf.nprobe)
+        assert list(loaded.search(q, 5)[0]) == list(ivf.search(q, 5)[0])
+        assert os.listdir(tmp) == ["ivf.npz"]
+
+        # Lists left over from another build are refused
+        for other in (exact.matrix[:2000], exact.matrix[:, :16]):
+            try:
+                IVFIndex.load(tmp, other)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"Expected ValueError for a {other.shape} corpus")
+
+
+if __name__ == "__main__":
+    test_full_probe_is_exact()
+    test_recall_with_partial_probe()
+    test_filtered_search_and_roundtrip()
+    print("✓ ANN index tests passed")
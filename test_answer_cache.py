@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test the semantic answer cache
+"""
+import sys
+import os
+import time
+import asyncio
+import tempfile
+
+import numpy as np
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from rag.answer_cache import SemanticAnswerCache
+
+CITATIONS = [{"reference": "Bhagavad Gita 2.47", "chapter": 2, "verse": 47, "score": 0.8}]
+
+
+def _vector(*values) -> np.ndarray:
+    vector = np.zeros(8, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector
+
+
+def _store(cache, embedding, query="How do I control my mind?", language="en", kind="text", answer="Practice."):
+    cache.set(embedding, query=query, language=language, kind=kind,
+              answer=answer, citations=CITATIONS, confidence=0.8)
+
+
+def test_hit_above_threshold_only():
+    """Similar queries hit; dissimilar ones and other languages/kinds miss"""
+    cache = SemanticAnswerCache(threshold=0.95)
+    _store(cache, _vector(1.0, 0.0))
+
+    hit = cache.get(_vector(1.0, 0.1), "en", "text")  # cosine ~0.995
+    assert hit is not None and hit["answer"] == "Practice."
+    assert hit["citations"] == CITATIONS and hit["similarity"] > 0.99
+
+    assert cache.get(_vector(1.0, 1.0), "en", "text") is None  # cosine ~0.71
+    assert cache.get(_vector(1.0, 0.0), "hi", "text") is None
+    assert cache.get(_vector(1.0, 0.0), "en", "stream") is None
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 3
+    assert stats["recent_hits"][0]["query"] == "How do I control my mind?"
+
+
+def test_near_duplicates_replace():
+    """Storing a near-identical query replaces the earlier answer"""
+    cache = SemanticAnswerCache(threshold=0.95)
+    _store(cache, _vector(1.0, 0.0), answer="old")
+    _store(cache, _vector(1.0, 0.05), answer="new")
+    assert len(cache) == 1
+    assert cache.get(_vector(1.0, 0.0), "en", "text")["answer"] == "new"
+
+
+def test_ttl_and_lru_eviction():
+    """Expired entries miss; the least recently used entry is evicted"""
+    cache = SemanticAnswerCache(threshold=0.95, ttl_seconds=0.01)
+    _store(cache, _vector(1.0))
+    time.sleep(0.02)
+    assert cache.get(_vector(1.0), "en", "text") is None
+    assert cache.expirations == 1 and len(cache) == 0
+
+    cache = SemanticAnswerCache(threshold=0.95, max_entries=2)
+    _store(cache, _vector(1.0), answer="a")
+    _store(cache, _vector(0.0, 1.0), answer="b")
+    time.sleep(0.001)
+    cache.get(_vector(1.0), "en", "text")  # refresh "a" so "b" is the oldest
+    _store(cache, _vector(0.0, 0.0, 1.0), answer="c")
+
+    assert len(cache) == 2 and cache.evictions == 1
+    assert cache.get(_vector(0.0, 1.0), "en", "text") is None
+    assert cache.get(_vector(1.0), "en", "text")["answer"] == "a"
+
+
+def test_expired_best_match_falls_through():
+    """An expired best match is dropped and the next fresh match above the threshold is served"""
+    cache = SemanticAnswerCache(threshold=0.9, ttl_seconds=60)
+    _store(cache, _vector(1.0, 0.0), answer="fresh")
+    _store(cache, _vector(1.0, 0.4, 0.4), answer="stale")
+    assert len(cache) == 2
+    stale = next(row for row in cache._order if cache._entries[row]["answer"] == "stale")
+    cache._entries[stale]["created"] -= 120
+
+    hit = cache.get(_vector(1.0, 0.3, 0.3), "en", "text")  # closer to the stale entry
+    assert hit is not None and hit["answer"] == "fresh"
+    assert cache.expirations == 1 and len(cache) == 1
+
+
+def test_rows_are_reused():
+    """The key matrix is allocated once; freed and evicted rows are reused"""
+    cache = SemanticAnswerCache(threshold=0.95, max_entries=3)
+    _store(cache, np.eye(8)[0], answer="0")
+    keys = cache._keys
+    assert keys.shape == (3, 8)
+    for i in range(1, 8):
+        _store(cache, np.eye(8)[i], answer=str(i))
+        assert cache._keys is keys
+
+    assert len(cache) == 3 and cache.evictions == 5
+    assert [cache.get(np.eye(8)[i], "en", "text") is not None for i in range(8)] == [False] * 5 + [True] * 3
+
+
+def test_persistence_round_trip():
+    """Answers saved to disk are served after a restart"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "answers.npz")
+        cache = SemanticAnswerCache(threshold=0.95, path=path)
+        _store(cache, _vector(1.0), query="प्रश्न", language="hi", answer="उत्तर")
+        cache.save()
+
+        restored = SemanticAnswerCache(threshold=0.95, path=path)
+        restored.load()
+        hit = restored.get(_vector(1.0), "hi", "text")
+        assert hit is not None and hit["answer"] == "उत्तर"
+
+
+def test_conversation_history_bypasses_cache():
+    """Follow-up turns are never answered from the cache"""
+    from rag.pipeline import RAGPipeline
+
+    pipeline = RAGPipeline()
+    _store(pipeline.answer_cache, _vector(1.0))
+    history = [{"role": "user", "content": "Tell me about karma"}]
+    # No embedding model is loaded: the history check must come first
+    assert asyncio.run(pipeline._cached_answer("How do I control my mind?", "en", "text", history)) is None
+
+
+if __name__ == "__main__":
+    test_hit_above_threshold_only()
+    test_near_duplicates_replace()
+    test_ttl_and_lru_eviction()
+    test_expired_best_match_falls_through()
+    test_rows_are_reused()
+    test_persistence_round_trip()
+    test_conversation_history_bypasses_cache()
+    print("✓ Answer cache tests passed")
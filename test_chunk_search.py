@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Test chunk-level search with parent-verse aggregation
+"""
+import sys
+import os
+import tempfile
+import zlib
+
+import numpy as np
+import pytest
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from config import settings
+from rag.ann import IVFIndex
+from rag.chunking import (
+    CHUNK_EMBEDDINGS_FILE, CHUNK_PREFIX, ChunkIndex, SimpleTextSplitter, chunk_verses, chunks_exist, group_by_parent, remove_chunks
+)
+from rag.pipeline import RAGPipeline
+from rag.quantization import QuantizedIndex, save_quantized
+from rag.similarity import normalize_vector
+
+DIM = 16
+
+
+def _verses(n=40, seed=0):
+    rng = np.random.default_rng(seed)
+    words = ["duty", "mind", "soul", "action", "devotion", "wisdom", "peace", "fear"]
+    return [
+        {"text": f"verse {i} " + " ".join(rng.choice(words, 5)),
+         "meaning": " ".join(rng.choice(words, int(rng.integers(0, 60)))),
+         "chapter": i % 18 + 1, "verse": i + 1}
+        for i in range(n)
+    ]
+
+
+def _hash_embed(texts):
+    """Deterministic bag-of-words embeddings"""
+    out = np.zeros((len(texts), DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.split():
+            out[row, zlib.crc32(word.encode()) % DIM] += 1.0
+    return out + 0.01
+
+
+def _reference_scores(index, query, aggregation, mask=None):
+    """Per-verse aggregation with a plain Python loop"""
+    chunk_scores = np.asarray(index.matrix) @ normalize_vector(query)
+    result = {}
+    for row, parent in enumerate(index.parents.tolist()):
+        if mask is not None and not mask[parent]:
+            continue
+        if parent not in result:
+            result[parent] = chunk_scores[row]
+        elif aggregation == "sum":
+            result[parent] += chunk_scores[row]
+        else:
+            result[parent] = max(result[parent], chunk_scores[row])
+    return result
+
+
+def test_chunk_spans_cover_fields():
+    """Chunks are sorted by verse and their spans reproduce the chunk text"""
+    verses = _verses()
+    splitter = SimpleTextSplitter(chunk_size=40, chunk_overlap=10)
+    texts, arrays = chunk_verses(verses, splitter)
+
+    assert np.all(np.diff(arrays["parents"]) >= 0)
+    fields = ("text", "meaning", "commentary")
+    for text, parent, field, start, end in zip(
+        texts, arrays["parents"], arrays["fields"], arrays["starts"], arrays["ends"]
+    ):
+        assert verses[parent][fields[field]][start:end] == text
+        assert len(text) <= 40
+
+    # Long meanings are split into several overlapping chunks
+    assert len(texts) > 2 * len(verses)
+
+
+def test_group_by_parent_matches_loop():
+    """Vectorized max/sum group-by agrees with a loop and finds the best chunk"""
+    rng = np.random.default_rng(1)
+    parents = np.sort(rng.integers(0, 30, size=300))
+    scores = rng.normal(size=300).astype(np.float32)
+
+    for aggregation in ("max", "sum"):
+        found, aggregated, best = group_by_parent(parents, scores, aggregation)
+        for parent, value, position in zip(found, aggregated, best):
+            group = scores[parents == parent]
+            expected = group.sum() if aggregation == "sum" else group.max()
+            assert np.isclose(value, expected, atol=1e-5)
+            assert parents[position] == parent and scores[position] == group.max()
+
+
+def test_search_ranks_verses_by_aggregated_score():
+    """Search returns verses ordered by max / sum chunk score, honouring the mask"""
+    verses = _verses()
+    splitter = SimpleTextSplitter(chunk_size=40, chunk_overlap=10)
+    query = _hash_embed(["soul peace wisdom"])[0]
+    mask = np.array([v["chapter"] <= 6 for v in verses])
+
+    for aggregation in ("max", "sum"):
+        index = ChunkIndex.build(verses, _hash_embed, splitter, aggregation=aggregation, batch_size=7)
+        assert len(index) == len(verses)
+
+        for search_mask in (None, mask):
+            ids, scores = index.search(query, 5, mask=search_mask)
+            reference = _reference_scores(index, query, aggregation, search_mask)
+            expected = sorted(reference, key=reference.get, reverse=True)[:5]
+
+            assert np.allclose(scores, [reference[i] for i in expected], atol=1e-5)
+            assert set(ids.tolist()) == set(expected)
+            if search_mask is not None:
+                assert all(mask[i] for i in ids)
+
+
+def test_score_parents_and_passage():
+    """Best chunk lookup for given verses yields the matching passage span"""
+    verses = _verses()
+    index = ChunkIndex.build(verses, _hash_embed, SimpleTextSplitter(chunk_size=40, chunk_overlap=10))
+    query = _hash_embed(["fear fear fear"])[0]
+
+    ids, scores = index.search(query, 3)
+    order = np.array([ids[2], ids[0], ids[1]])
+    parent_scores, rows = index.score_parents(query, order)
+
+    assert np.allclose(parent_scores, [scores[2], scores[0], scores[1]], atol=1e-5)
+    for parent, row in zip(order, rows):
+        assert index.parents[row] == parent
+        passage = index.passage(verses[parent], int(row))
+        assert passage["text"] and passage["text"] in verses[parent][passage["field"]]
+
+
+def test_save_load_roundtrip():
+    """Chunk index reloads memory-mapped with identical results"""
+    verses = _verses()
+    index = ChunkIndex.build(verses, _hash_embed, SimpleTextSplitter(chunk_size=40, chunk_overlap=10))
+    query = _hash_embed(["duty action"])[0]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index.save(tmp)
+        assert chunks_exist(tmp)
+        loaded = ChunkIndex.load(tmp, len(verses))
+
+        assert not loaded.matrix.flags.owndata  # view of the memory-mapped file
+        expected, got = index.search(query, 5), loaded.search(query, 5)
+        assert np.array_equal(expected[0], got[0])
+        assert np.allclose(expected[1], got[1])
+        del loaded
+
+        # Files from different builds are refused
+        def refused(num_parents):
+            try:
+                ChunkIndex.load(tmp, num_parents)
+            except ValueError:
+                return True
+            return False
+
+        assert refused(len(verses) + 1)
+        np.save(os.path.join(tmp, CHUNK_EMBEDDINGS_FILE), np.asarray(index.matrix)[:, :4].copy())
+        assert refused(len(verses))
+
+
+class _CountingIndex:
+    """Wraps an approximate chunk index and counts its searches"""
+
+    def __init__(self, index):
+        self.index = index
+        self.searches = 0
+
+    def search(self, query, top_k, mask=None):
+        self.searches += 1
+        return self.index.search(query, top_k, mask=mask)
+
+
+def test_approximate_candidates_match_exact_search():
+    """int8 and IVF shortlists find the exact top verses, honouring the mask"""
+    verses = _verses()
+    exact = ChunkIndex.build(verses, _hash_embed, SimpleTextSplitter(chunk_size=40, chunk_overlap=10))
+    query = _hash_embed(["soul peace wisdom"])[0]
+    mask = np.array([v["chapter"] <= 6 for v in verses])
+
+    for candidates in (
+        QuantizedIndex.build(exact.matrix, "int8", rerank_factor=10),
+        IVFIndex.build(exact.matrix, nlist=4, nprobe=4)
+    ):
+        counting = _CountingIndex(candidates)
+        approximate = ChunkIndex(
+            exact.matrix, exact.parents, exact.fields, exact.starts, exact.ends, len(verses),
+            normalized=True, candidates=counting, candidate_factor=8
+        )
+        for search_mask in (None, mask):
+            expected, got = exact.search(query, 5, mask=search_mask), approximate.search(query, 5, mask=search_mask)
+            assert set(got[0].tolist()) == set(expected[0].tolist())
+            assert np.allclose(np.sort(got[1]), np.sort(expected[1]), atol=1e-5)
+        assert counting.searches == 2
+
+
+def test_pipeline_uses_quantized_or_ivf_chunk_search():
+    """With CHUNK_SEARCH on, VECTOR_QUANTIZATION and the chunk IVF index still apply"""
+    verses = _verses()
+    embeddings = _hash_embed([v["text"] for v in verses])
+    chunks = ChunkIndex.build(verses, _hash_embed, SimpleTextSplitter(chunk_size=40, chunk_overlap=10))
+
+    with tempfile.TemporaryDirectory() as tmp, pytest.MonkeyPatch.context() as mp:
+        chunks.save(tmp)
+        save_quantized(tmp, chunks.matrix, prefix=CHUNK_PREFIX)
+        IVFIndex.build(chunks.matrix, nlist=4).save(tmp, prefix=CHUNK_PREFIX)
+        mp.setattr(settings, "CHUNK_SEARCH", True)
+        pipeline = RAGPipeline()
+
+        mp.setattr(settings, "VECTOR_QUANTIZATION", "int8")
+        store = pipeline._build_vector_store(verses, embeddings, index_dir=tmp)
+        assert store["index"] is store["chunk_index"]
+        assert isinstance(store["chunk_index"].candidates, QuantizedIndex)
+        assert store["chunk_index"].candidates.mode == "int8"
+
+        mp.setattr(settings, "VECTOR_QUANTIZATION", "none")
+        mp.setattr(settings, "ANN_MIN_CORPUS_SIZE", 10)
+        store = pipeline._build_vector_store(verses, embeddings, index_dir=tmp)
+        assert isinstance(store["chunk_index"].candidates, IVFIndex)
+
+        # Stale chunk files of a previous ingest are removed together
+        del store, pipeline
+        remove_chunks(tmp)
+        assert not chunks_exist(tmp) and not os.listdir(tmp)
+
+
+if __name__ == "__main__":
+    test_chunk_spans_cover_fields()
+    test_group_by_parent_matches_loop()
+    test_search_ranks_verses_by_aggregated_score()
+    test_score_parents_and_passage()
+    test_save_load_roundtrip()
+    test_approximate_candidates_match_exact_search()
+    test_pipeline_uses_quantized_or_ivf_chunk_search()
+    print("✓ Chunk search tests passed")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test the embedding backends: ONNX embeddings must agree with PyTorch
+"""
+import importlib.util
+import sys
+import os
+import tempfile
+
+import numpy as np
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from config import settings
+from rag.embedding import export_dir, load_embedding_model
+from rag.similarity import normalize_rows
+
+TEXTS = [
+    "You have a right to perform your prescribed duties, but not to the fruits of action.",
+    "The mind is restless, turbulent, obstinate and very strong.",
+    "कर्मण्येवाधिकारस्ते मा फलेषु कदाचन",
+    "How do I find peace when I am anxious about the future?",
+    "The soul is never born and never dies.",
+]
+
+# Minimum per-text cosine similarity to the PyTorch embedding
+ONNX_MIN_COSINE = 0.999
+ONNX_INT8_MIN_COSINE = 0.95
+ONNX_INT8_MEAN_COSINE = 0.98
+
+
+def _onnx_installed() -> bool:
+    return all(importlib.util.find_spec(name) for name in ("sentence_transformers", "onnxruntime", "optimum"))
+
+
+def _embed(model) -> np.ndarray:
+    return normalize_rows(np.asarray(model.encode(TEXTS, convert_to_tensor=False), dtype=np.float32))
+
+
+def test_unknown_backend_rejected():
+    """Backends are validated before anything is loaded"""
+    try:
+        load_embedding_model(settings.EMBEDDING_MODEL, backend="tensorrt")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected ValueError for unknown backend")
+
+
+def test_export_dir_is_filesystem_safe():
+    """Hub model names map to one directory under the cache dir"""
+    path = export_dir("/tmp/models", "sentence-transformers/paraphrase-multilingual-mpnet-base-v2")
+    assert path.parent.as_posix() == "/tmp/models"
+    assert "/" not in path.name
+
+
+def test_onnx_parity_with_torch():
+    """fp32 ONNX matches PyTorch; int8 ONNX stays close"""
+    if not _onnx_installed():
+        print("sentence-transformers[onnx] not installed, skipping")
+        return
+
+    reference = _embed(load_embedding_model(settings.EMBEDDING_MODEL, backend="torch"))
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        onnx = _embed(load_embedding_model(
+            settings.EMBEDDING_MODEL, backend="onnx", cache_dir=cache_dir, fallback=False
+        ))
+        int8 = _embed(load_embedding_model(
+            settings.EMBEDDING_MODEL, backend="onnx-int8", cache_dir=cache_dir,
+            quantization_config=settings.EMBEDDING_ONNX_QUANTIZATION, fallback=False
+        ))
+
+    onnx_cosines = np.sum(reference * onnx, axis=1)
+    int8_cosines = np.sum(reference * int8, axis=1)
+
+    assert onnx_cosines.min() >= ONNX_MIN_COSINE, onnx_cosines
+    assert int8_cosines.min() >= ONNX_INT8_MIN_COSINE, int8_cosines
+    assert int8_cosines.mean() >= ONNX_INT8_MEAN_COSINE, int8_cosines
+
+
+if __name__ == "__main__":
+    test_unknown_backend_rejected()
+    test_export_dir_is_filesystem_safe()
+    test_onnx_parity_with_torch()
+    print("✓ Embedding backend tests passed")
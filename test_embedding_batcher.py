@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Test the micro-batching embedding service
+"""
+import asyncio
+import sys
+import os
+import threading
+
+import numpy as np
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from rag.batcher import EmbeddingBatcher
+
+
+class CountingModel:
+    """Fake model that records each encode call and the thread it ran on"""
+
+    def __init__(self):
+        self.calls = []
+        self.threads = set()
+
+    def encode(self, texts, convert_to_tensor=False):
+        self.calls.append(list(texts))
+        self.threads.add(threading.get_ident())
+        return np.array([[float(len(t)), 1.0] for t in texts])
+
+
+class BlockingModel(CountingModel):
+    """Fake model whose encode of "slow" blocks until released"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def encode(self, texts, convert_to_tensor=False):
+        if "slow" in texts:
+            self.started.set()
+            self.release.wait(5)
+        return super().encode(texts, convert_to_tensor)
+
+
+class FailingModel:
+    def encode(self, texts, convert_to_tensor=False):
+        raise RuntimeError("model exploded")
+
+
+def test_concurrent_queries_share_one_batch():
+    """Concurrent encodes are resolved from a single batched forward pass"""
+    model = CountingModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=32, max_wait_ms=20)
+
+    async def run():
+        texts = [f"query {'x' * i}" for i in range(10)]
+        results = await asyncio.gather(*(batcher.encode(t) for t in texts))
+        await batcher.close()
+        return texts, results
+
+    texts, results = asyncio.run(run())
+
+    assert len(model.calls) == 1
+    assert threading.get_ident() not in model.threads
+    for text, embedding in zip(texts, results):
+        assert embedding[0] == len(text)
+
+
+def test_max_batch_size_splits_batches():
+    """Batches never exceed max_batch_size"""
+    model = CountingModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=4, max_wait_ms=20)
+
+    async def run():
+        await asyncio.gather(*(batcher.encode(str(i)) for i in range(10)))
+        await batcher.close()
+
+    asyncio.run(run())
+    assert all(len(call) <= 4 for call in model.calls)
+    assert sum(len(call) for call in model.calls) == 10
+
+
+def test_errors_propagate_to_callers():
+    """A failed batch raises in every waiting caller"""
+    batcher = EmbeddingBatcher(FailingModel(), max_wait_ms=5)
+
+    async def run():
+        results = await asyncio.gather(batcher.encode("a"), batcher.encode("b"), return_exceptions=True)
+        await batcher.close()
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_close_fails_waiting_callers():
+    """Requests queued or being encoded when the batcher closes raise instead of hanging"""
+    model = BlockingModel()
+    batcher = EmbeddingBatcher(model, max_batch_size=1, max_wait_ms=0)
+
+    async def run():
+        waiting = [asyncio.ensure_future(batcher.encode(text)) for text in ("slow", "queued")]
+        while not model.started.is_set():
+            await asyncio.sleep(0.001)
+        await batcher.close()
+        model.release.set()
+        return await asyncio.wait_for(asyncio.gather(*waiting, return_exceptions=True), 1)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) and "closed" in str(r) for r in results)
+
+
+def test_loop_change_fails_callers_of_the_old_loop():
+    """Moving to another event loop fails the requests left on the old one"""
+    model = BlockingModel()
+    batcher = EmbeddingBatcher(model, max_wait_ms=0)
+    old_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=old_loop.run_forever)
+    thread.start()
+    try:
+        stranded = asyncio.run_coroutine_threadsafe(batcher.encode("slow"), old_loop)
+        assert model.started.wait(1)
+
+        embedding = asyncio.run(batcher.encode("new loop"))
+        assert embedding[0] == len("new loop")
+        try:
+            stranded.result(timeout=1)
+            raise AssertionError("request on the old loop should fail")
+        except RuntimeError as e:
+            assert "stopped" in str(e)
+    finally:
+        model.release.set()
+        old_loop.call_soon_threadsafe(old_loop.stop)
+        thread.join()
+        old_loop.close()
+
+
+if __name__ == "__main__":
+    test_concurrent_queries_share_one_batch()
+    test_max_batch_size_splits_batches()
+    test_errors_propagate_to_callers()
+    test_close_fails_waiting_callers()
+    test_loop_change_fails_callers_of_the_old_loop()
+    print("✓ Embedding batcher tests passed")
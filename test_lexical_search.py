@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test the BM25 lexical index and reciprocal-rank fusion
+"""
+import sys
+import os
+import tempfile
+
+import numpy as np
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from rag.lexical import BM25_FILE, BM25Index, reciprocal_rank_fusion, tokenize, verse_document
+
+VERSES = [
+    {"text": "Perform your duty without attachment to the fruits of action.", "word_meaning": "karma—action"},
+    {"text": "The mind is restless and difficult to control.", "transliteration": "chanchalam hi manah"},
+    {"text": "One whose wisdom is steady is called a sthitaprajna.", "meaning": "स्थितप्रज्ञ वह है"},
+    {"text": "Arjuna, give up the weakness of your heart and arise."},
+]
+
+
+def build():
+    return BM25Index.build([verse_document(v) for v in VERSES])
+
+
+def test_rare_terms_rank_first():
+    """Concrete terms find the verse that contains them"""
+    index = build()
+    indices, scores = index.search("what is sthitaprajna", 3)
+    assert indices[0] == 2
+    assert list(scores) == sorted(scores, reverse=True)
+
+    assert index.search("chanchalam", 3)[0][0] == 1
+    assert index.search("स्थितप्रज्ञ", 3)[0][0] == 2
+    assert len(index.search("quantum physics", 3)[0]) == 0
+
+
+def test_mask_and_roundtrip():
+    """Masks exclude documents and saved postings load back identically"""
+    index = build()
+    mask = np.array([True, True, False, True])
+    assert 2 not in index.search("sthitaprajna wisdom", 4, mask=mask)[0]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index.save(tmp)
+        loaded = BM25Index.load(tmp)
+        assert np.allclose(loaded.scores("arjuna heart"), index.scores("arjuna heart"))
+        assert os.listdir(tmp) == [BM25_FILE]
+
+
+def test_match_strength():
+    """Concrete queries score high, casual phrasing scores low"""
+    index = build()
+    assert index.match_strength("sthitaprajna") > 0.8
+    assert index.match_strength("arjuna heart") > 0.5
+    assert index.match_strength("my boss keeps giving me too much work lately") < 0.3
+    assert index.match_strength("") == 0.0
+
+
+def test_reciprocal_rank_fusion():
+    """Documents ranked well by both retrievers come first"""
+    ids, scores = reciprocal_rank_fusion([np.array([1, 2, 3]), np.array([3, 1, 4])], k=60)
+    assert list(ids[:2]) == [1, 3]
+    assert set(ids) == {1, 2, 3, 4}
+    assert tokenize("Yoga-of Action!") == ["yoga", "of", "action"]
+
+
+if __name__ == "__main__":
+    test_rare_terms_rank_first()
+    test_mask_and_roundtrip()
+    test_match_strength()
+    test_reciprocal_rank_fusion()
+    print("✓ Lexical search tests passed")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test the LLM backend abstraction and the offline mock backend
+"""
+import asyncio
+import sys
+import os
+import time
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+import llm.backend as backend_module
+import llm.formatter as formatter_module
+from config import settings
+from llm.backend import LLMBackend, MockBackend, MockLLMError, create_llm_backend
+from llm.formatter import QueryRefiner
+from llm.service import LLMService
+
+DOCS = [{"reference": "Bhagavad Gita 6.35", "text": "The mind is restless.", "scripture": "Bhagavad Gita",
+         "topic": "mind", "chapter": 6, "verse": 35, "score": 0.7}]
+
+
+def _with_mock(**options):
+    """Settings for a fresh mock backend; returns the originals to restore"""
+    backend_module._backends.clear()
+    names = ["LLM_BACKEND"] + [f"MOCK_LLM_{name.upper()}" for name in options]
+    original = {name: getattr(settings, name) for name in names}
+    settings.LLM_BACKEND = "mock"
+    for name, value in options.items():
+        setattr(settings, f"MOCK_LLM_{name.upper()}", value)
+    return original
+
+
+def _restore(original):
+    backend_module._backends.clear()
+    for name, value in original.items():
+        setattr(settings, name, value)
+
+
+def test_unknown_backend_raises():
+    try:
+        create_llm_backend("gpt-local")
+    except ValueError:
+        return
+    raise AssertionError("expected ValueError")
+
+
+def test_incomplete_backend_fails_when_built():
+    class GenerateOnly(LLMBackend):
+        async def generate(self, prompt, temperature, max_output_tokens, top_p=None):
+            return ""
+
+    try:
+        GenerateOnly()
+    except TypeError:
+        return
+    raise AssertionError("expected TypeError")
+
+
+def test_mock_latency_and_token_rate():
+    """Time to first token plus answer length at the token rate"""
+    backend = MockBackend(latency_ms=50, latency_sigma=0.0, tokens_per_second=0)
+    start = time.perf_counter()
+    asyncio.run(backend.generate("Hello", temperature=0.5, max_output_tokens=100))
+    assert 0.05 <= time.perf_counter() - start < 0.2
+
+    backend = MockBackend(latency_ms=0, tokens_per_second=1000)
+
+    async def stream():
+        chunks, arrivals, start = [], [], time.perf_counter()
+        async for chunk in backend.generate_stream("Source: Bhagavad Gita 6.35", 0.8, 1024):
+            chunks.append(chunk)
+            arrivals.append(time.perf_counter() - start)
+        return chunks, arrivals
+
+    chunks, arrivals = asyncio.run(stream())
+    text = "".join(chunks)
+    assert "Bhagavad Gita 6.35" in text and len(chunks) > 5
+    # ~4 chars per token at 1000 tokens/s
+    assert arrivals[-1] >= 0.8 * len(text) / 4 / 1000
+    assert backend.get_stats() == {"calls": 1, "errors": 0}
+
+
+def test_clients_share_the_mock_backend():
+    """LLMService and the refiner run offline on the mock, with no API key"""
+    original = _with_mock(latency_ms=0.0, tokens_per_second=0.0, error_rate=0.0)
+    original_refiner = formatter_module._refiner
+    formatter_module._refiner = None
+    try:
+        service = LLMService(api_key="")
+        refiner = formatter_module.get_refiner("")
+        assert service.available and refiner.available
+        assert service.backend is refiner.backend
+
+        answer, references = asyncio.run(service.generate_planned_response("Why is my mind restless?", DOCS))
+        assert "Bhagavad Gita 6.35" in answer and "CITATIONS" not in answer
+        assert references == ["6.35"]
+        assert asyncio.run(refiner.refine_query("Why is my mind so restless all day?")) != "Why is my mind so restless all day?"
+    finally:
+        formatter_module._refiner = original_refiner
+        _restore(original)
+
+
+def test_mock_errors_fall_back():
+    """Simulated upstream errors take the same fallback paths as Gemini errors"""
+    original = _with_mock(latency_ms=0.0, tokens_per_second=0.0, error_rate=1.0)
+    try:
+        service = LLMService(api_key="")
+        answer = asyncio.run(service.generate_response("Why is my mind restless?", DOCS))
+        assert service.is_fallback_response(answer, "Why is my mind restless?", DOCS, "en")
+
+        refiner = QueryRefiner(api_key="")
+        assert asyncio.run(refiner.refine_query("Why is my mind so restless?")) == "Why is my mind so restless?"
+
+        # The scheduler has retried and opened its circuit by now; the mock itself raises
+        try:
+            asyncio.run(service.backend.backend.generate("Hello", 0.5, 10))
+        except MockLLMError:
+            pass
+        else:
+            raise AssertionError("expected MockLLMError")
+    finally:
+        _restore(original)
+
+
+if __name__ == "__main__":
+    test_unknown_backend_raises()
+    test_incomplete_backend_fails_when_built()
+    test_mock_latency_and_token_rate()
+    test_clients_share_the_mock_backend()
+    test_mock_errors_fall_back()
+    print("✓ LLM backend tests passed")
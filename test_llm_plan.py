@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test the single-call LLM plan against the refine/generate/format chain
+"""
+import asyncio
+import random
+import sys
+import os
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+import pytest
+
+from config import settings
+from llm.service import CitationTrailer, split_citations
+from llm.trace import plan_stats
+
+CALL_SECONDS = 0.02
+
+ANSWER = "I hear you.\n\nIn Bhagavad Gita 2.47, Krishna says: \"Act.\"\n\nWhat will you do?"
+PLANNED = ANSWER + "\n\n**CITATIONS:** 2.47, 6.5"
+
+DOCS = [
+    {"reference": "Bhagavad Gita 6.35", "text": "...", "scripture": "Bhagavad Gita", "chapter": 6, "verse": 35, "score": 0.6},
+    {"reference": "Bhagavad Gita 2.47", "text": "...", "scripture": "Bhagavad Gita", "chapter": 2, "verse": 47, "score": 0.5},
+]
+
+
+@pytest.fixture
+def run_plan(stub_pipeline, fake_llm, install_refiner, monkeypatch):
+    """Answer one question with the given LLM plan; the chain refines and reformats"""
+    fake_llm(answer=ANSWER, citations=["2.47", "6.5"], seconds=CALL_SECONDS, format_call=True)
+    install_refiner(seconds=CALL_SECONDS)
+    monkeypatch.setattr(settings, "HYBRID_SEARCH", False)
+
+    def run(plan, stream=False):
+        monkeypatch.setattr(settings, "LLM_PLAN", plan)
+        pipeline = stub_pipeline(docs=DOCS)
+        query = "Why should I not worry about results?"
+
+        async def collect():
+            return "".join([chunk async for chunk in pipeline.query_stream(query)])
+
+        return asyncio.run(collect() if stream else pipeline.query(query))
+
+    return run
+
+
+def test_split_citations():
+    answer, references = split_citations(PLANNED)
+    assert answer == ANSWER
+    assert references == ["2.47", "6.5"]
+    assert split_citations("Answer.\nCITATIONS: none") == ("Answer.", [])
+    assert split_citations("No trailer.") == ("No trailer.", [])
+
+
+def test_trailer_matches_split_for_any_chunking():
+    """The streamed answer never shows the CITATIONS line, however it is chunked"""
+    expected, references = split_citations(PLANNED)
+    for seed in range(100):
+        rng = random.Random(seed)
+        trailer = CitationTrailer()
+        out, i = "", 0
+        while i < len(PLANNED):
+            size = rng.randint(1, 6)
+            out += trailer.feed(PLANNED[i:i + size])
+            i += size
+        out += trailer.flush()
+        assert out == expected and trailer.references == references, seed
+
+    # A possible marker start is only held until the next chunk rules it out
+    trailer = CitationTrailer()
+    assert trailer.feed("Om CITA") == "Om"
+    assert trailer.feed("TION peace") == " CITATION peace"
+    assert trailer.flush() == "" and trailer.references == []
+
+
+def test_single_plan_makes_one_call(run_plan):
+    """The chain makes refine + generate + format calls; the single plan one call"""
+    plan_stats.clear()
+    chain = run_plan("chain")
+    single = run_plan("single")
+
+    assert [call["kind"] for call in chain["llm"]["by_call"]] == ["refine", "generate", "format"]
+    assert [call["kind"] for call in single["llm"]["by_call"]] == ["generate"]
+    assert single["llm"]["llm_seconds"] < chain["llm"]["llm_seconds"]
+
+    # Citations are the verses the answer quoted
+    assert single["answer"] == ANSWER
+    assert [c["reference"] for c in single["citations"]] == ["Bhagavad Gita 2.47"]
+    assert len(chain["citations"]) == 2
+
+    stats = plan_stats.get_stats()
+    assert stats["chain"]["calls_per_request"] == 3 and stats["single"]["calls_per_request"] == 1
+
+
+def test_single_plan_stream_hides_citations(run_plan):
+    streamed = run_plan("single", stream=True)
+    assert streamed == ANSWER
+    assert plan_stats.get_stats()["single"]["calls_by_kind"]["generate_stream"] >= 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Test the LLM call scheduler: concurrency cap, deadlines, retries, hedging and the circuit breaker
+"""
+import asyncio
+import sys
+import os
+import time
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from llm.backend import LLMBackend, MockBackend, MockLLMError
+from llm.scheduler import CircuitBreaker, CircuitOpenError, LLMScheduler, LLMTimeoutError
+from llm.service import LLMService
+
+DOCS = [{"reference": "Bhagavad Gita 6.35", "text": "The mind is restless.", "scripture": "Bhagavad Gita",
+         "topic": "mind", "chapter": 6, "verse": 35, "score": 0.7}]
+
+
+class ScriptedBackend(LLMBackend):
+    """Backend whose calls take (and fail) as scripted, in call order"""
+
+    name = "scripted"
+    available = True
+
+    def __init__(self, delays, failures=()):
+        self.delays = list(delays)
+        self.failures = set(failures)
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+        self.closed = 0
+
+    async def _start(self):
+        call = self.calls
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delays[min(call, len(self.delays) - 1)])
+        finally:
+            self.in_flight -= 1
+        if call in self.failures:
+            raise MockLLMError(f"call {call} failed")
+        return call
+
+    async def generate(self, prompt, temperature, max_output_tokens, top_p=None) -> str:
+        return f"answer {await self._start()}"
+
+    async def generate_stream(self, prompt, temperature, max_output_tokens, top_p=None):
+        try:
+            call = await self._start()
+            for word in ("answer", " ", str(call)):
+                yield word
+        finally:
+            self.closed += 1
+
+
+class GatedBackend(ScriptedBackend):
+    """Backend whose calls from `gated` on wait until the next call starts, so two finish together"""
+
+    def __init__(self, gated):
+        super().__init__([0.0])
+        self.gated = gated
+        self.gate = None
+
+    async def _start(self):
+        call = self.calls
+        if call > self.gated:
+            self.gate.set()
+        elif call == self.gated:
+            self.gate = asyncio.Event()
+            self.calls += 1
+            await self.gate.wait()
+            return call
+        return await super()._start()
+
+
+def test_concurrency_is_capped():
+    backend = ScriptedBackend([0.02])
+    scheduler = LLMScheduler(backend, max_concurrency=3)
+
+    async def run():
+        return await asyncio.gather(*(scheduler.generate("p", 0.5, 10) for _ in range(10)))
+
+    assert len(asyncio.run(run())) == 10
+    assert backend.peak == 3
+    assert scheduler.in_flight == 0
+
+
+def test_retries_then_succeeds():
+    backend = ScriptedBackend([0.0], failures={0, 1})
+    scheduler = LLMScheduler(backend, retries=2, backoff_seconds=0.001)
+    assert asyncio.run(scheduler.generate("p", 0.5, 10)) == "answer 2"
+    assert scheduler.get_stats()["retries"] == 2
+    assert scheduler.breaker.state == "closed"
+
+
+def test_deadline_times_out():
+    backend = ScriptedBackend([1.0])
+    scheduler = LLMScheduler(backend, deadline_seconds=0.05, retries=1, backoff_seconds=0.001)
+    start = time.perf_counter()
+    try:
+        asyncio.run(scheduler.generate("p", 0.5, 10))
+    except LLMTimeoutError:
+        pass
+    else:
+        raise AssertionError("expected LLMTimeoutError")
+    assert time.perf_counter() - start < 0.5
+    assert scheduler.get_stats()["timeouts"] == 2
+
+
+def test_hedged_request_wins_over_a_slow_one():
+    """Once latency samples exist, a call slower than the p95 is duplicated"""
+    backend = ScriptedBackend([0.01] * 5 + [1.0, 0.01])
+    scheduler = LLMScheduler(backend, hedge=True, hedge_min_samples=5)
+
+    async def run():
+        for _ in range(5):
+            await scheduler.generate("p", 0.5, 10)
+        start = time.perf_counter()
+        answer = await scheduler.generate("p", 0.5, 10)
+        return answer, time.perf_counter() - start
+
+    answer, seconds = asyncio.run(run())
+    assert answer == "answer 6" and seconds < 0.5
+    stats = scheduler.get_stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_hedged_stream_closes_the_loser():
+    backend = ScriptedBackend([0.01] * 5 + [0.3, 0.01])
+    scheduler = LLMScheduler(backend, hedge=True, hedge_min_samples=5)
+
+    async def collect():
+        return "".join([chunk async for chunk in scheduler.generate_stream("p", 0.5, 10)])
+
+    async def run():
+        for _ in range(5):
+            await collect()
+        text = await collect()
+        await asyncio.sleep(0.4)
+        return text
+
+    assert asyncio.run(run()) == "answer 6"
+    assert backend.closed == 7 and scheduler.in_flight == 0
+    assert scheduler.get_stats()["hedge_wins"] == 1
+
+
+def test_hedged_stream_releases_a_simultaneous_winner():
+    """When original and hedge both answer in the same round, the unused stream is closed and its slot freed"""
+    backend = GatedBackend(gated=5)
+    scheduler = LLMScheduler(backend, max_concurrency=2, hedge=True, hedge_min_samples=5)
+
+    async def collect():
+        return "".join([chunk async for chunk in scheduler.generate_stream("p", 0.5, 10)])
+
+    async def run():
+        for _ in range(5):
+            await collect()
+        text = await collect()
+        await asyncio.sleep(0.01)
+        return text, scheduler._semaphore()._value
+
+    text, free_slots = asyncio.run(run())
+    assert text == "answer 5" and scheduler.get_stats()["hedges"] == 1
+    assert scheduler.in_flight == 0 and free_slots == 2 and backend.closed == 7
+
+
+def test_breaker_counts_calls_not_retries():
+    """A call that fails all its retries is one consecutive failure"""
+    breaker = CircuitBreaker(failures=3, reset_seconds=60)
+    backend = ScriptedBackend([0.0], failures=set(range(6)))
+    scheduler = LLMScheduler(backend, retries=2, backoff_seconds=0.001, breaker=breaker)
+
+    for _ in range(2):
+        try:
+            asyncio.run(scheduler.generate("p", 0.5, 10))
+        except MockLLMError:
+            pass
+    assert backend.calls == 6 and breaker.consecutive_failures == 2
+    assert not scheduler.circuit_open
+
+
+def test_circuit_opens_and_recovers():
+    breaker = CircuitBreaker(failures=3, reset_seconds=0.05)
+    backend = ScriptedBackend([0.0], failures={0, 1, 2})
+    scheduler = LLMScheduler(backend, retries=0, breaker=breaker)
+
+    async def call():
+        return await scheduler.generate("p", 0.5, 10)
+
+    for _ in range(3):
+        try:
+            asyncio.run(call())
+        except MockLLMError:
+            pass
+    assert scheduler.circuit_open
+
+    # Rejected without reaching the backend
+    try:
+        asyncio.run(call())
+    except CircuitOpenError:
+        pass
+    else:
+        raise AssertionError("expected CircuitOpenError")
+    assert backend.calls == 3
+
+    # After the reset time one trial call goes through and closes the circuit
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert asyncio.run(call()) == "answer 3"
+    assert breaker.state == "closed"
+
+
+def test_open_circuit_falls_back_instantly():
+    """LLMService answers from the fallback template without waiting on the upstream"""
+    mock = MockBackend(latency_ms=200, latency_sigma=0.0, tokens_per_second=0, error_rate=1.0)
+    scheduler = LLMScheduler(mock, retries=0, breaker=CircuitBreaker(failures=2, reset_seconds=60))
+    service = LLMService(api_key="")
+    service.backend, service.available, service.formatter = scheduler, True, None
+
+    query = "Why is my mind restless?"
+    for _ in range(2):
+        answer = asyncio.run(service.generate_response(query, DOCS))
+        assert service.is_fallback_response(answer, query, DOCS, "en")
+    assert scheduler.circuit_open
+
+    start = time.perf_counter()
+    answer = asyncio.run(service.generate_response(query, DOCS))
+    assert time.perf_counter() - start < 0.05
+    assert service.is_fallback_response(answer, query, DOCS, "en")
+    assert mock.calls == 2
+
+
+if __name__ == "__main__":
+    test_concurrency_is_capped()
+    test_retries_then_succeeds()
+    test_deadline_times_out()
+    test_hedged_request_wins_over_a_slow_one()
+    test_hedged_stream_closes_the_loser()
+    test_hedged_stream_releases_a_simultaneous_winner()
+    test_breaker_counts_calls_not_retries()
+    test_circuit_opens_and_recovers()
+    test_open_circuit_falls_back_instantly()
+    print("✓ LLM scheduler tests passed")
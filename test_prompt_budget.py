@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test token-budgeted prompt assembly: estimates, verse and history fitting
+"""
+import sys
+import os
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from config import settings
+from llm.prompt import estimate_tokens, fit_docs, fit_history, truncate_to_tokens
+from llm.service import LLMService
+from llm.trace import llm_trace
+
+
+def _doc(chapter, verse, score, words=40):
+    return {
+        "scripture": "Bhagavad Gita", "reference": f"Bhagavad Gita {chapter}.{verse}",
+        "chapter": chapter, "verse": verse, "topic": "duty", "score": score,
+        "text": " ".join(["action"] * words)
+    }
+
+
+def test_estimate_and_truncate():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("You have a right") == 4
+    # Digits and punctuation count one each
+    assert estimate_tokens("2.47") == 4
+    assert estimate_tokens("कर्मण्येवाधिकारस्ते") > 3
+
+    text = " ".join(f"word{i}" for i in range(100))
+    cut = truncate_to_tokens(text, 50)
+    assert cut.endswith("...") and estimate_tokens(cut) <= 50 and text.startswith(cut[:-3])
+    assert truncate_to_tokens("short", 50) == "short"
+
+
+def test_lowest_scored_docs_go_first():
+    docs = [_doc(2, 47, 0.9), _doc(6, 35, 0.2), _doc(12, 4, 0.6)]
+    render = lambda doc: f"- Verse: \"{doc['text']}\""
+    one = estimate_tokens(render(docs[0]))
+
+    kept, dropped, truncated = fit_docs(docs, render, 2 * one, min_doc_tokens=1000)
+    # Original order kept, lowest score dropped
+    assert [doc["verse"] for doc in kept] == [47, 4] and (dropped, truncated) == (1, 0)
+
+    kept, dropped, truncated = fit_docs(docs, render, 2 * one + 20, min_doc_tokens=10)
+    assert len(kept) == 3 and (dropped, truncated) == (0, 1)
+    assert kept[1]["text"].endswith("...") and docs[1]["text"].endswith("action")
+
+
+def test_history_keeps_newest_messages_and_summary():
+    history = [{"role": "summary", "content": "The user said: \"I lost my job.\""}] + [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} " * 10} for i in range(8)
+    ]
+    kept, dropped = fit_history(history, 70)
+    assert [msg["content"].split()[1] for msg in kept] == ["6", "7"] and dropped == 7
+
+    # The summary fills what the newest messages leave, cut down
+    kept, dropped = fit_history(history, 78)
+    assert kept[0]["role"] == "summary" and kept[0]["content"].endswith("...") and dropped == 6
+
+    kept, _ = fit_history(history, 1000)
+    assert kept[0]["role"] == "summary" and len(kept) == 7
+    assert fit_history(None, 100) == ([], 0)
+
+
+def test_prompt_stays_within_budget_and_is_reported():
+    service = LLMService(api_key="")
+    docs = [_doc(2, i, 1.0 - i / 10, words=300) for i in range(5)]
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": "Tell me more. " * 80} for i in range(6)]
+
+    with llm_trace("chain") as trace:
+        prompt = service._assemble_prompt("How do I act without attachment?", docs, "en", history)
+
+    tokens = trace.summary()["prompt_tokens"][0]
+    assert tokens["total"] == estimate_tokens(prompt) <= settings.LLM_PROMPT_TOKEN_BUDGET
+    assert tokens["context"] <= settings.LLM_PROMPT_CONTEXT_TOKENS
+    assert tokens["history"] <= settings.LLM_PROMPT_HISTORY_TOKENS
+    assert tokens["docs_dropped"] > 0 and tokens["history_dropped"] > 0
+    # Best verse survives, question and instructions are whole
+    assert "Bhagavad Gita 2.0" in prompt and "How do I act without attachment?" in prompt
+
+
+def test_small_prompt_is_unchanged():
+    service = LLMService(api_key="")
+    docs = [_doc(2, 47, 0.9, words=20)]
+    history = [{"role": "user", "content": "Hello"}, {"role": "assistant", "content": "Namaste"}]
+    expected = service._build_prompt("Why act?", service._build_context(docs), "en", history)
+    assert service._assemble_prompt("Why act?", docs, "en", history) == expected
+
+
+if __name__ == "__main__":
+    test_estimate_and_truncate()
+    test_lowest_scored_docs_go_first()
+    test_history_keeps_newest_messages_and_summary()
+    test_prompt_stays_within_budget_and_is_reported()
+    test_small_prompt_is_unchanged()
+    print("✓ Prompt budget tests passed")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test int8 / binary quantized search with exact float rerank
+"""
+import sys
+import os
+import tempfile
+
+import numpy as np
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from rag.quantization import QuantizedIndex, quantize_int8, binarize, hamming_distances, save_quantized
+from rag.similarity import SimilarityIndex
+
+
+def corpus(rng, n=3000, dim=64, clusters=30):
+    centers = rng.standard_normal((clusters, dim))
+    return centers[rng.integers(0, clusters, n)] + 0.4 * rng.standard_normal((n, dim))
+
+
+def recall(exact, approx, queries, k=10):
+    hits = sum(len(set(exact.search(q, k)[0]) & set(approx.search(q, k)[0])) for q in queries)
+    return hits / (k * len(queries))
+
+
+def test_int8_roundtrip_error_is_small():
+    """Dequantized int8 rows stay close to the originals"""
+    matrix = SimilarityIndex(np.random.default_rng(0).standard_normal((100, 64))).matrix
+    codes, scales = quantize_int8(matrix)
+    assert codes.dtype == np.int8
+    assert np.abs(codes * scales[:, None] - matrix).max() < 0.01
+
+
+def test_hamming_distance():
+    """Packed sign codes give bit-level Hamming distances"""
+    a = binarize(np.array([[1.0] * 8 + [-1.0] * 8]))
+    b = binarize(np.array([[1.0] * 4 + [-1.0] * 12]))
+    assert hamming_distances(a, b[0])[0] == 4
+
+
+def test_two_stage_search_recall():
+    """Prefilter + exact rerank recovers the exact top-k with exact scores"""
+    rng = np.random.default_rng(1)
+    rows = corpus(rng)
+    exact = SimilarityIndex(rows)
+    # Queries close to a stored verse, as a relevant question would be
+    queries = rows[:20] + 0.3 * rng.standard_normal((20, rows.shape[1]))
+
+    for mode, min_recall in (("int8", 0.98), ("binary", 0.9)):
+        index = QuantizedIndex.build(exact.matrix, mode, rerank_factor=10)
+        assert recall(exact, index, queries) >= min_recall
+
+        found, scores = index.search(queries[0], 5)
+        assert np.allclose(scores, exact.scores(queries[0])[found], atol=1e-5)
+
+
+def test_masked_search_and_load():
+    """Masks restrict candidates and codes load back memory-mapped"""
+    rng = np.random.default_rng(2)
+    exact = SimilarityIndex(corpus(rng, n=1000))
+    mask = np.zeros(1000, dtype=bool)
+    mask[500:] = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        save_quantized(tmp, exact.matrix)
+        for mode in ("int8", "binary"):
+            index = QuantizedIndex.load(tmp, exact.matrix, mode)
+            assert isinstance(index.codes, np.memmap)
+            found, _ = index.search(rng.standard_normal(64), 5, mask=mask)
+            assert len(found) == 5 and (found >= 500).all()
+            del index
+
+        # Scales from a smaller build don't match the codes and the corpus
+        np.save(os.path.join(tmp, "scales_int8.npy"), quantize_int8(exact.matrix[:900])[1])
+        for mode, matrix in (("int8", exact.matrix), ("binary", exact.matrix[:900])):
+            try:
+                QuantizedIndex.load(tmp, matrix, mode)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"Expected ValueError for mismatched {mode} codes")
+
+
+if __name__ == "__main__":
+    test_int8_roundtrip_error_is_small()
+    test_hamming_distance()
+    test_two_stage_search_recall()
+    test_masked_search_and_load()
+    print("✓ Quantized search tests passed")
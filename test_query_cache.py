@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test the query embedding and search-result caches
+"""
+import asyncio
+import sys
+import os
+import time
+
+import numpy as np
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from rag.cache import LRUCache, QueryCache, model_text_key, normalize_query
+
+
+def test_lru_evicts_by_memory():
+    """Oldest entries are evicted once the byte budget is exceeded"""
+    vector = np.zeros(256, dtype=np.float32)  # ~1 KB each
+    cache = LRUCache(max_bytes=3500)
+
+    for key in ("a", "b", "c"):
+        cache.set(key, vector.copy())
+    cache.get("a")  # refresh "a" so "b" is the oldest
+    cache.set("d", vector.copy())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.evictions >= 1
+    assert cache.current_bytes <= cache.max_bytes
+
+
+def test_ttl_expiry():
+    """Expired entries count as misses"""
+    cache = LRUCache(max_bytes=10_000, ttl_seconds=0.01)
+    cache.set("k", "v")
+    assert cache.get("k") == "v"
+    time.sleep(0.02)
+    assert cache.get("k") is None
+    assert cache.get_stats()["misses"] == 1
+
+
+def test_query_cache_normalizes_and_invalidates():
+    """Embedding keys ignore whitespace but keep case; invalidate clears everything"""
+    cache = QueryCache(embedding_max_bytes=1 << 20, results_max_bytes=1 << 20)
+    cache.set_embedding("How to  control the mind", np.ones(4))
+    assert normalize_query("  how to control the MIND ") == "how to control the mind"
+    assert model_text_key("  How to control\tthe mind ") == "How to control the mind"
+    assert cache.get_embedding(" How to control the mind") is not None
+    assert cache.get_embedding("how to control the mind") is None
+
+    key = ("how to control the mind", None, "en", None, None, 5)
+    cache.set_results(key, [{"reference": "Bhagavad Gita 6.35", "score": 0.8}])
+    results = cache.get_results(key)
+    results[0]["score"] = 0.0
+    assert cache.get_results(key)[0]["score"] == 0.8
+
+    cache.invalidate()
+    assert cache.get_embedding("How to control the mind") is None
+    assert cache.get_results(key) is None
+    assert cache.get_stats()["results"]["hits"] == 2
+
+
+class RecordingBatcher:
+    """Embedding batcher that records the texts it encodes"""
+
+    def __init__(self):
+        self.texts = []
+
+    async def encode(self, text):
+        self.texts.append(text)
+        return np.full(4, float(len(self.texts)))
+
+
+def test_pipeline_embeds_the_cached_key():
+    """The model sees the query's own casing; only whitespace variants share an embedding"""
+    from rag.pipeline import RAGPipeline
+
+    pipeline = RAGPipeline()
+    pipeline.embedding_batcher = RecordingBatcher()
+
+    async def embed():
+        texts = ("What did Krishna  tell Arjuna?", "What did Krishna tell Arjuna? ", "what did krishna tell arjuna?")
+        return [await pipeline._embed_query(text) for text in texts]
+
+    first, second, lowercase = asyncio.run(embed())
+    assert pipeline.embedding_batcher.texts == ["What did Krishna  tell Arjuna?", "what did krishna tell arjuna?"]
+    assert np.array_equal(first, second) and not np.array_equal(first, lowercase)
+
+
+if __name__ == "__main__":
+    test_lru_evicts_by_memory()
+    test_ttl_expiry()
+    test_query_cache_normalizes_and_invalidates()
+    test_pipeline_embeds_the_cached_key()
+    print("✓ Query cache tests passed")
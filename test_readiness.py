@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test concurrent startup, warm-up and the /ready endpoint
+"""
+import asyncio
+import sys
+import os
+import time
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from config import settings
+from rag.pipeline import RAGPipeline, _DummyEmbeddingModel
+
+LOAD_SECONDS = 0.3
+
+
+class SlowPipeline(RAGPipeline):
+    """Pipeline whose model loads take a fixed time"""
+
+    def _load_embedding_model(self):
+        time.sleep(LOAD_SECONDS)
+        self.embedding_model = _DummyEmbeddingModel(dim=8)
+
+    def _load_reranker(self):
+        time.sleep(LOAD_SECONDS)
+
+
+def test_models_load_concurrently():
+    """Embedding and rerank models load on threads at the same time"""
+    pipeline = SlowPipeline()
+
+    async def run():
+        start = time.perf_counter()
+        await pipeline.initialize()
+        elapsed = time.perf_counter() - start
+        await pipeline.warm_up()
+        await pipeline.close()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    assert pipeline.initialized
+    assert elapsed < 2 * LOAD_SECONDS, f"initialize took {elapsed:.2f}s, loads ran sequentially"
+    assert "vector_store" in pipeline.init_timings and "warm_up" in pipeline.init_timings
+    # Warm-up must not leave synthetic entries in the query cache
+    assert pipeline.query_cache.get_stats()["embeddings"]["entries"] == 0
+
+
+def test_ready_flips_after_warm_up():
+    """/health is live right away, /ready answers 200 once warm-up is done"""
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as client:
+        assert client.get("/health").status_code == 200
+
+        deadline = time.time() + 30
+        response = client.get("/ready")
+        while response.status_code != 200 and time.time() < deadline:
+            time.sleep(0.05)
+            response = client.get("/ready")
+
+        body = response.json()
+        assert response.status_code == 200 and body["ready"]
+        assert {"rag", "asr", "tts", "llm", "total"} <= set(body["init_seconds"])
+        assert "rag" in body["warmup_seconds"]
+        assert "embedding_model" in body["rag_init_seconds"]
+
+
+if __name__ == "__main__":
+    test_models_load_concurrently()
+    test_ready_flips_after_warm_up()
+    print("✓ Readiness tests passed")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test singleflight coalescing of identical concurrent queries and streams
+"""
+import asyncio
+import sys
+import os
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+import pytest
+
+from config import settings
+from conftest import ANSWER
+from rag.singleflight import SingleFlight
+
+
+@pytest.fixture
+def pipeline(stub_pipeline, monkeypatch):
+    """Stub pipeline streaming incrementally"""
+    monkeypatch.setattr(settings, "STREAM_MODE", "incremental")
+    return stub_pipeline()
+
+
+@pytest.fixture
+def llm(fake_llm):
+    """Slow fake LLM"""
+    return fake_llm(seconds=0.05, token_seconds=0.01)
+
+
+def test_identical_queries_share_one_answer(pipeline, llm):
+    async def run():
+        queries = ["Why do I worry about results?", "  why do I worry about RESULTS? "] * 5
+        return await asyncio.gather(*(pipeline.query(query) for query in queries))
+
+    results = asyncio.run(run())
+    assert len(llm.calls) == 1 and len(pipeline.searched) == 1
+    assert all(result["answer"] == ANSWER for result in results)
+    # Each caller gets its own result dict with its own LLM accounting
+    assert len({id(result) for result in results}) == len(results)
+    assert sorted(result["llm"]["calls"] for result in results) == [0] * 9 + [1]
+    assert pipeline.inflight.get_stats()["coalesced"] == 9
+
+
+def test_different_keys_are_not_coalesced(pipeline, llm):
+    history = [{"role": "user", "content": "Hello"}]
+
+    async def run():
+        return await asyncio.gather(
+            pipeline.query("Why do I worry?"),
+            pipeline.query("Why do I worry?", language="hi"),
+            pipeline.query("Why do I worry?", include_citations=False),
+            pipeline.query("Why do I worry?", conversation_history=history),
+            pipeline.query("Why do I worry?", conversation_history=history),
+        )
+
+    asyncio.run(run())
+    assert len(llm.calls) == 5
+
+
+async def _collect(stream):
+    return "".join([chunk async for chunk in stream])
+
+
+def test_streams_fan_out_with_replay(pipeline, llm):
+    """A stream that joins late still receives the whole answer"""
+    async def collect(delay):
+        await asyncio.sleep(delay)
+        return await _collect(pipeline.query_stream("Why do I worry about results?"))
+
+    async def run():
+        return await asyncio.gather(*(collect(delay) for delay in (0.0, 0.0, 0.0, 0.05, 0.1)))
+
+    outputs = asyncio.run(run())
+    assert len(llm.calls) == 1 and len(pipeline.searched) == 1
+    assert len(set(outputs)) == 1 and outputs[0].strip() == ANSWER
+
+
+def test_leader_disconnect_does_not_stop_followers(pipeline, llm):
+    async def run():
+        leader = pipeline.query_stream("Why do I worry?")
+        await leader.__anext__()
+        follower = asyncio.ensure_future(_collect(pipeline.query_stream("Why do I worry?")))
+        await asyncio.sleep(0.02)
+        await leader.aclose()
+        return await follower
+
+    text = asyncio.run(run())
+    assert len(llm.calls) == 1 and text.strip() == ANSWER
+
+
+def test_errors_reach_every_caller():
+    flight = SingleFlight()
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def run():
+        return await asyncio.gather(*(flight.do("key", failing) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.get_stats()["in_flight"] == 0
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
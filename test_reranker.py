@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test the cross-encoder rerank stage
+"""
+import asyncio
+import sys
+import os
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from rag.rerank import Reranker
+
+DOCS = [
+    {"reference": "Bhagavad Gita 2.47", "text": "You have a right to perform your duties"},
+    {"reference": "Bhagavad Gita 6.35", "text": "The restless mind is curbed by practice"},
+    {"reference": "Bhagavad Gita 18.66", "text": "Abandon all dharmas and surrender unto Me"},
+    {"reference": "Bhagavad Gita 6.34", "text": "The mind is restless, turbulent and strong"},
+]
+
+
+class KeywordCrossEncoder:
+    """Fake cross-encoder: scores pairs by shared words and records each batch"""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32):
+        self.batches.append(len(pairs))
+        return [len(set(q.lower().split()) & set(t.lower().split())) for q, t in pairs]
+
+
+def test_reranks_and_truncates_in_one_batch():
+    """All pairs are scored in one forward pass and only top_k survive"""
+    model = KeywordCrossEncoder()
+    reranker = Reranker("fake", model=model)
+
+    ranked = asyncio.run(reranker.rerank("how to calm the restless mind", DOCS, 2))
+
+    assert model.batches == [4]
+    assert [d["reference"] for d in ranked] == ["Bhagavad Gita 6.35", "Bhagavad Gita 6.34"]
+    assert all("rerank_score" in d for d in ranked)
+
+
+def test_pair_scores_are_cached():
+    """A repeated question is reranked without another forward pass"""
+    model = KeywordCrossEncoder()
+    reranker = Reranker("fake", model=model)
+
+    asyncio.run(reranker.rerank("restless mind", DOCS, 3))
+    asyncio.run(reranker.rerank(" restless  mind", DOCS, 3))
+
+    assert model.batches == [4]
+    assert reranker.get_stats()["hits"] == 4
+
+
+def test_without_model_keeps_retrieval_order():
+    """Without a cross-encoder the stage just truncates"""
+    reranker = Reranker("missing")
+    ranked = asyncio.run(reranker.rerank("anything", DOCS, 3))
+    assert ranked == DOCS[:3]
+
+
+if __name__ == "__main__":
+    test_reranks_and_truncates_in_one_batch()
+    test_pair_scores_are_cached()
+    test_without_model_keeps_retrieval_order()
+    print("✓ Reranker tests passed")
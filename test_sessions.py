@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Test server-side conversation sessions: compaction, SQLite spill and verse reuse
+"""
+import asyncio
+import sys
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pytest
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from config import settings
+from conftest import StubPipeline
+from llm.service import LLMService
+from rag.references import build_verse_index
+from rag.sessions import Session, SessionStore
+
+VERSES = [
+    {"reference": "Bhagavad Gita 2.47", "text": "You have a right to your actions.", "scripture": "Bhagavad Gita",
+     "chapter": 2, "verse": 47},
+    {"reference": "Bhagavad Gita 6.35", "text": "The mind is restless.", "scripture": "Bhagavad Gita",
+     "chapter": 6, "verse": 35},
+    {"reference": "Bhagavad Gita 12.4", "text": "Equal-minded everywhere.", "scripture": "Bhagavad Gita",
+     "chapter": 12, "verse": 4},
+]
+EMBEDDINGS = np.eye(3, 8, dtype=np.float32)
+
+
+def test_old_turns_are_compacted():
+    session = Session("s")
+    for turn in range(10):
+        session.remember([VERSES[turn % 3]], [None])
+        session.add_turn(
+            f"Question {turn} is long. It has a second sentence.",
+            f"In Bhagavad Gita {VERSES[turn % 3]['chapter']}.{VERSES[turn % 3]['verse']}, Krishna says...",
+            recent_messages=4, summary_max_chars=200
+        )
+
+    history = session.history()
+    assert history[0]["role"] == "summary"
+    assert [msg["content"] for msg in history[1:] if msg["role"] == "user"] == [
+        "Question 8 is long. It has a second sentence.", "Question 9 is long. It has a second sentence."
+    ]
+    # Rolling: bounded, newest compacted turns kept, only first sentences
+    summary = history[0]["content"]
+    assert len(summary) <= 200 and "Question 7 is long.\"" in summary and "second sentence" not in summary
+    assert session.discussed == ["2.47", "6.35", "12.4"]
+
+
+def test_discussed_needs_an_exact_mention():
+    session = Session("s")
+    session.remember([VERSES[0], VERSES[2]], [None, None])
+    session.add_turn("Tell me about 12.4", "Verse 12.47 is not 2.4, but 12.4 is.")
+    assert session.discussed == ["12.4"]
+
+
+def test_sessions_spill_to_sqlite_and_restore():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+        store = SessionStore(max_sessions=2, path=path)
+        for name in ("a", "b", "c"):
+            session = store.get_or_create(name)
+            session.remember([VERSES[0]], [EMBEDDINGS[0]])
+            session.add_turn(f"Hello from {name}", "In Bhagavad Gita 2.47...")
+        assert len(store) == 2 and store.get_stats()["spilled"] == 1
+
+        restored = store.get("a")
+        assert restored.messages[0]["content"] == "Hello from a" and restored.discussed == ["2.47"]
+        assert np.array_equal(restored.verses["2.47"][1], EMBEDDINGS[0])
+
+        # All sessions survive a restart
+        store.close()
+        reopened = SessionStore(path=path)
+        assert {name for name in "abc" if reopened.get(name) is not None} == {"a", "b", "c"}
+        assert reopened.delete("b") and reopened.get("b") is None
+        reopened.close()
+
+
+def test_async_store_uses_worker_threads(monkeypatch):
+    """Requests restore, spill and delete sessions without blocking the event loop"""
+    threads = []
+    for name in ("_restore", "_spill", "_delete_row"):
+        blocking = getattr(SessionStore, name)
+
+        def record(self, *args, _blocking=blocking):
+            threads.append(threading.get_ident())
+            return _blocking(self, *args)
+
+        monkeypatch.setattr(SessionStore, name, record)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(max_sessions=1, path=os.path.join(tmp, "sessions.db"))
+
+        async def use():
+            first = await store.get_or_create_async("a")
+            first.add_turn("Hello", "Hi")
+            await store.get_or_create_async("b")
+            restored = await store.get_or_create_async("a")
+            assert restored.messages[0]["content"] == "Hello"
+            assert await store.delete_async("a") and not await store.delete_async("a")
+
+        asyncio.run(use())
+        store.close()
+
+    assert len(threads) >= 5 and threading.get_ident() not in threads[:-1]
+
+
+def test_idle_sessions_expire():
+    store = SessionStore(ttl_seconds=0.01)
+    store.get_or_create("a").add_turn("Hello", "Hi")
+    time.sleep(0.02)
+    assert store.get("a") is None and store.get_or_create("a").turns == 0
+
+
+def test_summary_reaches_the_prompt():
+    service = LLMService(api_key="")
+    history = [{"role": "summary", "content": "The user said: \"I lost my job.\""}] + [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"} for i in range(8)
+    ]
+    prompt = service._build_prompt("What now?", "context", "en", history)
+    assert "Earlier: The user said: \"I lost my job.\"" in prompt
+    assert "message 1\n" not in prompt and "message 2" in prompt and "message 7" in prompt
+
+
+class SessionPipeline(StubPipeline):
+    """Stub pipeline over three verses whose search returns a scripted verse per query"""
+
+    def __init__(self, results):
+        super().__init__(docs=lambda query: [{**VERSES[i], "score": 0.5} for i in results[query]])
+        self.vector_store = {"scriptures": VERSES, "embeddings": EMBEDDINGS, "verse_index": build_verse_index(VERSES)}
+
+    async def _embed_query(self, text):
+        # Follow-ups point at the first verse
+        return EMBEDDINGS[0] if "more" in text else EMBEDDINGS[2]
+
+
+@pytest.fixture
+def run_session(stub_pipeline, fake_llm):
+    """Ask queries in one session; returns the fake LLM, which quotes the first verse"""
+    def run(pipeline, queries):
+        llm = fake_llm(answer=lambda query, docs: f"As {docs[0]['reference']} teaches..." if docs else "Let us reflect.")
+
+        async def ask():
+            for query in queries:
+                await pipeline.query(query, session_id="s1")
+
+        asyncio.run(ask())
+        return llm
+
+    return run
+
+
+def test_follow_up_uses_session_history_and_reuses_verses(run_session):
+    pipeline = SessionPipeline({"Why act?": [0], "Tell me more": [1]})
+    llm = run_session(pipeline, ["Why act?", "Tell me more"])
+
+    assert llm.calls[0]["history"] is None
+    assert [msg["content"] for msg in llm.calls[1]["history"]] == ["Why act?", "As Bhagavad Gita 2.47 teaches..."]
+    # 2.47 from the first turn joins the freshly retrieved 6.35
+    assert llm.calls[1]["docs"] == ["Bhagavad Gita 2.47", "Bhagavad Gita 6.35"]
+    assert pipeline.sessions.get("s1").turns == 2
+
+
+def test_discussed_verses_can_be_skipped(run_session, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_SKIP_DISCUSSED", True)
+    pipeline = SessionPipeline({"Why act?": [0], "Tell me more": [0, 1]})
+    llm = run_session(pipeline, ["Why act?", "Tell me more"])
+    assert llm.calls[1]["docs"] == ["Bhagavad Gita 6.35"]
+
+
+def test_concurrent_turns_on_a_session_are_serialized(stub_pipeline, fake_llm):
+    """A second request on the same session waits for the first turn and sees it"""
+    llm = fake_llm(answer=lambda query, docs: f"As {docs[0]['reference']} teaches...", seconds=0.02)
+    pipeline = SessionPipeline({"Why act?": [0], "Tell me more": [1]})
+
+    async def ask():
+        await asyncio.gather(
+            pipeline.query("Why act?", session_id="s1"),
+            pipeline.query("Tell me more", session_id="s1")
+        )
+
+    asyncio.run(ask())
+    assert llm.calls[0]["history"] is None
+    assert [msg["content"] for msg in llm.calls[1]["history"]] == ["Why act?", "As Bhagavad Gita 2.47 teaches..."]
+    assert llm.calls[1]["docs"] == ["Bhagavad Gita 2.47", "Bhagavad Gita 6.35"]
+    session = pipeline.sessions.get("s1")
+    assert session.turns == 2
+    assert not session.lock.locked()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
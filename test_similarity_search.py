@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test the pre-normalized similarity kernel used by RAGPipeline.search
+"""
+import sys
+import os
+
+import numpy as np
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from rag.similarity import SimilarityIndex, top_k_indices
+from rag.filters import MetadataIndex, parse_chapter_filter
+
+
+def test_matches_bruteforce_cosine():
+    """Top-k from the kernel matches a plain argsort over cosine scores"""
+    rng = np.random.default_rng(42)
+    corpus = rng.standard_normal((500, 64))
+    query = rng.standard_normal(64)
+
+    index = SimilarityIndex(corpus)
+    indices, scores = index.search(query, 7)
+
+    expected_scores = (corpus @ query) / (np.linalg.norm(corpus, axis=1) * np.linalg.norm(query))
+    expected = np.argsort(expected_scores)[::-1][:7]
+
+    assert index.matrix.dtype == np.float32
+    assert index.matrix.flags['C_CONTIGUOUS']
+    assert list(indices) == list(expected)
+    assert np.allclose(scores, expected_scores[expected], atol=1e-5)
+
+
+def test_zero_rows_and_small_corpus():
+    """Zero vectors score 0 and top_k larger than the corpus returns everything"""
+    corpus = np.array([[1.0, 0.0], [0.0, 0.0], [0.6, 0.8]])
+    index = SimilarityIndex(corpus)
+    indices, scores = index.search(np.array([1.0, 0.0]), 10)
+
+    assert list(indices) == [0, 2, 1]
+    assert np.allclose(scores, [1.0, 0.6, 0.0])
+
+
+def test_top_k_indices_sorted():
+    """argpartition selection comes back best first"""
+    scores = np.array([0.1, 0.9, 0.3, 0.7, 0.5])
+    assert list(top_k_indices(scores, 3)) == [1, 3, 4]
+    assert len(top_k_indices(scores, 0)) == 0
+
+
+def test_filters_applied_before_top_k():
+    """A filtered query returns top_k matching rows, not the filtered global top_k"""
+    scriptures = [
+        {"language": "en" if i % 10 else "hi", "scripture": "Bhagavad Gita",
+         "chapter": str(i % 18 + 1), "topic": "Karma Yoga" if i % 2 else "Soul"}
+        for i in range(200)
+    ]
+    rng = np.random.default_rng(7)
+    index = SimilarityIndex(rng.standard_normal((200, 16)))
+    metadata = MetadataIndex(scriptures)
+
+    mask = metadata.mask(language="hi")
+    indices, _ = index.search(rng.standard_normal(16), 5, mask=mask)
+    assert len(indices) == 5
+    assert all(scriptures[i]["language"] == "hi" for i in indices)
+
+    mask = metadata.mask(language="en", chapter="2..6", topic="Karma Yoga")
+    indices, scores = index.search(rng.standard_normal(16), 50, mask=mask)
+    assert len(indices) == int(mask.sum())
+    assert all(2 <= int(scriptures[i]["chapter"]) <= 6 for i in indices)
+    assert all(scriptures[i]["topic"] == "Karma Yoga" for i in indices)
+    assert list(scores) == sorted(scores, reverse=True)
+
+    assert not metadata.mask(scripture="Ramayana").any()
+    assert metadata.mask() is None
+
+
+def test_parse_chapter_filter():
+    """Chapter filters accept single chapters and ranges"""
+    assert parse_chapter_filter("2") == (2, 2)
+    assert parse_chapter_filter("2..6") == (2, 6)
+    assert parse_chapter_filter("6-2") == (2, 6)
+    assert parse_chapter_filter(None) is None
+    try:
+        parse_chapter_filter("two")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Expected ValueError for invalid chapter")
+
+
+if __name__ == "__main__":
+    test_matches_bruteforce_cosine()
+    test_zero_rows_and_small_corpus()
+    test_top_k_indices_sorted()
+    test_filters_applied_before_top_k()
+    test_parse_chapter_filter()
+    print("✓ Similarity kernel tests passed")
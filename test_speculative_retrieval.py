@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test speculative retrieval: raw-query search overlaps query refinement
+"""
+import asyncio
+import sys
+import os
+import time
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+import pytest
+
+from config import settings
+from rag.lexical import merge_results
+
+REFINE_SECONDS = 0.2
+SEARCH_SECONDS = 0.2
+
+
+def _doc(reference, score, language="en"):
+    return {"reference": reference, "language": language, "score": score}
+
+
+def _search_results(query):
+    """One verse for the refined query, two for the raw one"""
+    if query == "detachment from results":
+        return [_doc("Bhagavad Gita 2.47", 0.7)]
+    return [_doc("Bhagavad Gita 6.35", 0.5), _doc("Bhagavad Gita 2.47", 0.4)]
+
+
+@pytest.fixture
+def retrieve(stub_pipeline, install_refiner, monkeypatch):
+    """Retrieve with a refiner of the given delay; returns (docs, seconds, searched queries)"""
+    monkeypatch.setattr(settings, "HYBRID_SEARCH", False)
+
+    def run(refine_seconds=REFINE_SECONDS, deadline_ms=1500.0, merge="merge"):
+        install_refiner(seconds=refine_seconds)
+        monkeypatch.setattr(settings, "REFINE_DEADLINE_MS", deadline_ms)
+        monkeypatch.setattr(settings, "SPECULATIVE_MERGE", merge)
+        pipeline = stub_pipeline(docs=_search_results, search_seconds=SEARCH_SECONDS)
+        start = time.perf_counter()
+        docs = asyncio.run(pipeline._retrieve("Why should I not worry about outcomes?", "en"))
+        return docs, time.perf_counter() - start, pipeline.searched
+
+    return run
+
+
+def test_merge_results_dedupes_and_keeps_best_score():
+    """Verses found by both lists appear once with their best score"""
+    merged = merge_results(
+        [[_doc("2.47", 0.7), _doc("3.19", 0.6)], [_doc("6.35", 0.5), _doc("2.47", 0.9)]],
+        top_k=5
+    )
+    assert [d["reference"] for d in merged][0] == "2.47"
+    assert {d["reference"] for d in merged} == {"2.47", "3.19", "6.35"}
+    assert merged[0]["score"] == 0.9
+    assert len(merge_results([[_doc("a", 1.0)], [_doc("b", 1.0)]], top_k=1)) == 1
+
+
+def test_raw_search_overlaps_refinement(retrieve):
+    """Refinement and raw-query search run at the same time, results are merged"""
+    docs, elapsed, searched = retrieve()
+    assert elapsed < REFINE_SECONDS + 2 * SEARCH_SECONDS, f"took {elapsed:.2f}s, search waited for the refiner"
+    assert set(searched) == {"Why should I not worry about outcomes?", "detachment from results"}
+    assert [d["reference"] for d in docs] == ["Bhagavad Gita 2.47", "Bhagavad Gita 6.35"]
+
+
+def test_replace_keeps_refined_results_only(retrieve):
+    docs, _, _ = retrieve(merge="replace")
+    assert [d["reference"] for d in docs] == ["Bhagavad Gita 2.47"]
+
+
+def test_deadline_falls_back_to_raw_results(retrieve):
+    """A refiner slower than the deadline doesn't delay the answer"""
+    docs, elapsed, searched = retrieve(refine_seconds=5.0, deadline_ms=300.0)
+    assert elapsed < 1.0
+    assert searched == ["Why should I not worry about outcomes?"]
+    assert [d["reference"] for d in docs] == ["Bhagavad Gita 6.35", "Bhagavad Gita 2.47"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
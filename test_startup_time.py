@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Test that importing the backend stays fast (heavy libraries load lazily)
+"""
+import sys
+import os
+import json
+import subprocess
+
+backend_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spiritual-voice-bot', 'backend')
+
+# Cold `import main` budget in seconds (about 0.6s on a laptop, mostly FastAPI)
+IMPORT_BUDGET_SECONDS = 3.0
+
+# Libraries that must not be imported until a component actually needs them
+HEAVY_MODULES = [
+    "torch", "whisper", "sentence_transformers", "transformers", "langchain",
+    "google.generativeai", "qdrant_client", "gtts", "pydub"
+]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _cold_import() -> dict:
+    """Import main in a fresh interpreter and report time and loaded heavy modules"""
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=backend_path,
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_main_defers_heavy_libraries():
+    """No heavy ML / SDK library is imported by `import main`"""
+    probe = _cold_import()
+    assert probe["loaded"] == [], f"Imported at module load: {probe['loaded']}"
+
+
+def test_import_main_within_budget():
+    """Cold import of main stays under the startup budget"""
+    probe = _cold_import()
+    assert probe["seconds"] < IMPORT_BUDGET_SECONDS, f"import main took {probe['seconds']:.2f}s"
+
+
+if __name__ == "__main__":
+    test_import_main_defers_heavy_libraries()
+    test_import_main_within_budget()
+    print("✓ Startup time tests passed")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test incremental streaming: tokens reach the client as they are generated
+"""
+import asyncio
+import random
+import sys
+import os
+import time
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+import pytest
+
+from config import settings
+from llm.formatter import StreamFormatter
+
+TOKEN_SECONDS = 0.05
+
+ANSWER = (
+    "I understand your worry.**In Bhagavad Gita 2.47**, Krishna says: "
+    "'You have a right to perform your duties.'\\n\\nThis means *focus* on the action.Then let go.\n\n\n\n"
+    "What would change if you did?"
+)
+
+
+def _format_whole(text):
+    formatter = StreamFormatter()
+    return formatter.feed(text) + formatter.flush()
+
+
+def test_chunking_does_not_change_output():
+    """Any split of the stream formats the same as the whole text"""
+    expected = _format_whole(ANSWER)
+    assert "**" not in expected and "\\n" not in expected and "\n\n\n" not in expected
+    assert "worry. In Bhagavad" in expected and "action. Then" in expected
+
+    for seed in range(100):
+        rng = random.Random(seed)
+        formatter = StreamFormatter()
+        out, i = "", 0
+        while i < len(ANSWER):
+            size = rng.randint(1, 8)
+            out += formatter.feed(ANSWER[i:i + size])
+            i += size
+        out += formatter.flush()
+        assert out == expected, seed
+
+
+def test_first_chunk_arrives_before_generation_ends(stub_pipeline, fake_llm, monkeypatch):
+    llm = fake_llm(answer=ANSWER, token_seconds=TOKEN_SECONDS)
+    pipeline = stub_pipeline()
+    monkeypatch.setattr(settings, "STREAM_MODE", "incremental")
+
+    async def run():
+        start = time.perf_counter()
+        arrivals, chunks = [], []
+        async for chunk in pipeline.query_stream("Why do I worry about results?"):
+            arrivals.append(time.perf_counter() - start)
+            chunks.append(chunk)
+        return arrivals, chunks, time.perf_counter() - start
+
+    arrivals, chunks, total = asyncio.run(run())
+
+    assert llm.calls[0]["structured"] is True
+    assert len(chunks) > 5
+    assert arrivals[0] < total / 4, f"first chunk after {arrivals[0]:.2f}s of {total:.2f}s"
+    assert "".join(chunks) == _format_whole(ANSWER)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
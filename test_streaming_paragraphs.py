@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test the incremental paragraph formatter against the original batch formatter
+"""
+import random
+import re
+import sys
+import os
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from llm.formatter import StreamingParagraphFormatter, ensure_paragraph_breaks
+
+
+def reference_paragraph_breaks(text: str) -> str:
+    """ensure_paragraph_breaks as originally written, kept as the test oracle"""
+    if text.count('\n\n') >= 3:
+        return text
+
+    text = re.sub(r'([.!?])([A-Z])', r'\1 \2', text)
+    text = re.sub(r'([a-z])([A-Z][a-z]+\s+says:)', r'\1 \2', text)
+    text = re.sub(r'([.!?])In\s+Bhagavad', r'\1 In Bhagavad', text)
+
+    text = re.sub(r'(In Bhagavad Gita \d+\.\d+[^.!?]*[:.][^"]*"[^"]*")', r'\n\n__VERSE__\1__VERSE__\n\n', text)
+    text = re.sub(r'(Krishna says:[^"]*"[^"]*")', r'\n\n__VERSE__\1__VERSE__\n\n', text)
+
+    sentences = re.split(r'([.!?])\s+', text)
+
+    result = []
+    current_para = []
+    sent_count = 0
+
+    for i in range(0, len(sentences) - 1, 2):
+        sent = sentences[i]
+        punct = sentences[i + 1] if i + 1 < len(sentences) else ''
+
+        if not sent.strip() or sent.strip() in ['__VERSE__']:
+            continue
+
+        current_para.append(sent + punct)
+        sent_count += 1
+
+        if sent_count >= 2:
+            para_text = ' '.join(current_para).strip()
+            if para_text and para_text != '__VERSE__':
+                result.append(para_text)
+            current_para = []
+            sent_count = 0
+
+    if current_para:
+        para_text = ' '.join(current_para).strip()
+        if para_text and para_text != '__VERSE__':
+            result.append(para_text)
+
+    formatted = '\n\n'.join(filter(None, result))
+    formatted = formatted.replace('__VERSE__', '').strip()
+    while '\n\n\n' in formatted:
+        formatted = formatted.replace('\n\n\n', '\n\n')
+
+    return formatted
+
+
+CORPUS = [
+    # Run-on sentences from real responses
+    """Greetings.Salutations to Thee, in front and behind! Salutations to Thee onevery side! O All! Thou infinite in power and prowess, pervadest all; wherefore Thou art all.omnipotence of the Divine. Krishna, in his universal form, is acknowledged as being present in all directions and encompassing everything.divine in all aspects of existence. How might recognizing the divine in all things shift your perspective?""",
+    """Iacknowledgethat you are feeling upset.Krishna says: "Sanjaya said To him who was thus overcome with pity andwho was despondent, with eyes full of tears and agitated, Madhusudana (the destroyer of Madhu) or Krishna spoke these words."This verse describes Arjuna's state of distress and emotional turmoil on the battlefield. Krishna is about to offer guidance to Arjuna, who is overwhelmed with sorrow and confusion.This verse reminds us that even in moments of deep upset, divine guidance and wisdom can be found. Perhaps reflecting on what is causing your upset can help you find clarity.""",
+    # Verse quotes spanning several sentences
+    """I understand your worry. In Bhagavad Gita 2.47, Krishna says: "You have a right to perform your prescribed duties. But you are not entitled to the fruits of action. Never consider yourself the cause." This teaches detachment. Focus on the work itself. What would change if you let go of the outcome? """,
+    """It is natural to feel lost.In Bhagavad Gita 3.22 Krishna explains: "There is nothing in the three worlds that should be done by Me." Even Krishna acts. You can act too! Does that help?""",
+    # Anchors without quotes, and quotes far away
+    """Krishna says: be steady in yoga. Do your duty. Abandon attachment. Later he adds "equanimity" and "yoga" together. That is all. Think about it. """,
+    """In Bhagavad Gita 2.48 the teaching is clear. Perform your duty equipoised. Abandon attachment to success or failure. Such "equanimity" is called "Yoga". Reflect on this today. """,
+    """In Bhagavad Gita chapter two, Krishna speaks of the soul. The soul is never born. It never dies. Is that comforting? """,
+    # Already well formatted: returned as-is
+    """Brief acknowledgment.\n\nIn Bhagavad Gita 3.22, Krishna says: "Quote."\n\nExplanation here.\n\nApplication here.\n\nQuestion?""",
+    # Two blank lines only: still formatted
+    """First thought. Second thought.\n\nThird thought! Fourth thought?\n\nFifth thought. Sixth""",
+    # Hindi (the danda is not a sentence end for the formatter)
+    """नमस्ते। आप चिंतित हैं। In Bhagavad Gita 2.47, Krishna says: "कर्मण्येवाधिकारस्ते मा फलेषु कदाचन।" Focus on action. Let go of results. """,
+    # Edge cases
+    "",
+    "No sentence end at all",
+    "One. ",
+    "Wait... really?! Yes. ",
+    """Markers __VERSE__ in text. __VERSE__. Odd. Fine. """,
+]
+
+TOKENS = [
+    "Krishna says:", "In Bhagavad Gita ", "2.47", "3.22", "2.", "chapter", ":", '"', '"',
+    ". ", "! ", "? ", ".", " ", " ", "\n", "\n\n", "word", "Arjuna", "peace", "Action",
+    "says:", "aKrishna says:", "In", "Bhagavad", "__VERSE__", "x.Y", "।",
+]
+
+
+def _random_text(rng: random.Random) -> str:
+    return "".join(rng.choice(TOKENS) for _ in range(rng.randint(0, 60)))
+
+
+def _stream(text: str, rng: random.Random, max_chunk: int = 8) -> str:
+    formatter = StreamingParagraphFormatter()
+    output, i = [], 0
+    while i < len(text):
+        size = rng.randint(1, max_chunk)
+        output.append(formatter.feed(text[i:i + size]))
+        i += size
+    output.append(formatter.flush())
+    return "".join(output)
+
+
+def _expected_from_stream(text: str) -> bool:
+    """Streams match the batch output unless output started before a third blank line"""
+    return text.count('\n\n') < 3
+
+
+def test_batch_matches_original():
+    """The precompiled batch formatter is output-identical to the original"""
+    for text in CORPUS:
+        assert ensure_paragraph_breaks(text) == reference_paragraph_breaks(text), text
+
+    rng = random.Random(0)
+    for _ in range(3000):
+        text = _random_text(rng)
+        assert ensure_paragraph_breaks(text) == reference_paragraph_breaks(text), repr(text)
+
+
+def test_stream_matches_batch_for_any_chunking():
+    """Every chunking of the corpus formats exactly like the batch function"""
+    for text in CORPUS:
+        expected = reference_paragraph_breaks(text)
+        for seed in range(50):
+            assert _stream(text, random.Random(seed)) == expected, (seed, text)
+        # Whole text in one chunk, and one character at a time
+        assert _stream(text, random.Random(0), max_chunk=len(text) + 1) == expected
+        assert _stream(text, random.Random(0), max_chunk=1) == expected
+
+
+def test_stream_matches_batch_on_random_text():
+    rng = random.Random(1)
+    for _ in range(3000):
+        text = _random_text(rng)
+        if _expected_from_stream(text):
+            assert _stream(text, rng) == reference_paragraph_breaks(text), repr(text)
+
+
+def test_paragraphs_emitted_before_stream_ends():
+    """Paragraphs come out as soon as their second sentence ends"""
+    formatter = StreamingParagraphFormatter()
+    output = formatter.feed("I hear you. Let us look at the Gita. ")
+    assert output == ""  # The sentence end is confirmed by the next word
+    output += formatter.feed("Krishna teaches ")
+    assert output == "I hear you. Let us look at the Gita."
+
+    # A quoted verse is held until its closing quote
+    output += formatter.feed('action. Krishna says: "Do your duty. ')
+    assert output == "I hear you. Let us look at the Gita."
+    output += formatter.feed('Do not fear." Think on it. Then act. ')
+    output += formatter.flush()
+    assert output == reference_paragraph_breaks(
+        'I hear you. Let us look at the Gita. Krishna teaches action. Krishna says: "Do your duty. '
+        'Do not fear." Think on it. Then act. '
+    )
+
+
+if __name__ == "__main__":
+    test_batch_matches_original()
+    test_stream_matches_batch_for_any_chunking()
+    test_stream_matches_batch_on_random_text()
+    test_paragraphs_emitted_before_stream_ends()
+    print("✓ Streaming paragraph formatter tests passed")
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Test the on-disk vector index format and the vector store backends
+"""
+import asyncio
+import sys
+import os
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from rag.store import save_index, load_index, index_exists, EMBEDDINGS_FILE, METADATA_FILE
+from rag.similarity import SimilarityIndex
+from rag.pipeline import RAGPipeline
+from rag.vector_store import InMemoryVectorStore, MmapVectorStore, QdrantVectorStore, VectorStore, qdrant_client
+
+VERSES = [
+    {"text": "Perform your duty", "reference": "Bhagavad Gita 2.47", "chapter": 2, "verse": 47,
+     "scripture": "Bhagavad Gita", "topic": "Karma Yoga", "language": "en"},
+    {"text": "The mind is restless", "reference": "Bhagavad Gita 6.34", "chapter": 6, "verse": 34,
+     "scripture": "Bhagavad Gita", "topic": "Mind Control", "language": "en"},
+]
+
+
+def test_roundtrip_is_memory_mapped():
+    """Saved embeddings come back normalized, float32 and memory-mapped"""
+    embeddings = np.array([[3.0, 4.0], [1.0, 0.0]])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_dir = Path(tmp) / "index"
+        save_index(index_dir, VERSES, embeddings, metadata={"embedding_model": "test"})
+        assert index_exists(index_dir)
+
+        verses, loaded, metadata = load_index(index_dir)
+
+        assert isinstance(loaded, np.memmap)
+        assert loaded.dtype == np.float32
+        assert np.allclose(loaded, [[0.6, 0.8], [1.0, 0.0]])
+        assert verses == VERSES
+        assert metadata["embedding_model"] == "test"
+        assert metadata["embedding_dim"] == 2
+        del loaded
+
+
+def test_rejects_unknown_version():
+    """A metadata file from a different format version is refused"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index_dir = Path(tmp)
+        save_index(index_dir, VERSES, np.eye(2))
+
+        metadata_path = index_dir / METADATA_FILE
+        data = json.loads(metadata_path.read_text(encoding="utf-8"))
+        data["format_version"] = 999
+        metadata_path.write_text(json.dumps(data), encoding="utf-8")
+
+        try:
+            load_index(index_dir)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("Expected ValueError for unknown format version")
+
+
+def test_rejects_embeddings_from_another_save():
+    """Embeddings that don't match the metadata's rows or dimension are refused; saves leave no temp files"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index_dir = Path(tmp)
+        save_index(index_dir, VERSES, np.eye(2))
+        assert sorted(p.name for p in index_dir.iterdir()) == sorted([EMBEDDINGS_FILE, METADATA_FILE])
+
+        for other in (np.eye(3, dtype=np.float32), np.eye(2, 3, dtype=np.float32)):
+            np.save(index_dir / EMBEDDINGS_FILE, other)
+            try:
+                load_index(index_dir)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"Expected ValueError for {other.shape} embeddings")
+
+
+def _corpus(n=200, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    verses = [
+        {"text": f"verse {i}", "chapter": str(i % 18 + 1), "verse": i // 18 + 1,
+         "scripture": "Bhagavad Gita", "topic": "Karma Yoga", "language": "en" if i % 2 else "hi"}
+        for i in range(n)
+    ]
+    return verses, rng.normal(size=(n, dim)).astype(np.float32), rng.normal(size=dim).astype(np.float32)
+
+
+def test_local_stores_match_index():
+    """In-memory and mmap stores return exactly what the local index returns"""
+    _, embeddings, query = _corpus()
+    index = SimilarityIndex(embeddings)
+    mask = np.arange(len(index)) % 3 == 0
+
+    expected = index.search(query, 5, mask=mask)
+    for store in (InMemoryVectorStore(index), MmapVectorStore(index)):
+        ids, scores = asyncio.run(store.search(query, 5, mask=mask))
+        assert np.array_equal(ids, expected[0])
+        assert np.allclose(scores, expected[1])
+
+
+def test_qdrant_store_filters_server_side():
+    """Qdrant (in-process) results agree with exact search under payload filters"""
+    if not qdrant_client.available:
+        print("qdrant-client not installed, skipping")
+        return
+
+    verses, embeddings, query = _corpus()
+    index = SimilarityIndex(embeddings)
+    chapters = np.array([int(v["chapter"]) for v in verses])
+    mask = (np.arange(len(verses)) % 2 == 1) & (chapters >= 2) & (chapters <= 6)
+
+    async def run():
+        store = QdrantVectorStore("test_verses", host=":memory:")
+        await store.ensure_collection(embeddings.shape[1])
+        await store.upsert(verses, embeddings, batch_size=64)
+        assert await store.count() == len(verses)
+
+        ids, scores = await store.search(query, 5, filters={"language": "en", "chapter": (2, 6)})
+        await store.close()
+        return ids, scores
+
+    ids, scores = asyncio.run(run())
+    expected_ids, expected_scores = index.search(query, 5, mask=mask)
+
+    assert np.array_equal(ids, expected_ids)
+    assert np.allclose(scores, expected_scores, atol=1e-4)
+
+
+def test_qdrant_store_falls_back_to_local():
+    """Search errors are served by the local fallback store"""
+    if not qdrant_client.available:
+        print("qdrant-client not installed, skipping")
+        return
+
+    _, embeddings, query = _corpus()
+    local = InMemoryVectorStore(SimilarityIndex(embeddings))
+
+    async def run():
+        # The collection was never created, so every Qdrant search fails
+        store = QdrantVectorStore("missing", host=":memory:", fallback=local)
+        result = await store.search(query, 3)
+        await store.close()
+        return result, store.get_stats()
+
+    (ids, _), stats = asyncio.run(run())
+    assert np.array_equal(ids, local.index.search(query, 3)[0])
+    assert stats["errors"] == 1
+
+
+def test_vector_store_requires_search():
+    """A backend without search fails when it is built"""
+    class NoSearch(VectorStore):
+        pass
+
+    try:
+        NoSearch()
+    except TypeError:
+        return
+    raise AssertionError("expected TypeError")
+
+
+class _SlowClient:
+    """Qdrant client stand-in that answers after a second"""
+
+    async def query_points(self, **kwargs):
+        await asyncio.sleep(1.0)
+
+    async def close(self):
+        pass
+
+
+def test_sub_second_timeout_falls_back():
+    """A sub-second QDRANT_TIMEOUT is enforced and the local store answers"""
+    _, embeddings, query = _corpus()
+    local = InMemoryVectorStore(SimilarityIndex(embeddings))
+    store = QdrantVectorStore("slow", client=_SlowClient(), timeout=0.05, fallback=local)
+
+    start = time.perf_counter()
+    ids, _ = asyncio.run(store.search(query, 3))
+    assert time.perf_counter() - start < 0.5
+    assert np.array_equal(ids, local.index.search(query, 3)[0]) and store.errors == 1
+
+
+def test_stale_qdrant_collection_is_not_used():
+    """A collection whose point count differs from the loaded verses falls back to local search"""
+    if not qdrant_client.available:
+        print("qdrant-client not installed, skipping")
+        return
+
+    verses, embeddings, _ = _corpus()
+    pipeline = RAGPipeline()
+
+    async def connect(count):
+        store = QdrantVectorStore("verses", host=":memory:")
+        await store.ensure_collection(embeddings.shape[1])
+        await store.upsert(verses[:count], embeddings[:count], batch_size=64)
+        await store.count()
+        return store
+
+    pipeline.remote_store = asyncio.run(connect(len(verses) // 2))
+    assert isinstance(pipeline._build_vector_store(verses, embeddings)["store"], InMemoryVectorStore)
+
+    pipeline.remote_store = asyncio.run(connect(len(verses)))
+    assert pipeline._build_vector_store(verses, embeddings)["store"] is pipeline.remote_store
+
+
+if __name__ == "__main__":
+    test_roundtrip_is_memory_mapped()
+    test_rejects_unknown_version()
+    test_rejects_embeddings_from_another_save()
+    test_local_stores_match_index()
+    test_qdrant_store_filters_server_side()
+    test_qdrant_store_falls_back_to_local()
+    test_vector_store_requires_search()
+    test_sub_second_timeout_falls_back()
+    test_stale_qdrant_collection_is_not_used()
+    print("✓ Vector store tests passed")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test verse reference parsing for the direct lookup fast path
+"""
+import sys
+import os
+
+# Add backend to path
+backend_path = os.path.join(os.path.dirname(__file__), 'spiritual-voice-bot', 'backend')
+sys.path.insert(0, backend_path)
+
+from rag.references import VerseReference, build_verse_index, parse_verse_reference
+
+
+def test_reference_formats():
+    """Common ways of naming a verse are recognised"""
+    assert parse_verse_reference("what is 2.47") == VerseReference(2, 47, 47)
+    assert parse_verse_reference("BG 18.66") == VerseReference(18, 66, 66)
+    assert parse_verse_reference("chapter 6 verse 35") == VerseReference(6, 35, 35)
+    assert parse_verse_reference("Gita 2:47-50?") == VerseReference(2, 47, 50)
+    assert parse_verse_reference("२.४७ का अर्थ क्या है") == VerseReference(2, 47, 47)
+    assert parse_verse_reference("अध्याय 6 श्लोक 35") == VerseReference(6, 35, 35)
+
+
+def test_non_lookups_are_ignored():
+    """Personal questions and out-of-range numbers go through normal retrieval"""
+    assert parse_verse_reference("how do I control my mind") is None
+    assert parse_verse_reference("I read 2.47 but I still feel anxious about my job interview") is None
+    assert parse_verse_reference("what is 25.3") is None
+    assert parse_verse_reference("2.1-72") is None
+    assert parse_verse_reference("version 1.2.3") is None
+
+
+def test_times_are_not_references():
+    """Clock times and uncued number pairs next to other words are not lookups"""
+    assert parse_verse_reference("give me 5:30 am routine") is None
+    assert parse_verse_reference("wake up at 4.30") is None
+    assert parse_verse_reference("gita reading at 6:15 pm") is None
+    assert parse_verse_reference("meditate 7:00 o'clock") is None
+    # A cue word keeps short references working
+    assert parse_verse_reference("gita verse 2.47 please") == VerseReference(2, 47, 47)
+    assert parse_verse_reference("2.47 summary gita") == VerseReference(2, 47, 47)
+    assert parse_verse_reference("2.47") == VerseReference(2, 47, 47)
+
+
+def test_verse_index():
+    """Rows are indexed by integer (chapter, verse), across languages"""
+    scriptures = [
+        {"chapter": "2", "verse": "47", "language": "en"},
+        {"chapter": 2, "verse": 47, "language": "hi"},
+        {"chapter": 6, "verse": 35, "language": "en"},
+    ]
+    index = build_verse_index(scriptures)
+    assert index[(2, 47)] == [0, 1]
+    assert index[(6, 35)] == [2]
+
+
+if __name__ == "__main__":
+    test_reference_formats()
+    test_non_lookups_are_ignored()
+    test_times_are_not_references()
+    test_verse_index()
+    print("✓ Verse reference tests passed")